@@ -4,18 +4,26 @@ from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
 from chat.middleware import TokenAuthMiddleware
+import ai_chat.routing
 import chat.routing
+import notification.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PUPtime.settings')
 
 django_asgi_app = get_asgi_application()
 
+from user.catalog import warm_catalog  # noqa: E402
+
+warm_catalog()
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
         TokenAuthMiddleware(
             URLRouter(
                 chat.routing.websocket_urlpatterns
+                + ai_chat.routing.websocket_urlpatterns
+                + notification.routing.websocket_urlpatterns
             )
         )
     ),
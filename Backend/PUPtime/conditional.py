@@ -0,0 +1,96 @@
+"""
+Conditional GET for per-user read endpoints.
+
+A view supplies a cheap version vector for what the response is built from
+(typically one aggregate query: row count and ``Max('updated_at')`` per
+resource). The vector, the user and the full path hash to the ``ETag``:
+
+- a matching ``If-None-Match`` gets a 304 without building the response;
+- otherwise a body serialised earlier for the same version is served from the
+  cache, and only a new version runs the view.
+
+Use ``@conditional_get(version)`` on an APIView's ``get``, or mix
+``ConditionalGetMixin`` into a generic view and implement ``get_version``.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+RESPONSE_CACHE_TTL_SECONDS = 5 * 60
+
+
+def _finalize(response, etag):
+    response['ETag'] = etag
+    # Clients keep the body but revalidate on every use.
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def conditional_response(view, request, version, render, timeout=RESPONSE_CACHE_TTL_SECONDS):
+    """
+    Serve ``render()``'s response under an ETag derived from ``version``,
+    answering 304 or from the cache when the version is unchanged.
+    """
+    digest = hashlib.sha256(json.dumps(
+        [type(view).__module__, type(view).__qualname__, request.user.pk, request.get_full_path(), version],
+        default=str,
+    ).encode()).hexdigest()[:32]
+    etag = quote_etag(digest)
+
+    not_modified = get_conditional_response(request._request, etag=etag, response=_finalize(Response(), etag))
+    if not_modified.status_code == status.HTTP_304_NOT_MODIFIED:
+        return not_modified
+
+    cache_key = f'conditional:{digest}'
+    data = cache.get(cache_key)
+    if data is not None:
+        return _finalize(Response(data, status=status.HTTP_200_OK), etag)
+
+    response = render()
+    if response.status_code != status.HTTP_200_OK:
+        return response
+    cache.set(cache_key, response.data, timeout)
+    return _finalize(response, etag)
+
+
+def conditional_get(version, timeout=RESPONSE_CACHE_TTL_SECONDS):
+    """
+    Decorator for a view's ``get``. ``version(view, request, *args, **kwargs)``
+    returns a JSON-serialisable value that changes whenever the response would.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return method(view, request, *args, **kwargs)
+            return conditional_response(
+                view, request,
+                version(view, request, *args, **kwargs),
+                lambda: method(view, request, *args, **kwargs),
+                timeout,
+            )
+        return wrapper
+    return decorator
+
+
+class ConditionalGetMixin:
+    """``conditional_get`` for generic views, with the version from ``get_version``."""
+    response_cache_timeout = RESPONSE_CACHE_TTL_SECONDS
+
+    def get_version(self, request, *args, **kwargs):
+        raise NotImplementedError('ConditionalGetMixin views must implement get_version()')
+
+    def get(self, request, *args, **kwargs):
+        render = lambda: super(ConditionalGetMixin, self).get(request, *args, **kwargs)  # noqa: E731
+        if not request.user.is_authenticated:
+            return render()
+        return conditional_response(
+            self, request, self.get_version(request, *args, **kwargs), render, self.response_cache_timeout
+        )
@@ -13,6 +13,7 @@ import firebase_admin
 from firebase_admin import credentials
 from pathlib import Path
 from decouple import config, Csv
+from django.core.exceptions import ImproperlyConfigured
 try:
     from dotenv import load_dotenv
 except ImportError:  # pragma: no cover - optional dependency
@@ -71,8 +72,31 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'user.authentication.CachedTokenAuthentication',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'PUPtime.throttling.RequestThrottle',
+    ],
+    # Reverse proxies in front of the app. Anonymous clients are throttled by
+    # address, and X-Forwarded-For is only trusted this many hops deep; with
+    # the default of 0 it is ignored, so a client cannot pick its own bucket.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+}
+
+# Per-user token buckets for PUPtime.throttling. The AI endpoints also draw
+# from their own bucket, priced in text messages, so the shared model quota is
+# split fairly. THROTTLE_CACHE names the cache alias that holds the buckets;
+# the default one is shared by every worker once CACHE_BACKEND=redis (see
+# CACHES below), otherwise each worker would grant the full quota.
+THROTTLE_CACHE = config('THROTTLE_CACHE', default='default')
+THROTTLE_BUCKETS = {
+    'api': {'capacity': 120, 'refill_per_minute': 60},
+    'ai': {'capacity': 20, 'refill_per_minute': 5},
+}
+THROTTLE_COSTS = {
+    'request': 1,
+    'text_chat': 1,
+    'voice_chat': 4,
 }
 
 MIDDLEWARE = [
@@ -106,10 +130,67 @@ TEMPLATES = [
 WSGI_APPLICATION = 'PUPtime.wsgi.application'
 ASGI_APPLICATION = 'PUPtime.asgi.application'
 
+# Channel layer used by every WebSocket feature. "memory" only reaches sockets
+# in the same process; "redis" fans group messages out to every ASGI worker and
+# works against any Redis-protocol server (for local multi-worker testing run
+# `python manage.py run_fake_redis`).
+CHANNEL_LAYER_BACKEND = config('CHANNEL_LAYER_BACKEND', default='memory').strip().lower()
+REDIS_URL = config('REDIS_URL', default='redis://127.0.0.1:6379/0')
+
+_CHANNEL_LAYER_BACKENDS = {
+    'memory': {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+    },
+    'redis': {
+        "BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer",
+        "CONFIG": {
+            "hosts": [REDIS_URL],
+        },
+    },
+}
+
+if CHANNEL_LAYER_BACKEND not in _CHANNEL_LAYER_BACKENDS:
+    raise ImproperlyConfigured(
+        f"Unsupported CHANNEL_LAYER_BACKEND {CHANNEL_LAYER_BACKEND!r}. "
+        f"Use one of: {', '.join(_CHANNEL_LAYER_BACKENDS)}."
+    )
+
 CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
-    }
+    "default": _CHANNEL_LAYER_BACKENDS[CHANNEL_LAYER_BACKEND],
+}
+
+# The cache holds state every worker must agree on: the token -> user cache,
+# the friend graph, the interest catalog version and the throttle buckets.
+# "memory" is private to one process, so it is only correct with a single
+# worker; "redis" shares it through REDIS_URL. It follows the channel layer
+# unless set explicitly.
+CACHE_BACKEND = config('CACHE_BACKEND', default=CHANNEL_LAYER_BACKEND).strip().lower()
+# Worker processes per server, as read by gunicorn and uvicorn.
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+
+_CACHE_BACKENDS = {
+    'memory': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+}
+
+if CACHE_BACKEND not in _CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f"Unsupported CACHE_BACKEND {CACHE_BACKEND!r}. "
+        f"Use one of: {', '.join(_CACHE_BACKENDS)}."
+    )
+if CACHE_BACKEND == 'memory' and (WEB_CONCURRENCY > 1 or CHANNEL_LAYER_BACKEND == 'redis'):
+    raise ImproperlyConfigured(
+        "CACHE_BACKEND=memory is per process; with several workers set CACHE_BACKEND=redis "
+        "so logouts, unfriending and catalog changes reach all of them."
+    )
+
+CACHES = {
+    'default': _CACHE_BACKENDS[CACHE_BACKEND],
 }
 
 
@@ -193,4 +274,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 #firebase_fcm_settings
 cred = credentials.Certificate("./firebase_adminsdk.json")
-firebase_admin.initialize_app(cred)
\ No newline at end of file
+firebase_admin.initialize_app(cred)
+
+# How the notification outbox worker delivers pushes: 'firebase' sends through
+# FCM, 'memory' only records them (local development and tests).
+FCM_TRANSPORT = config('FCM_TRANSPORT', default='firebase').strip().lower()
+if FCM_TRANSPORT not in ('firebase', 'memory'):
+    raise ImproperlyConfigured(
+        f"Unsupported FCM_TRANSPORT {FCM_TRANSPORT!r}. Use one of: firebase, memory."
+    )
+# Where the hobby recommender persists its memory-mapped TF-IDF index
+# (``manage.py build_hobby_index``); must be shared by every worker process.
+HOBBY_INDEX_DIR = config('HOBBY_INDEX_DIR', default=str(BASE_DIR / 'hobby_index'))
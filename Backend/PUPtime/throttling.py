@@ -0,0 +1,143 @@
+"""
+Per-user token-bucket throttling with weighted costs.
+
+Each bucket in ``settings.THROTTLE_BUCKETS`` holds up to ``capacity`` tokens
+and refills continuously at ``refill_per_minute``; a request spends its cost
+from ``settings.THROTTLE_COSTS`` or is refused with the exact time until
+enough tokens are back. Every API request spends from the ``api`` bucket,
+and the AI endpoints also spend from a separate ``ai`` bucket, a voice message
+costing more than a text one, so heavy chat use cannot starve the rest of the
+app and one user cannot use up the shared model quota. A request is charged
+to all of its buckets or to none, so one refused by either bucket does not
+drain the other. Anonymous clients are keyed by address, honouring
+``X-Forwarded-For`` only as far as DRF's ``NUM_PROXIES`` allows.
+
+A bucket is stored as one number in ``settings.THROTTLE_CACHE``: the time at
+which it will be full again (the generic cell rate algorithm). Like DRF's own
+throttles the read and write are not atomic, so concurrent requests from the
+same user may each overspend by one request.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucket:
+    def __init__(self, name):
+        try:
+            config = settings.THROTTLE_BUCKETS[name]
+        except KeyError:
+            raise ImproperlyConfigured(f'No throttle bucket named {name!r} in THROTTLE_BUCKETS.')
+        self.name = name
+        self.capacity = config['capacity']
+        self.seconds_per_token = 60 / config['refill_per_minute']
+        self.cache = caches[settings.THROTTLE_CACHE]
+
+    def _key(self, ident):
+        return f'throttle:{self.name}:{ident}'
+
+    def _quote(self, ident, cost):
+        if cost > self.capacity:
+            raise ImproperlyConfigured(
+                f'A cost of {cost} can never be paid from bucket {self.name!r} (capacity {self.capacity}).'
+            )
+        now = time.time()
+        full_at = max(self.cache.get(self._key(ident), now), now)
+        spent_full_at = full_at + cost * self.seconds_per_token
+        # Tokens left after spending: capacity - (spent_full_at - now) / seconds_per_token.
+        wait = spent_full_at - now - self.capacity * self.seconds_per_token
+        return max(wait, 0), now, spent_full_at
+
+    def wait(self, ident, cost):
+        """Seconds until ``ident``'s bucket holds ``cost`` tokens; spends nothing."""
+        return self._quote(ident, cost)[0]
+
+    def consume(self, ident, cost):
+        """
+        Spend ``cost`` tokens of ``ident``'s bucket. Returns 0 when they were
+        spent, otherwise the seconds until the bucket holds ``cost`` tokens.
+        """
+        wait, now, spent_full_at = self._quote(ident, cost)
+        if wait:
+            return wait
+        self.cache.set(self._key(ident), spent_full_at, int(spent_full_at - now) + 1)
+        return 0
+
+    def reset(self, ident):
+        self.cache.delete(self._key(ident))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Charges ``THROTTLE_COSTS[cost]`` from the user's (or client IP's) ``bucket``."""
+    bucket = 'api'
+    cost = 'request'
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.id}'
+        return f'ip:{super().get_ident(request)}'
+
+    @classmethod
+    def charge(cls, ident):
+        return TokenBucket(cls.bucket).consume(ident, settings.THROTTLE_COSTS[cls.cost])
+
+    @staticmethod
+    def charge_all(ident, throttle_classes):
+        """
+        Spend the cost of every class in ``throttle_classes`` only if all of
+        their buckets can pay, so a refused request spends nothing. Returns
+        each class's wait, 0 for the ones that were charged.
+        """
+        costs = {}
+        for throttle_class in throttle_classes:
+            bucket = throttle_class.bucket
+            costs[bucket] = costs.get(bucket, 0) + settings.THROTTLE_COSTS[throttle_class.cost]
+        buckets = {name: TokenBucket(name) for name in costs}
+        waits = {name: buckets[name].wait(ident, cost) for name, cost in costs.items()}
+        if not any(waits.values()):
+            waits = {name: buckets[name].consume(ident, cost) for name, cost in costs.items()}
+        return {throttle_class: waits[throttle_class.bucket] for throttle_class in throttle_classes}
+
+    @classmethod
+    def charge_user(cls, user):
+        """``charge`` for callers outside DRF views, such as WebSocket consumers."""
+        return cls.charge(f'user:{user.id}')
+
+    def allow_request(self, request, view):
+        # DRF asks every throttle before refusing, so the first token-bucket
+        # throttle of the view charges all of them together and the rest
+        # read its result.
+        waits = getattr(request, '_token_bucket_waits', None)
+        if waits is None or type(self) not in waits:
+            throttle_classes = [type(t) for t in view.get_throttles() if isinstance(t, TokenBucketThrottle)]
+            if type(self) not in throttle_classes:
+                throttle_classes.append(type(self))
+            waits = request._token_bucket_waits = self.charge_all(self.get_ident(request), throttle_classes)
+        wait = waits[type(self)]
+        self.retry_after = wait or None
+        return not wait
+
+    def wait(self):
+        return self.retry_after
+
+
+class RequestThrottle(TokenBucketThrottle):
+    """Default for every endpoint."""
+    bucket = 'api'
+    cost = 'request'
+
+
+class TextChatThrottle(TokenBucketThrottle):
+    bucket = 'ai'
+    cost = 'text_chat'
+
+
+class VoiceChatThrottle(TokenBucketThrottle):
+    bucket = 'ai'
+    cost = 'voice_chat'
@@ -27,6 +27,7 @@ urlpatterns = [
     path('friendship/', include('friendship.urls')),
     path('notification/', include('notification.urls')),
     path('chat/', include('chat.urls')),
+    path('hobby/', include('hobby.urls')),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('hello/', lambda request: HttpResponse("Hello, World this is PUPtime :) v1")),
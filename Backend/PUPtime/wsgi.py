@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PUPtime.settings')
 
 application = get_wsgi_application()
+
+from user.catalog import warm_catalog  # noqa: E402
+
+warm_catalog()
@@ -1,6 +1,7 @@
 from langchain_core.tools import tool
 from task.models import TaskTemplate
 from task.serializers import TaskSerializer
+from user.recommendations import recommend_for_users
 
 from django.utils import timezone
 import json
@@ -302,11 +303,14 @@ def get_task_tools(user):
 
     @tool
     def get_user_preferences() -> str:
-        """User profile, interests, and assumed timezone."""
+        """User profile, interests, suggested hobbies and task categories, and assumed timezone."""
         interests = [i.title for i in user.interests.all()]
+        suggested = recommend_for_users([user.id], 5)[user.id]
         return (
             f"User: {user.username} | Streak: {user.streak_cnt}\n"
             f"Interests: {', '.join(interests) if interests else 'None'}\n"
+            f"Suggested hobbies: {', '.join(h['name'] for h in suggested['hobbies']) or 'None'}\n"
+            f"Suggested task categories: {', '.join(c['name'] for c in suggested['categories']) or 'None'}\n"
             f"Timezone: {getattr(TaskTemplate.objects.filter(user=user).first(), 'timezone', 'UTC')}"
         )
 
@@ -0,0 +1,209 @@
+import io
+import json
+import logging
+import math
+import wave
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.db import close_old_connections
+from rest_framework.exceptions import ValidationError
+
+from PUPtime.throttling import VoiceChatThrottle
+
+from .ai_provider import AIProviderRateLimitError
+from .s3_storage import MAX_VOICE_FILE_SIZE
+from .serializers import MessageSerializer
+from .services import ChatService
+from .voice_cache import fingerprint_audio
+from .voice_service import StreamingVoiceAnalyzer, classify_mood
+
+logger = logging.getLogger(__name__)
+
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+
+def _pcm16_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def _generate_voice_reply(*args, **kwargs):
+    # The AI's tool calls may query the database from this pool thread, so
+    # clean up its connection the way database_sync_to_async would.
+    close_old_connections()
+    try:
+        return ChatService.generate_voice_reply(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+class VoiceStreamConsumer(AsyncWebsocketConsumer):
+    """
+    ws/ai/voice/?token=<token>
+
+    Streams a voice message to the AI while the user is still speaking.
+
+    1. ``{"type": "start", "conversation_id": "<uuid>", "sample_rate": 16000}``
+       (both fields optional).
+    2. Binary frames of mono, signed 16-bit little-endian PCM. Mood features
+       are accumulated as each frame arrives.
+    3. ``{"type": "end", "message": "optional text"}`` — the analysis is
+       finalised and the AI call starts immediately. The reply is sent as
+       ``{"type": "response", "conversation_id", "message", "title"}`` or
+       ``{"type": "error", "error", ...}``.
+    """
+
+    async def connect(self):
+        if not self.scope['user'].is_authenticated:
+            await self.close()
+            return
+        self._reset()
+        await self.accept()
+
+    def _reset(self, conversation_id=None, sample_rate=StreamingVoiceAnalyzer.SAMPLE_RATE):
+        self.conversation_id = conversation_id
+        self.sample_rate = sample_rate
+        self.analyzer = StreamingVoiceAnalyzer(sample_rate=sample_rate)
+        self.pcm = bytearray()
+        self.streaming = False
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            await self._receive_audio(bytes_data)
+            return
+
+        try:
+            payload = json.loads(text_data or '{}')
+        except json.JSONDecodeError:
+            await self._send_error('Invalid JSON.')
+            return
+
+        event_type = payload.get('type')
+        if event_type == 'start':
+            try:
+                sample_rate = int(payload.get('sample_rate') or StreamingVoiceAnalyzer.SAMPLE_RATE)
+            except (TypeError, ValueError):
+                await self._send_error('sample_rate must be an integer.')
+                return
+            if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+                await self._send_error(
+                    f'sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}.'
+                )
+                return
+            self._reset(payload.get('conversation_id'), sample_rate)
+            self.streaming = True
+            await self.send(text_data=json.dumps({'type': 'started'}))
+        elif event_type == 'end':
+            await self._finish(payload.get('message') or '')
+        else:
+            await self._send_error(f'Unsupported event type: {event_type}')
+
+    async def _receive_audio(self, chunk: bytes):
+        if not self.streaming:
+            await self._send_error('Send a "start" event before streaming audio.')
+            return
+        if len(self.pcm) + len(chunk) > MAX_VOICE_FILE_SIZE:
+            self._reset()
+            await self._send_error(
+                f'Audio too large. Maximum: {MAX_VOICE_FILE_SIZE // (1024*1024)} MB.'
+            )
+            return
+
+        self.pcm.extend(chunk)
+        await sync_to_async(self.analyzer.feed_pcm16, thread_sensitive=False)(chunk)
+
+    async def _finish(self, text_context: str):
+        if not self.streaming or not self.pcm:
+            await self._send_error('No audio received.')
+            return
+
+        wait = await sync_to_async(VoiceChatThrottle.charge_user)(self.scope['user'])
+        if wait:
+            self._reset()
+            await self._send_error(
+                'Request was throttled.', error_code='throttled', retry_after_seconds=math.ceil(wait),
+            )
+            return
+
+        features = self.analyzer.features()
+        mood_data = classify_mood(features)
+        audio_bytes = _pcm16_to_wav(bytes(self.pcm), self.sample_rate)
+        conversation_id = self.conversation_id
+        self._reset()
+
+        await self.send(text_data=json.dumps({'type': 'processing', 'mood': mood_data['mood']}))
+        try:
+            payload = await self._respond(
+                conversation_id, text_context, audio_bytes, mood_data, features['duration_seconds'],
+            )
+        except ValidationError as e:
+            await self._send_error(e.detail.get('detail') if isinstance(e.detail, dict) else str(e.detail))
+            return
+        except AIProviderRateLimitError as error:
+            logger.warning("AI provider quota exhausted (voice stream): %s", error)
+            await self._send_error(
+                str(error), error_code='rate_limited', retry_after_seconds=error.retry_after_seconds,
+            )
+            return
+        except Exception:
+            logger.exception("Error in streamed voice chat")
+            await self._send_error('An error occurred while processing the voice message.')
+            return
+
+        await self.send(text_data=json.dumps({'type': 'response', **payload}, default=str))
+
+    async def _respond(self, conversation_id, text_context, audio_bytes, mood_data, duration):
+        # Only the ORM steps run on the thread-sensitive database executor; the
+        # AI and S3 calls get a thread of their own so they don't hold up other
+        # consumers in this worker.
+        user = self.scope['user']
+        fingerprint = fingerprint_audio(audio_bytes)
+        conversation, voice_message, chat_messages = await self._start(
+            conversation_id, text_context, audio_bytes, fingerprint, mood_data, duration,
+        )
+        full_response, s3_key, title = await sync_to_async(_generate_voice_reply, thread_sensitive=False)(
+            user, chat_messages, audio_bytes, 'audio/wav', text_context,
+            upload=True, is_new_conversation=conversation_id is None,
+        )
+        return await self._complete(
+            conversation, voice_message, audio_bytes, fingerprint, mood_data, full_response, s3_key,
+            title, conversation_id is None,
+        )
+
+    @database_sync_to_async
+    def _start(self, conversation_id, text_context, audio_bytes, fingerprint, mood_data, duration):
+        conversation = ChatService.get_or_create_conversation(
+            user=self.scope['user'],
+            conversation_id=conversation_id,
+            user_text=text_context[:80] if text_context else "Voice message",
+        )
+        voice_message, chat_messages = ChatService.start_voice_message(
+            conversation, audio_bytes, 'audio/wav', fingerprint, mood_data, text_context, duration, None,
+        )
+        return conversation, voice_message, chat_messages
+
+    @database_sync_to_async
+    def _complete(self, conversation, voice_message, audio_bytes, fingerprint, mood_data,
+                  full_response, s3_key, title, is_new_conversation):
+        assistant_message = ChatService.complete_voice_message(
+            conversation, self.scope['user'], voice_message, audio_bytes, 'audio/wav', fingerprint,
+            mood_data, full_response, s3_key, title if is_new_conversation else None,
+        )
+        return {
+            'conversation_id': str(conversation.id),
+            'message': MessageSerializer(assistant_message).data,
+            'title': title,
+        }
+
+    async def _send_error(self, error, **extra):
+        payload = {'type': 'error', 'error': error}
+        payload.update({key: value for key, value in extra.items() if value is not None})
+        await self.send(text_data=json.dumps(payload))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.11 on 2026-10-19 17:31
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_chat', '0010_usermemory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='voice_fingerprint',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 of the raw uploaded audio bytes, used to deduplicate re-sent voice notes.', max_length=64, null=True),
+        ),
+        migrations.CreateModel(
+            name='VoiceAsset',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('fingerprint', models.CharField(help_text='SHA-256 of the raw uploaded audio bytes.', max_length=64)),
+                ('s3_key', models.CharField(help_text='S3 object key of the converted recording.', max_length=512)),
+                ('mime_type', models.CharField(help_text='MIME type of the converted recording.', max_length=50)),
+                ('voice_mood', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='voice_assets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'fingerprint'), name='unique_voice_asset_per_user')],
+            },
+        ),
+    ]
@@ -57,6 +57,10 @@ class Message(models.Model):
             "Contains: mood label, confidence, raw feature dict, and ai_hint string."
         ),
     )
+    voice_fingerprint = models.CharField(
+        max_length=64, blank=True, null=True, db_index=True,
+        help_text="SHA-256 of the raw uploaded audio bytes, used to deduplicate re-sent voice notes.",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -89,6 +93,30 @@ class AIChoice(models.Model):
     def __str__(self):
         return f"Choice {self.choice_id_string} for Message {self.message.id} (Executed: {self.is_executed})"
 
+class VoiceAsset(models.Model):
+    """Processing results for a voice upload, keyed by the fingerprint of its raw bytes."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='voice_assets',
+    )
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of the raw uploaded audio bytes.")
+    s3_key = models.CharField(max_length=512, help_text="S3 object key of the converted recording.")
+    mime_type = models.CharField(max_length=50, help_text="MIME type of the converted recording.")
+    voice_mood = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'fingerprint'], name='unique_voice_asset_per_user'),
+        ]
+
+    def __str__(self):
+        return f"Voice asset {self.fingerprint[:12]} for user {self.user_id}"
+
+
 class UserMemory(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     CATEGORY_CHOICES = [
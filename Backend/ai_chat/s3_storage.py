@@ -4,6 +4,7 @@ import uuid as _uuid
 import boto3
 from botocore.exceptions import ClientError
 from decouple import config
+from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +44,13 @@ ALLOWED_MIME_TYPES = {
 
 MAX_VOICE_FILE_SIZE = 10 * 1024 * 1024 
 
+PRESIGNED_URL_EXPIRY_SECONDS = 3600
+# Cached URLs are re-signed once they are this close to expiring, so a client
+# never receives a link that dies mid-playback.
+PRESIGNED_URL_REFRESH_MARGIN_SECONDS = 300
+
+_PRESIGNED_CACHE_PREFIX = "s3:presigned:"
+
 
 def get_extension_for_mime(mime_type: str) -> str | None:
     return ALLOWED_MIME_TYPES.get(mime_type.lower().strip())
@@ -82,10 +90,26 @@ def upload_voice_file(
     return s3_key
 
 
-def generate_presigned_url(s3_key: str, expiry_seconds: int = 3600) -> str | None:
+def download_voice_file(s3_key: str) -> bytes | None:
     try:
-        client = _get_s3_client()
-        url = client.generate_presigned_url(
+        response = _get_s3_client().get_object(Bucket=_get_bucket_name(), Key=s3_key)
+        return response["Body"].read()
+    except ClientError:
+        logger.exception("Failed to download voice file from S3: %s", s3_key)
+        return None
+
+
+def _presigned_cache_key(s3_key: str, expiry_seconds: int) -> str:
+    return f"{_PRESIGNED_CACHE_PREFIX}{expiry_seconds}:{s3_key}"
+
+
+def _presigned_cache_timeout(expiry_seconds: int) -> int:
+    return max(expiry_seconds - PRESIGNED_URL_REFRESH_MARGIN_SECONDS, 0)
+
+
+def _sign_url(client, s3_key: str, expiry_seconds: int) -> str | None:
+    try:
+        return client.generate_presigned_url(
             "get_object",
             Params={
                 "Bucket": _get_bucket_name(),
@@ -93,7 +117,53 @@ def generate_presigned_url(s3_key: str, expiry_seconds: int = 3600) -> str | Non
             },
             ExpiresIn=expiry_seconds,
         )
-        return url
     except ClientError:
         logger.exception("Failed to generate presigned URL for %s", s3_key)
         return None
+
+
+def generate_presigned_url(
+    s3_key: str,
+    expiry_seconds: int = PRESIGNED_URL_EXPIRY_SECONDS,
+) -> str | None:
+    """Return a presigned GET URL for ``s3_key``, reusing a cached one while it is still fresh."""
+    return generate_presigned_urls([s3_key], expiry_seconds).get(s3_key)
+
+
+def generate_presigned_urls(
+    s3_keys,
+    expiry_seconds: int = PRESIGNED_URL_EXPIRY_SECONDS,
+) -> dict[str, str | None]:
+    """
+    Sign many S3 keys in one pass.
+
+    Fresh URLs come from the cache with a single ``get_many``; only the keys
+    that are missing or about to expire are signed, and those are written back
+    with one ``set_many``. Returns a ``{s3_key: url}`` mapping (``None`` for
+    keys that could not be signed).
+    """
+    unique_keys = list(dict.fromkeys(key for key in s3_keys if key))
+    if not unique_keys:
+        return {}
+
+    cache_keys = {key: _presigned_cache_key(key, expiry_seconds) for key in unique_keys}
+    cached = cache.get_many(list(cache_keys.values()))
+
+    urls: dict[str, str | None] = {}
+    to_cache: dict[str, str] = {}
+    client = None
+    for key in unique_keys:
+        url = cached.get(cache_keys[key])
+        if url is None:
+            if client is None:
+                client = _get_s3_client()
+            url = _sign_url(client, key, expiry_seconds)
+            if url is not None:
+                to_cache[cache_keys[key]] = url
+        urls[key] = url
+
+    timeout = _presigned_cache_timeout(expiry_seconds)
+    if to_cache and timeout:
+        cache.set_many(to_cache, timeout=timeout)
+
+    return urls
@@ -1,7 +1,8 @@
+from django.db import models
 from rest_framework import serializers
 
 from .models import AIChoice, Conversation, Message
-from .s3_storage import generate_presigned_url
+from .s3_storage import generate_presigned_url, generate_presigned_urls
 
 
 class AIChoiceSerializer(serializers.ModelSerializer):
@@ -18,6 +19,17 @@ class AIChoiceSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class MessageListSerializer(serializers.ListSerializer):
+    """Signs every voice URL of the listed messages in one batch before serializing them."""
+
+    def to_representation(self, data):
+        messages = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        voice_keys = [message.voice_s3_key for message in messages if message.voice_s3_key]
+        if voice_keys:
+            self.context.setdefault('voice_urls', {}).update(generate_presigned_urls(voice_keys))
+        return super().to_representation(messages)
+
+
 class MessageSerializer(serializers.ModelSerializer):
     choices = serializers.SerializerMethodField()
     voice_url = serializers.SerializerMethodField()
@@ -28,12 +40,16 @@ class MessageSerializer(serializers.ModelSerializer):
         return AIChoiceSerializer(choices, many=True).data
 
     def get_voice_url(self, obj):
-        if obj.voice_s3_key:
-            return generate_presigned_url(obj.voice_s3_key)
-        return None
+        if not obj.voice_s3_key:
+            return None
+        voice_urls = self.context.get('voice_urls') or {}
+        if obj.voice_s3_key in voice_urls:
+            return voice_urls[obj.voice_s3_key]
+        return generate_presigned_url(obj.voice_s3_key)
 
     class Meta:
         model = Message
+        list_serializer_class = MessageListSerializer
         fields = [
             'id', 'role', 'content', 'created_at', 'choices',
             'voice_url', 'voice_duration_seconds', 'voice_mime_type', 'voice_mood',
@@ -11,7 +11,9 @@ from .ai_provider import ChatMessage, get_ai_provider
 from .Tools.task_tools import get_task_tools
 from .models import AIChoice, Conversation, Message
 from .prompts import build_system_prompt
+from .s3_storage import upload_voice_file
 from .snapshots import build_task_snapshot
+from .voice_cache import ProcessedVoice, store_processed_voice
 
 logger = logging.getLogger(__name__)
 
@@ -59,6 +61,7 @@ class ChatService:
         mime_type: str,
         duration: float | None = None,
         text_content: str = '',
+        fingerprint: str | None = None,
     ) -> Message:
         """Persist a voice message (with optional transcription)."""
         return Message.objects.create(
@@ -68,6 +71,7 @@ class ChatService:
             voice_s3_key=s3_key,
             voice_mime_type=mime_type,
             voice_duration_seconds=duration,
+            voice_fingerprint=fingerprint,
         )
 
     # ── Message Preparation & AI Interaction ────────────────────
@@ -121,6 +125,192 @@ class ChatService:
             chat_messages, tools, audio_bytes, audio_mime_type, user=user
         )
 
+    # ── Voice Messages ───────────────────────────────────────────
+
+    @staticmethod
+    def build_mood_context_note(mood_data: Optional[Dict]) -> str:
+        """Hidden note appended to the user's text so the AI can adapt its tone."""
+        if mood_data is None:
+            return ''
+        return (
+            f"\n\n[System mood context — do not read aloud or mention this note directly: "
+            f"Based on the user's voice, they appear to be feeling {mood_data['mood']} "
+            f"(confidence: {mood_data['confidence']}). "
+            f"{mood_data['ai_hint']} "
+            f"Respond with emotional awareness. If they are sad or anxious, warmly acknowledge "
+            f"their feeling first, then gently suggest a helpful activity or task if appropriate.]"
+        )
+
+    @classmethod
+    def respond_to_voice_message(
+        cls,
+        conversation: Conversation,
+        user,
+        audio_bytes: bytes,
+        mime_type: str,
+        fingerprint: str,
+        mood_data: Optional[Dict] = None,
+        text_context: str = '',
+        duration: float | None = None,
+        s3_key: Optional[str] = None,
+        is_new_conversation: bool = False,
+    ) -> Tuple[Message, str]:
+        """
+        Persist an already converted/analysed voice message and get the AI reply.
+
+        When ``s3_key`` is ``None`` the audio is uploaded to S3 in parallel with
+        the AI call and the result is remembered under ``fingerprint``.
+        Returns the assistant message and the conversation title.
+
+        The work is split into ``start_voice_message`` / ``generate_voice_reply``
+        / ``complete_voice_message`` so async callers can keep the database
+        steps apart from the slow provider and S3 calls.
+        """
+        voice_message, chat_messages = cls.start_voice_message(
+            conversation, audio_bytes, mime_type, fingerprint, mood_data, text_context, duration, s3_key,
+        )
+        full_response, uploaded_key, title = cls.generate_voice_reply(
+            user, chat_messages, audio_bytes, mime_type, text_context,
+            upload=s3_key is None, is_new_conversation=is_new_conversation,
+        )
+        assistant_message = cls.complete_voice_message(
+            conversation, user, voice_message, audio_bytes, mime_type, fingerprint, mood_data,
+            full_response, uploaded_key, title if is_new_conversation else None,
+        )
+        return assistant_message, title
+
+    @classmethod
+    def start_voice_message(
+        cls,
+        conversation: Conversation,
+        audio_bytes: bytes,
+        mime_type: str,
+        fingerprint: str,
+        mood_data: Optional[Dict],
+        text_context: str,
+        duration: float | None,
+        s3_key: Optional[str],
+    ) -> Tuple[Message, List[ChatMessage]]:
+        """Save the user's voice message and build the history sent to the AI (database only)."""
+        message_with_mood = text_context + cls.build_mood_context_note(mood_data)
+
+        voice_message = cls.save_voice_message(
+            conversation=conversation,
+            s3_key=s3_key or '',  # placeholder on a cache miss — updated after S3 upload
+            mime_type=mime_type,
+            duration=duration,
+            text_content=text_context,
+            fingerprint=fingerprint,
+        )
+
+        if mood_data is not None:
+            voice_message.voice_mood = mood_data
+            voice_message.save(update_fields=['voice_mood'])
+            logger.debug(
+                "Stored mood data on message | message_id=%s mood=%s",
+                voice_message.id, mood_data['mood'],
+            )
+
+        chat_messages = cls.prepare_chat_messages(
+            conversation, override_last_user_content=message_with_mood
+        )
+        return voice_message, chat_messages
+
+    @classmethod
+    def generate_voice_reply(
+        cls,
+        user,
+        chat_messages: List[ChatMessage],
+        audio_bytes: bytes,
+        mime_type: str,
+        text_context: str,
+        upload: bool,
+        is_new_conversation: bool,
+    ) -> Tuple[str, Optional[str], str]:
+        """
+        Call the AI (and upload to S3 when ``upload``) for a started voice
+        message. Returns the raw response, the new S3 key or ``None``, and the
+        conversation title.
+        """
+        from concurrent.futures import ThreadPoolExecutor, Future
+
+        title = text_context[:80] if text_context else "Voice message"
+        s3_key = None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            s3_future: Future | None = None
+            if upload:
+                s3_future = executor.submit(
+                    upload_voice_file,
+                    file_bytes=audio_bytes,
+                    user_id=user.id,
+                    mime_type=mime_type,
+                )
+
+            full_response_parts: list[str] = []
+            for chunk in cls.get_ai_response_stream_with_audio(
+                user=user,
+                chat_messages=chat_messages,
+                audio_bytes=audio_bytes,
+                audio_mime_type=mime_type,
+            ):
+                full_response_parts.append(chunk)
+
+            if s3_future is not None:
+                s3_key = s3_future.result(timeout=30)
+
+        full_response = ''.join(full_response_parts)
+        logger.info("Voice chat AI response: %s", full_response[:200])
+
+        if is_new_conversation:
+            provider = get_ai_provider()
+            title = provider.generate_conversation_title(
+                user_message=text_context,
+                ai_response=full_response,
+                audio_bytes=audio_bytes,
+                audio_mime_type=mime_type,
+            )
+        return full_response, s3_key, title
+
+    @classmethod
+    def complete_voice_message(
+        cls,
+        conversation: Conversation,
+        user,
+        voice_message: Message,
+        audio_bytes: bytes,
+        mime_type: str,
+        fingerprint: str,
+        mood_data: Optional[Dict],
+        full_response: str,
+        uploaded_s3_key: Optional[str],
+        new_title: Optional[str],
+    ) -> Message:
+        """Store the upload, the assistant message and the title (database only)."""
+        if uploaded_s3_key is not None:
+            voice_message.voice_s3_key = uploaded_s3_key
+            voice_message.save(update_fields=['voice_s3_key'])
+            store_processed_voice(
+                user.id,
+                fingerprint,
+                ProcessedVoice(
+                    audio_bytes=audio_bytes,
+                    mime_type=mime_type,
+                    s3_key=uploaded_s3_key,
+                    voice_mood=mood_data,
+                ),
+            )
+
+        assistant_message = cls.process_ai_response(
+            conversation=conversation,
+            full_response=full_response,
+            user=user,
+        )
+        if new_title is not None:
+            conversation.title = new_title
+            conversation.save(update_fields=['title'])
+
+        return assistant_message
+
     # ── AI Response Processing ───────────────────────────────────
 
     @classmethod
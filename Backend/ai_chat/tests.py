@@ -1,11 +1,27 @@
 import json
+from types import SimpleNamespace
 from unittest.mock import patch
 
+import numpy as np
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 
 from .ai_provider import AIProviderRateLimitError
-from .models import AIChoice, Conversation, Message
+from .consumers import VoiceStreamConsumer
+from .models import AIChoice, Conversation, Message, VoiceAsset
+from .s3_storage import (
+	PRESIGNED_URL_REFRESH_MARGIN_SECONDS,
+	generate_presigned_url,
+	generate_presigned_urls,
+)
+from .voice_cache import clear_processed_voice_cache
+from .voice_service import StreamingVoiceAnalyzer
+from PUPtime.throttling import TokenBucket, VoiceChatThrottle
 from task.models import TaskTemplate
 from user.models import User
 
@@ -53,6 +69,11 @@ class _PlainTextProvider:
 		yield "Hello! I am your assistant. How can I help you today?"
 
 
+class _ReplyProvider:
+	def stream_with_tools(self, messages, tools, user=None):
+		yield "Hi!"
+
+
 class ChatViewTests(APITestCase):
 	def setUp(self):
 		self.user = User.objects.create_user(
@@ -72,6 +93,7 @@ class ChatViewTests(APITestCase):
 		payload = response.data
 		self.assertEqual(payload["error_code"], "rate_limited")
 		self.assertEqual(payload["retry_after_seconds"], 46)
+		self.assertEqual(response["Retry-After"], "46")
 		self.assertIn("Gemini quota exceeded", payload["error"])
 
 		conversation = Conversation.objects.get(user=self.user)
@@ -207,3 +229,348 @@ class ChatViewTests(APITestCase):
 
 		self.assertEqual(response.status_code, 404)
 		self.assertEqual(TaskTemplate.objects.filter(user=self.user).count(), 0)
+
+
+class _FakeS3Client:
+	def __init__(self):
+		self.signed = []
+
+	def generate_presigned_url(self, operation, Params, ExpiresIn):
+		self.signed.append(Params["Key"])
+		return f"https://s3.example.com/{Params['Key']}?expires={ExpiresIn}"
+
+
+class PresignedUrlCacheTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.s3_client = _FakeS3Client()
+		patcher = patch("ai_chat.s3_storage._get_s3_client", return_value=self.s3_client)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+		self.user = User.objects.create_user(
+			username="voicer",
+			email="voicer@example.com",
+			password="testpass123",
+		)
+		self.client.force_authenticate(user=self.user)
+
+	def test_presigned_url_is_reused_until_near_expiry(self):
+		first = generate_presigned_url("voice-messages/1/a.mp3")
+		second = generate_presigned_url("voice-messages/1/a.mp3")
+
+		self.assertEqual(first, second)
+		self.assertEqual(self.s3_client.signed, ["voice-messages/1/a.mp3"])
+
+	def test_entries_expire_before_the_url_does(self):
+		with patch("ai_chat.s3_storage.cache") as mock_cache:
+			mock_cache.get_many.return_value = {}
+			generate_presigned_url("voice-messages/1/a.mp3", expiry_seconds=600)
+
+		_args, kwargs = mock_cache.set_many.call_args
+		self.assertEqual(kwargs["timeout"], 600 - PRESIGNED_URL_REFRESH_MARGIN_SECONDS)
+
+	def test_batch_signing_only_signs_missing_keys(self):
+		generate_presigned_url("voice-messages/1/a.mp3")
+
+		urls = generate_presigned_urls([
+			"voice-messages/1/a.mp3",
+			"voice-messages/1/b.mp3",
+			"voice-messages/1/b.mp3",
+		])
+
+		self.assertEqual(set(urls), {"voice-messages/1/a.mp3", "voice-messages/1/b.mp3"})
+		self.assertEqual(self.s3_client.signed, ["voice-messages/1/a.mp3", "voice-messages/1/b.mp3"])
+
+	def test_conversation_detail_signs_voice_messages_in_one_batch(self):
+		conversation = Conversation.objects.create(user=self.user, title="Voice")
+		for index in range(3):
+			Message.objects.create(
+				conversation=conversation,
+				role=Message.Role.USER,
+				voice_s3_key=f"voice-messages/{self.user.id}/{index}.mp3",
+				voice_mime_type="audio/mp3",
+			)
+
+		with patch(
+			"ai_chat.serializers.generate_presigned_urls",
+			wraps=generate_presigned_urls,
+		) as batch_sign, patch("ai_chat.serializers.generate_presigned_url") as single_sign:
+			response = self.client.get(
+				reverse("ai-conversation-detail", kwargs={"pk": conversation.id})
+			)
+
+		self.assertEqual(response.status_code, 200)
+		batch_sign.assert_called_once()
+		single_sign.assert_not_called()
+		self.assertTrue(all(message["voice_url"] for message in response.data["messages"]))
+
+
+class _AudioProvider:
+	def stream_with_tools_and_audio(self, messages, tools, audio_bytes, audio_mime_type, user=None):
+		yield "Got your voice note."
+
+
+@patch("ai_chat.services.get_task_tools", return_value=[])
+@patch("ai_chat.services.get_ai_provider", return_value=_AudioProvider())
+@patch("ai_chat.views.classify_mood", return_value={"mood": "neutral", "confidence": "low", "features": {}, "ai_hint": ""})
+@patch("ai_chat.views.analyze_audio", return_value={})
+@patch("ai_chat.services.upload_voice_file", return_value="voice-messages/1/converted.mp3")
+@patch("subprocess.run")
+class VoiceUploadDedupTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		clear_processed_voice_cache()
+		self.user = User.objects.create_user(
+			username="retrier",
+			email="retrier@example.com",
+			password="testpass123",
+		)
+		self.client.force_authenticate(user=self.user)
+		self.conversation = Conversation.objects.create(user=self.user, title="Voice")
+
+	def _send(self, payload=b"same-recording"):
+		audio = SimpleUploadedFile("note.webm", payload, content_type="audio/webm")
+		return self.client.post(
+			reverse("ai-chat-voice"),
+			{"audio": audio, "conversation_id": str(self.conversation.id)},
+			format="multipart",
+		)
+
+	def test_resent_voice_note_skips_conversion_analysis_and_upload(
+		self, mock_ffmpeg, mock_upload, mock_analyze, _mock_classify, _mock_provider, _mock_tools,
+	):
+		self.assertEqual(self._send().status_code, 200)
+		self.assertEqual(self._send().status_code, 200)
+
+		self.assertEqual(mock_ffmpeg.call_count, 1)
+		self.assertEqual(mock_analyze.call_count, 1)
+		self.assertEqual(mock_upload.call_count, 1)
+
+		voice_messages = list(self.conversation.messages.filter(voice_fingerprint__isnull=False))
+		self.assertEqual(len(voice_messages), 2)
+		self.assertEqual({m.voice_s3_key for m in voice_messages}, {"voice-messages/1/converted.mp3"})
+		self.assertEqual({m.voice_mood["mood"] for m in voice_messages}, {"neutral"})
+		self.assertEqual(VoiceAsset.objects.filter(user=self.user).count(), 1)
+
+	def test_different_recordings_are_processed_separately(
+		self, mock_ffmpeg, mock_upload, _mock_analyze, _mock_classify, _mock_provider, _mock_tools,
+	):
+		self._send(b"first")
+		self._send(b"second")
+
+		self.assertEqual(mock_ffmpeg.call_count, 2)
+		self.assertEqual(mock_upload.call_count, 2)
+
+	def test_database_entry_is_used_when_the_local_cache_is_cold(
+		self, mock_ffmpeg, mock_upload, _mock_analyze, _mock_classify, _mock_provider, _mock_tools,
+	):
+		self._send()
+		clear_processed_voice_cache()
+
+		with patch("ai_chat.voice_cache.download_voice_file", return_value=b"converted") as mock_download:
+			self.assertEqual(self._send().status_code, 200)
+
+		mock_download.assert_called_once_with("voice-messages/1/converted.mp3")
+		self.assertEqual(mock_ffmpeg.call_count, 1)
+		self.assertEqual(mock_upload.call_count, 1)
+
+
+class StreamingVoiceAnalyzerTests(SimpleTestCase):
+	def setUp(self):
+		sample_rate = StreamingVoiceAnalyzer.SAMPLE_RATE
+		t = np.arange(sample_rate * 2) / sample_rate
+		self.samples = (0.3 * np.sin(2 * np.pi * 180 * t)).astype(np.float32)
+		self.samples[sample_rate // 2:sample_rate] = 0
+		self.pcm = (self.samples * 32767).astype("<i2").tobytes()
+
+	def _analyze_in_chunks(self, chunk_size):
+		analyzer = StreamingVoiceAnalyzer()
+		for start in range(0, len(self.pcm), chunk_size):
+			analyzer.feed_pcm16(self.pcm[start:start + chunk_size])
+		return analyzer.features()
+
+	def test_features_do_not_depend_on_chunk_boundaries(self):
+		small = self._analyze_in_chunks(640)
+		large = self._analyze_in_chunks(32000)
+
+		for name, value in small.items():
+			self.assertAlmostEqual(value, large[name], places=4, msg=name)
+
+	def test_features_track_the_signal(self):
+		features = self._analyze_in_chunks(3200)
+
+		self.assertAlmostEqual(features["duration_seconds"], 2.0)
+		self.assertAlmostEqual(features["average_pitch"], 180, delta=10)
+		self.assertAlmostEqual(features["silence_ratio"], 0.25, delta=0.05)
+		self.assertGreater(features["rms_energy"], 0.1)
+
+
+class VoiceStreamConsumerTests(SimpleTestCase):
+	def _communicator(self):
+		communicator = WebsocketCommunicator(VoiceStreamConsumer.as_asgi(), "/ws/ai/voice/")
+		communicator.scope["user"] = SimpleNamespace(is_authenticated=True, id=1)
+		return communicator
+
+	def test_rejects_audio_before_start(self):
+		async def scenario():
+			communicator = self._communicator()
+			connected, _ = await communicator.connect()
+			self.assertTrue(connected)
+			await communicator.send_to(bytes_data=b"\x00\x00" * 160)
+			response = await communicator.receive_json_from()
+			await communicator.disconnect()
+			return response
+
+		response = async_to_sync(scenario)()
+		self.assertEqual(response["type"], "error")
+
+	def test_end_without_audio_is_an_error(self):
+		async def scenario():
+			communicator = self._communicator()
+			await communicator.connect()
+			await communicator.send_json_to({"type": "start"})
+			started = await communicator.receive_json_from()
+			await communicator.send_json_to({"type": "end"})
+			response = await communicator.receive_json_from()
+			await communicator.disconnect()
+			return started, response
+
+		started, response = async_to_sync(scenario)()
+		self.assertEqual(started["type"], "started")
+		self.assertEqual(response, {"type": "error", "error": "No audio received."})
+
+	def test_rejects_out_of_range_sample_rates(self):
+		async def scenario():
+			communicator = self._communicator()
+			await communicator.connect()
+			responses = []
+			for sample_rate in (-16000, 1, 96000):
+				await communicator.send_json_to({"type": "start", "sample_rate": sample_rate})
+				responses.append(await communicator.receive_json_from())
+			await communicator.disconnect()
+			return responses
+
+		for response in async_to_sync(scenario)():
+			self.assertEqual(response, {"type": "error", "error": "sample_rate must be between 8000 and 48000."})
+
+	@override_settings(
+		THROTTLE_BUCKETS={"ai": {"capacity": 4, "refill_per_minute": 2}},
+		THROTTLE_COSTS={"voice_chat": 4},
+	)
+	def test_end_is_throttled_when_the_ai_bucket_is_empty(self):
+		cache.clear()
+		user = SimpleNamespace(is_authenticated=True, id=1)
+		self.assertEqual(VoiceChatThrottle.charge_user(user), 0)
+
+		async def scenario():
+			communicator = self._communicator()
+			await communicator.connect()
+			await communicator.send_json_to({"type": "start"})
+			await communicator.receive_json_from()
+			await communicator.send_to(bytes_data=b"\x00\x01" * 160)
+			await communicator.send_json_to({"type": "end"})
+			response = await communicator.receive_json_from()
+			await communicator.disconnect()
+			return response
+
+		response = async_to_sync(scenario)()
+		self.assertEqual(response["error_code"], "throttled")
+		self.assertIn(response["retry_after_seconds"], (119, 120))
+
+
+@override_settings(
+	THROTTLE_BUCKETS={
+		"api": {"capacity": 3, "refill_per_minute": 60},
+		"ai": {"capacity": 2, "refill_per_minute": 1},
+	},
+	THROTTLE_COSTS={"request": 1, "text_chat": 1, "voice_chat": 2},
+)
+@patch("ai_chat.services.get_task_tools", return_value=[])
+@patch("ai_chat.services.get_ai_provider", return_value=_ReplyProvider())
+class ThrottleTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(
+			username="flooder",
+			email="flooder@example.com",
+			password="testpass123",
+		)
+		self.client.force_authenticate(user=self.user)
+		self.conversation = Conversation.objects.create(user=self.user, title="Flood")
+		self.now = 1_000_000.0
+		clock = patch("PUPtime.throttling.time.time", side_effect=lambda: self.now)
+		clock.start()
+		self.addCleanup(clock.stop)
+
+	def _chat(self):
+		return self.client.post(
+			reverse("ai-chat"),
+			{"message": "Hi", "conversation_id": str(self.conversation.id)},
+			format="json",
+		)
+
+	def _voice(self):
+		audio = SimpleUploadedFile("note.webm", b"recording", content_type="audio/webm")
+		return self.client.post(
+			reverse("ai-chat-voice"),
+			{"audio": audio, "conversation_id": str(self.conversation.id)},
+			format="multipart",
+		)
+
+	def test_chat_spends_from_the_ai_bucket_with_exact_retry_after(self, _mock_provider, _mock_tools):
+		self.assertEqual(self._chat().status_code, 200)
+		self.assertEqual(self._chat().status_code, 200)
+
+		response = self._chat()
+		self.assertEqual(response.status_code, 429)
+		self.assertEqual(response["Retry-After"], "60")
+
+		# A voice message costs two text messages, so it waits for both tokens.
+		response = self._voice()
+		self.assertEqual(response.status_code, 429)
+		self.assertEqual(response["Retry-After"], "120")
+
+		self.now += 30
+		self.assertEqual(self._chat()["Retry-After"], "30")
+		self.now += 30
+		self.assertEqual(self._chat().status_code, 200)
+
+	def test_ai_calls_also_spend_the_request_bucket(self, _mock_provider, _mock_tools):
+		self.assertEqual(self._chat().status_code, 200)
+		self.assertEqual(self._chat().status_code, 200)
+		self.assertEqual(self.client.get(reverse("ai-conversations")).status_code, 200)
+
+		response = self.client.get(reverse("ai-conversations"))
+		self.assertEqual(response.status_code, 429)
+		self.assertEqual(response["Retry-After"], "1")
+
+		self.now += 1
+		self.assertEqual(self.client.get(reverse("ai-conversations")).status_code, 200)
+
+	def test_refused_by_the_request_bucket_leaves_the_ai_bucket_untouched(self, _mock_provider, _mock_tools):
+		for _ in range(3):
+			self.assertEqual(self.client.get(reverse("ai-conversations")).status_code, 200)
+
+		response = self._chat()
+		self.assertEqual(response.status_code, 429)
+		self.assertEqual(response["Retry-After"], "1")
+		self.assertEqual(TokenBucket("ai").wait(f"user:{self.user.id}", 2), 0)
+
+	def test_refused_by_the_ai_bucket_leaves_the_request_bucket_untouched(self, _mock_provider, _mock_tools):
+		self.assertEqual(self._chat().status_code, 200)
+		self.assertEqual(self._chat().status_code, 200)
+
+		self.assertEqual(self._chat().status_code, 429)
+		self.assertEqual(self._voice().status_code, 429)
+		self.assertEqual(self.client.get(reverse("ai-conversations")).status_code, 200)
+
+	def test_anonymous_clients_cannot_pick_their_bucket(self, _mock_provider, _mock_tools):
+		self.client.force_authenticate(user=None)
+		credentials = {"email": "nobody@example.com", "password": "wrong"}
+		for i in range(3):
+			response = self.client.post("/user/login/", credentials, format="json", HTTP_X_FORWARDED_FOR=f"10.0.0.{i}")
+			self.assertEqual(response.status_code, 401)
+
+		response = self.client.post("/user/login/", credentials, format="json", HTTP_X_FORWARDED_FOR="10.0.0.9")
+		self.assertEqual(response.status_code, 429)
@@ -4,7 +4,7 @@ import uuid
 from datetime import timedelta
 
 from django.db import transaction
-from django.db.models import Prefetch
+from django.db.models import Count, Max, Prefetch
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from drf_yasg import openapi
@@ -15,8 +15,12 @@ from rest_framework.generics import ListAPIView, RetrieveDestroyAPIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
+from PUPtime.conditional import ConditionalGetMixin
+from PUPtime.throttling import TextChatThrottle, VoiceChatThrottle
+
 from .ai_provider import AIProviderRateLimitError, ChatMessage, get_ai_provider
 from .Tools.task_tools import get_task_tools
 from .models import AIChoice, Conversation, Message
@@ -30,8 +34,9 @@ from .serializers import (
     SendMessageSerializer,
     VoiceChatSerializer,
 )
-from .s3_storage import ALLOWED_MIME_TYPES, MAX_VOICE_FILE_SIZE, upload_voice_file, generate_presigned_url
+from .s3_storage import ALLOWED_MIME_TYPES, MAX_VOICE_FILE_SIZE, generate_presigned_url
 from .voice_service import analyze_audio, classify_mood
+from .voice_cache import fingerprint_audio, get_processed_voice
 from task.models import TaskTemplate, TaskOverride
 from task.serializers import TaskSerializer, TaskOverrideSerializer
 from task.views import _parse_iso
@@ -50,7 +55,7 @@ logger = logging.getLogger(__name__)
         responses={200: ConversationListSerializer(many=True)},
     ),
 )
-class ConversationListView(ListAPIView):
+class ConversationListView(ConditionalGetMixin, ListAPIView):
     """
     GET /ai/conversations/
     List all conversations for the user
@@ -58,6 +63,11 @@ class ConversationListView(ListAPIView):
     serializer_class = ConversationListSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_version(self, request, *args, **kwargs):
+        return Conversation.objects.filter(user=request.user).aggregate(
+            count=Count('id'), updated=Max('updated_at'),
+        )
+
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Conversation.objects.none()
@@ -399,6 +409,14 @@ class ApproveAIChoiceView(APIView):
         raise ValidationError({'action_name': f'Unsupported action: {action_name}'})
 
 
+def _rate_limited(payload, retry_after_seconds):
+    headers = {}
+    if retry_after_seconds is not None:
+        payload['retry_after_seconds'] = retry_after_seconds
+        headers['Retry-After'] = str(retry_after_seconds)
+    return Response(payload, status=status.HTTP_429_TOO_MANY_REQUESTS, headers=headers)
+
+
 class ChatView(APIView):
     """
     POST /ai/chat/
@@ -427,6 +445,7 @@ class ChatView(APIView):
     """
 
     permission_classes = [IsAuthenticated]
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES + [TextChatThrottle]
 
     @swagger_auto_schema(
         tags=['AI Chat'],
@@ -441,6 +460,7 @@ class ChatView(APIView):
             200: openapi.Response(description='AI response.', schema=ChatResponseSerializer),
             400: openapi.Response(description='Invalid request body.'),
             404: openapi.Response(description='Conversation not found.'),
+            429: openapi.Response(description='AI quota for this user or the provider exhausted; see `Retry-After`.'),
         },
     )
     def post(self, request):
@@ -509,9 +529,7 @@ class ChatView(APIView):
                 'error': str(error),
                 'error_code': 'rate_limited',
             }
-            if error.retry_after_seconds is not None:
-                error_payload['retry_after_seconds'] = error.retry_after_seconds
-            return Response(error_payload, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            return _rate_limited(error_payload, error.retry_after_seconds)
         except Exception:
             logger.exception("Error while generating AI response")
             return Response(
@@ -535,6 +553,7 @@ class VoiceChatView(APIView):
 
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES + [VoiceChatThrottle]
 
     @swagger_auto_schema(
         tags=['AI Chat'],
@@ -566,6 +585,7 @@ class VoiceChatView(APIView):
             200: openapi.Response(description='AI response.', schema=ChatResponseSerializer),
             400: openapi.Response(description='Invalid audio file or request.'),
             413: openapi.Response(description='Audio file too large.'),
+            429: openapi.Response(description='AI quota for this user or the provider exhausted; see `Retry-After`.'),
         },
     )
     def post(self, request):
@@ -601,52 +621,54 @@ class VoiceChatView(APIView):
         import os
         import subprocess
 
-        try:
-            with tempfile.NamedTemporaryFile(delete=False) as f_in, tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f_out:
-                f_in.write(audio_bytes)
-                f_in.flush()
-                subprocess.run(
-                    ['ffmpeg', '-y', '-i', f_in.name, '-c:a', 'libmp3lame', '-q:a', '2', f_out.name],
-                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
-                )
-                with open(f_out.name, 'rb') as f:
-                    audio_bytes = f.read()
-            os.unlink(f_in.name)
-            os.unlink(f_out.name)
-            mime_type = 'audio/mp3'
-        except Exception as e:
-            logger.error(f"Audio conversion failed: {e}")
-            return Response({'error': 'Failed to process audio format.'}, status=status.HTTP_400_BAD_REQUEST)
-
-
-        mood_data = None
-        mood_context_note = ''
-        try:
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as mood_tmp:
-                mood_tmp.write(audio_bytes)
-                mood_tmp_path = mood_tmp.name
-
-            features = analyze_audio(mood_tmp_path)
-            mood_data = classify_mood(features)
-            os.unlink(mood_tmp_path)
-
-            mood_context_note = (
-                f"\n\n[System mood context — do not read aloud or mention this note directly: "
-                f"Based on the user's voice, they appear to be feeling {mood_data['mood']} "
-                f"(confidence: {mood_data['confidence']}). "
-                f"{mood_data['ai_hint']} "
-                f"Respond with emotional awareness. If they are sad or anxious, warmly acknowledge "
-                f"their feeling first, then gently suggest a helpful activity or task if appropriate.]"
-            )
+        fingerprint = fingerprint_audio(audio_bytes)
+        processed = get_processed_voice(request.user.id, fingerprint)
+
+        if processed is not None:
             logger.info(
-                "Voice mood analysis complete | mood=%s confidence=%s user=%s",
-                mood_data['mood'], mood_data['confidence'], request.user.id,
-            )
-        except Exception as mood_err:
-            logger.warning(
-                "Mood analysis failed, continuing without mood context | error=%s",
-                mood_err,
+                "Voice upload cache hit, skipping conversion and analysis | user=%s fingerprint=%s",
+                request.user.id, fingerprint,
             )
+            audio_bytes = processed.audio_bytes
+            mime_type = processed.mime_type
+            mood_data = processed.voice_mood
+        else:
+            try:
+                with tempfile.NamedTemporaryFile(delete=False) as f_in, tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f_out:
+                    f_in.write(audio_bytes)
+                    f_in.flush()
+                    subprocess.run(
+                        ['ffmpeg', '-y', '-i', f_in.name, '-c:a', 'libmp3lame', '-q:a', '2', f_out.name],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
+                    )
+                    with open(f_out.name, 'rb') as f:
+                        audio_bytes = f.read()
+                os.unlink(f_in.name)
+                os.unlink(f_out.name)
+                mime_type = 'audio/mp3'
+            except Exception as e:
+                logger.error(f"Audio conversion failed: {e}")
+                return Response({'error': 'Failed to process audio format.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            mood_data = None
+            try:
+                with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as mood_tmp:
+                    mood_tmp.write(audio_bytes)
+                    mood_tmp_path = mood_tmp.name
+
+                features = analyze_audio(mood_tmp_path)
+                mood_data = classify_mood(features)
+                os.unlink(mood_tmp_path)
+
+                logger.info(
+                    "Voice mood analysis complete | mood=%s confidence=%s user=%s",
+                    mood_data['mood'], mood_data['confidence'], request.user.id,
+                )
+            except Exception as mood_err:
+                logger.warning(
+                    "Mood analysis failed, continuing without mood context | error=%s",
+                    mood_err,
+                )
 
         try:
             title = text_context[:80] if text_context else "Voice message"
@@ -657,71 +679,18 @@ class VoiceChatView(APIView):
             )
             current_conversation_id = str(conversation.id)
 
-
-            message_with_mood = text_context + mood_context_note
-
-            voice_message = ChatService.save_voice_message(
+            assistant_message, title = ChatService.respond_to_voice_message(
                 conversation=conversation,
-                s3_key='',  # placeholder — updated after S3 upload
+                user=request.user,
+                audio_bytes=audio_bytes,
                 mime_type=mime_type,
+                fingerprint=fingerprint,
+                mood_data=mood_data,
+                text_context=text_context,
                 duration=duration,
-                text_content=text_context,
-            )
-
-            if mood_data is not None:
-                voice_message.voice_mood = mood_data
-                voice_message.save(update_fields=['voice_mood'])
-                logger.debug(
-                    "Stored mood data on message | message_id=%s mood=%s",
-                    voice_message.id, mood_data['mood'],
-                )
-
-            from concurrent.futures import ThreadPoolExecutor, Future
-
-            chat_messages = ChatService.prepare_chat_messages(
-                conversation, override_last_user_content=message_with_mood
+                s3_key=processed.s3_key if processed else None,
+                is_new_conversation=conversation_id is None,
             )
-
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                s3_future: Future = executor.submit(
-                    upload_voice_file,
-                    file_bytes=audio_bytes,
-                    user_id=request.user.id,
-                    mime_type=mime_type,
-                )
-
-                full_response_parts: list[str] = []
-                for chunk in ChatService.get_ai_response_stream_with_audio(
-                    user=request.user,
-                    chat_messages=chat_messages,
-                    audio_bytes=audio_bytes,
-                    audio_mime_type=mime_type,
-                ):
-                    full_response_parts.append(chunk)
-
-                s3_key = s3_future.result(timeout=30)
-
-            voice_message.voice_s3_key = s3_key
-            voice_message.save(update_fields=['voice_s3_key'])
-
-            full_response = ''.join(full_response_parts)
-            logger.info("Voice chat AI response: %s", full_response[:200])
-
-            assistant_message = ChatService.process_ai_response(
-                conversation=conversation,
-                full_response=full_response,
-                user=request.user,
-            )
-            if conversation_id is None:
-                provider = get_ai_provider()
-                title = provider.generate_conversation_title(
-                    user_message=text_context,
-                    ai_response=full_response,
-                    audio_bytes=audio_bytes,
-                    audio_mime_type=mime_type,
-                )
-                conversation.title = title
-                conversation.save(update_fields=['title'])
             return Response(
                 {
                     'conversation_id': str(conversation.id),
@@ -745,9 +714,7 @@ class VoiceChatView(APIView):
                 'error': str(error),
                 'error_code': 'rate_limited',
             }
-            if error.retry_after_seconds is not None:
-                error_payload['retry_after_seconds'] = error.retry_after_seconds
-            return Response(error_payload, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            return _rate_limited(error_payload, error.retry_after_seconds)
         except ValueError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception:
@@ -0,0 +1,115 @@
+"""
+Content-addressed cache for processed voice uploads.
+
+Flaky mobile networks often resend the exact same recording. Every upload is
+fingerprinted (SHA-256 of the raw bytes) and the expensive results — the
+ffmpeg-converted audio, the mood analysis and the S3 key — are remembered per
+user, first in a bounded in-process LRU and then in the ``VoiceAsset`` table.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .models import VoiceAsset
+from .s3_storage import download_voice_file
+
+logger = logging.getLogger(__name__)
+
+
+VOICE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ProcessedVoice:
+    audio_bytes: bytes
+    mime_type: str
+    s3_key: str
+    voice_mood: dict | None
+
+
+class _ProcessedVoiceLRU:
+    """Thread-safe LRU bounded by the total size of the cached audio."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, ProcessedVoice] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> ProcessedVoice | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: ProcessedVoice) -> None:
+        if len(entry.audio_bytes) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.audio_bytes)
+            self._entries[key] = entry
+            self._size += len(entry.audio_bytes)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.audio_bytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_lru = _ProcessedVoiceLRU(VOICE_CACHE_MAX_BYTES)
+
+
+def fingerprint_audio(audio_bytes: bytes) -> str:
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+
+def get_processed_voice(user_id: int, fingerprint: str) -> ProcessedVoice | None:
+    """Return the cached processing result for this upload, or ``None`` on a miss."""
+    key = (user_id, fingerprint)
+    entry = _lru.get(key)
+    if entry is not None:
+        return entry
+
+    asset = VoiceAsset.objects.filter(user_id=user_id, fingerprint=fingerprint).first()
+    if asset is None:
+        return None
+
+    audio_bytes = download_voice_file(asset.s3_key)
+    if audio_bytes is None:
+        return None
+    logger.debug("Voice asset %s for user %s loaded from the database", fingerprint, user_id)
+
+    entry = ProcessedVoice(
+        audio_bytes=audio_bytes,
+        mime_type=asset.mime_type,
+        s3_key=asset.s3_key,
+        voice_mood=asset.voice_mood,
+    )
+    _lru.put(key, entry)
+    return entry
+
+
+def store_processed_voice(user_id: int, fingerprint: str, entry: ProcessedVoice) -> None:
+    _lru.put((user_id, fingerprint), entry)
+    VoiceAsset.objects.get_or_create(
+        user_id=user_id,
+        fingerprint=fingerprint,
+        defaults={
+            's3_key': entry.s3_key,
+            'mime_type': entry.mime_type,
+            'voice_mood': entry.voice_mood,
+        },
+    )
+
+
+def clear_processed_voice_cache() -> None:
+    _lru.clear()
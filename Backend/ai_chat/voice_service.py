@@ -86,6 +86,137 @@ def analyze_audio(audio_path: str) -> dict:
     return features
 
 
+class StreamingVoiceAnalyzer:
+    """
+    Incremental version of ``analyze_audio`` for audio that arrives in chunks.
+
+    Samples are framed exactly like librosa's defaults (2048-sample frames,
+    512-sample hop) as they arrive. Only the unfinished tail of the stream is
+    kept in a small sliding buffer; every completed frame is folded into
+    running RMS, zero-crossing, spectral-centroid and pitch statistics, so
+    ``features()`` is almost free once the last chunk has been fed.
+
+    Pitch uses YIN on voiced frames instead of pYIN, and the silence ratio is
+    derived from per-frame RMS relative to the loudest frame (25 dB, as in
+    ``librosa.effects.split``), so the numbers track ``analyze_audio`` closely
+    without needing the whole recording up front.
+    """
+
+    SAMPLE_RATE = 16000
+    FRAME_LENGTH = 2048
+    HOP_LENGTH = 512
+    SILENCE_TOP_DB = 25
+    VOICED_RMS_FLOOR = 0.01
+    PITCH_FMIN = 75
+    PITCH_FMAX = 500
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE) -> None:
+        self.sample_rate = sample_rate
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._total_samples = 0
+        self._frame_rms: list[np.ndarray] = []
+        self._zcr_sum = 0.0
+        self._centroid_sum = 0.0
+        self._frame_count = 0
+        # Welford accumulators for the pitch of voiced frames.
+        self._pitch_count = 0
+        self._pitch_mean = 0.0
+        self._pitch_m2 = 0.0
+        self._freqs = np.fft.rfftfreq(self.FRAME_LENGTH, d=1.0 / sample_rate)
+        self._window = np.hanning(self.FRAME_LENGTH + 1)[:-1].astype(np.float32)
+
+    @property
+    def duration_seconds(self) -> float:
+        return self._total_samples / self.sample_rate
+
+    def feed_pcm16(self, data: bytes) -> None:
+        """Feed little-endian signed 16-bit mono PCM."""
+        usable = len(data) - (len(data) % 2)
+        samples = np.frombuffer(data[:usable], dtype='<i2').astype(np.float32) / 32768.0
+        self.feed(samples)
+
+    def feed(self, samples: np.ndarray) -> None:
+        if samples.size == 0:
+            return
+        self._total_samples += samples.size
+        buffer = np.concatenate([self._tail, samples.astype(np.float32, copy=False)])
+
+        n_frames = 0
+        if buffer.size >= self.FRAME_LENGTH:
+            n_frames = 1 + (buffer.size - self.FRAME_LENGTH) // self.HOP_LENGTH
+            frames = np.lib.stride_tricks.sliding_window_view(
+                buffer, self.FRAME_LENGTH
+            )[::self.HOP_LENGTH][:n_frames]
+            self._accumulate(frames)
+
+        self._tail = buffer[n_frames * self.HOP_LENGTH:].copy()
+
+    def _accumulate(self, frames: np.ndarray) -> None:
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        self._frame_rms.append(rms)
+
+        signs = np.signbit(frames)
+        self._zcr_sum += float(np.sum(np.mean(signs[:, 1:] != signs[:, :-1], axis=1)))
+
+        magnitudes = np.abs(np.fft.rfft(frames * self._window, axis=1))
+        energy = magnitudes.sum(axis=1)
+        centroids = np.divide(
+            magnitudes @ self._freqs, energy,
+            out=np.zeros_like(energy), where=energy > 0,
+        )
+        self._centroid_sum += float(np.sum(centroids))
+        self._frame_count += frames.shape[0]
+
+        voiced = frames[rms >= self.VOICED_RMS_FLOOR]
+        if voiced.shape[0]:
+            f0 = librosa.yin(
+                voiced.reshape(-1),
+                fmin=self.PITCH_FMIN,
+                fmax=self.PITCH_FMAX,
+                sr=self.sample_rate,
+                frame_length=self.FRAME_LENGTH,
+                hop_length=self.FRAME_LENGTH,
+                center=False,
+            )
+            for value in f0[np.isfinite(f0)]:
+                self._pitch_count += 1
+                delta = value - self._pitch_mean
+                self._pitch_mean += delta / self._pitch_count
+                self._pitch_m2 += delta * (value - self._pitch_mean)
+
+    def features(self) -> dict:
+        """Return the same feature dict as ``analyze_audio`` for everything fed so far."""
+        if self._frame_count == 0 and self._tail.size:
+            padded = np.zeros(self.FRAME_LENGTH, dtype=np.float32)
+            padded[:self._tail.size] = self._tail
+            self._accumulate(padded[np.newaxis, :])
+
+        if self._frame_count == 0:
+            rms_values = np.zeros(0, dtype=np.float32)
+        else:
+            rms_values = np.concatenate(self._frame_rms)
+
+        if rms_values.size and rms_values.max() > 0:
+            db = 20 * np.log10(np.maximum(rms_values, 1e-10) / rms_values.max())
+            silence_ratio = float(np.mean(db < -self.SILENCE_TOP_DB))
+        else:
+            silence_ratio = 1.0
+
+        frame_count = max(self._frame_count, 1)
+        pitch_mean = self._pitch_mean if self._pitch_count else 0
+        pitch_std = float(np.sqrt(self._pitch_m2 / self._pitch_count)) if self._pitch_count else 0
+
+        return {
+            "rms_energy": float(rms_values.mean()) if rms_values.size else 0.0,
+            "average_pitch": float(pitch_mean),
+            "pitch_variation": pitch_std,
+            "silence_ratio": silence_ratio,
+            "zero_crossing_rate": self._zcr_sum / frame_count,
+            "spectral_centroid": self._centroid_sum / frame_count,
+            "duration_seconds": self.duration_seconds,
+        }
+
+
 def classify_mood(features: dict) -> dict:
     rms        = features.get("rms_energy", 0)
     pitch_mean = features.get("average_pitch", 0)
@@ -1,19 +1,28 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.utils import timezone
 from .models import ChatRoom, Message
+from .persistence import get_message_persister
+from .realtime import BatchedEventsMixin, broadcast, room_group_name
+
+class ChatConsumer(BatchedEventsMixin, AsyncWebsocketConsumer):
+    # Membership is resolved once at connect and kept for the lifetime of the
+    # socket; add_user/remove_user broadcast a membership event to the room so
+    # open connections update it without querying again.
 
-class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
-        self.room_group_name = f'chat_{self.room_id}'
-        
-        if not self.scope['user'].is_authenticated:
+        self.room_group_name = room_group_name(self.room_id)
+        self.user = self.scope['user']
+        self.is_member = False
+
+        if not self.user.is_authenticated:
             await self.close()
             return
             
-        is_member = await self.is_user_in_room(self.room_id, self.scope['user'])
-        if not is_member:
+        self.is_member = await self.is_user_in_room(self.room_id, self.user.id)
+        if not self.is_member:
             await self.close()
             return
 
@@ -30,45 +39,60 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 self.room_group_name,
                 self.channel_name
             )
+        if self.is_member:
+            await get_message_persister().flush()
 
     async def receive(self, text_data):
+        if not self.is_member:
+            return
+
         text_data_json = json.loads(text_data)
         message_content = text_data_json.get('message', '')
         if not message_content:
             return
 
-        # Save message to database
-        message = await self.save_message(self.room_id, self.scope['user'], message_content)
+        # The id and timestamp are assigned here, so the message can go out to
+        # the room before it is written; the write is batched behind it.
+        message = Message(
+            room_id=self.room_id,
+            sender_id=self.user.id,
+            content=message_content,
+            created_at=timezone.now(),
+        )
 
-        await self.channel_layer.group_send(
+        await broadcast(
             self.room_group_name,
             {
                 'type': 'chat_message',
+                'id': str(message.uuid),
                 'message': message.content,
-                'sender': message.sender.username,
-                'sender_id': message.sender.id,
+                'sender': self.user.username,
+                'sender_id': self.user.id,
                 'created_at': message.created_at.isoformat()
             }
         )
+        await get_message_persister().enqueue(message)
 
     async def chat_message(self, event):
         # Send message to WebSocket
         await self.send(text_data=json.dumps({
+            'id': event['id'],
             'message': event['message'],
             'sender': event['sender'],
             'sender_id': event['sender_id'],
             'created_at': event['created_at']
         }))
 
-    @database_sync_to_async
-    def is_user_in_room(self, room_id, user):
-        try:
-            room = ChatRoom.objects.get(id=room_id)
-            return room.users.filter(id=user.id).exists()
-        except ChatRoom.DoesNotExist:
-            return False
+    async def chat_membership(self, event):
+        if event['user_id'] != self.user.id:
+            return
+        self.is_member = event['is_member']
+        if not self.is_member:
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            await self.close()
 
     @database_sync_to_async
-    def save_message(self, room_id, user, content):
-        room = ChatRoom.objects.get(id=room_id)
-        return Message.objects.create(room=room, sender=user, content=content)
+    def is_user_in_room(self, room_id, user_id):
+        return ChatRoom.users.through.objects.filter(
+            chatroom_id=room_id, user_id=user_id
+        ).exists()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from fakeredis import TcpFakeServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Run an in-process Redis-protocol server so several local ASGI workers '
+        'can share the "redis" channel layer without installing Redis'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=6379)
+
+    def handle(self, *args, **options):
+        server = TcpFakeServer((options['host'], options['port']), server_type='redis')
+        self.stdout.write(self.style.SUCCESS(
+            f'Fake Redis listening on redis://{options["host"]}:{options["port"]}/0 '
+            f'(set CHANNEL_LAYER_BACKEND=redis). Press Ctrl+C to stop.'
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -1,16 +1,18 @@
 import urllib.parse
 from channels.middleware import BaseMiddleware
-from rest_framework.authtoken.models import Token
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 
+from user.authentication import get_token
+
+
 @database_sync_to_async
 def get_user_from_token(token_key):
-    try:
-        token = Token.objects.get(key=token_key)
-        return token.user
-    except Token.DoesNotExist:
+    # Same cache as the REST API, so reconnects rarely touch the database.
+    token = get_token(token_key)
+    if token is None or not token.user.is_active:
         return AnonymousUser()
+    return token.user
 
 class TokenAuthMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
@@ -0,0 +1,38 @@
+import uuid
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def populate_message_uuids(apps, schema_editor):
+    Message = apps.get_model('chat', 'Message')
+    messages = list(Message.objects.only('id'))
+    for message in messages:
+        message.uuid = uuid.uuid4()
+    Message.objects.bulk_update(messages, ['uuid'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='uuid',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_message_uuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='message',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.11 on 2026-10-19 17:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatRoomSummary = apps.get_model('chat', 'ChatRoomSummary')
+    Message = apps.get_model('chat', 'Message')
+    Membership = ChatRoom.users.through
+
+    rows = []
+    for room in ChatRoom.objects.all().iterator():
+        latest = Message.objects.filter(room_id=room.id).order_by('-created_at').first()
+        for user_id in Membership.objects.filter(chatroom_id=room.id).values_list('user_id', flat=True):
+            rows.append(ChatRoomSummary(
+                room_id=room.id,
+                user_id=user_id,
+                last_message_id=latest.uuid if latest else None,
+                last_message_preview=latest.content[:100] if latest else '',
+                last_activity_at=latest.created_at if latest else room.created_at,
+            ))
+    ChatRoomSummary.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_message_uuid_alter_message_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatRoomSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_preview', models.CharField(blank=True, max_length=100)),
+                ('last_activity_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_read_at', models.DateTimeField(blank=True, null=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message', to_field='uuid')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='chat.chatroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_activity_at'], name='chat_summary_inbox_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'user'), name='unique_chat_summary_per_member')],
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.11 on 2026-10-19 17:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_dm_keys(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    Membership = ChatRoom.users.through
+
+    members = {}
+    for room_id, user_id in Membership.objects.order_by('chatroom_id').values_list('chatroom_id', 'user_id'):
+        members.setdefault(room_id, []).append(user_id)
+
+    keyed = set()
+    # Oldest room first, so it keeps the key if a pair has several 1-to-1 rooms.
+    for room in ChatRoom.objects.order_by('created_at', 'id'):
+        users = members.get(room.id, [])
+        if len(users) != 2:
+            continue
+        key = tuple(sorted(users))
+        if key in keyed:
+            continue
+        keyed.add(key)
+        room.dm_user_low_id, room.dm_user_high_id = key
+        room.save(update_fields=['dm_user_low', 'dm_user_high'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_message_chat_message_room_time_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='dm_user_high',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='dm_user_low',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_dm_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chatroom',
+            constraint=models.UniqueConstraint(fields=('dm_user_low', 'dm_user_high'), name='unique_direct_chat_pair'),
+        ),
+    ]
@@ -1,21 +1,77 @@
+import uuid
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class ChatRoom(models.Model):
     users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='chatrooms')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Canonical key of a 1-to-1 room: the two member ids, lower first. Both
+    # are null for group rooms, which the unique constraint ignores.
+    dm_user_low = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    dm_user_high = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dm_user_low', 'dm_user_high'], name='unique_direct_chat_pair'),
+        ]
+
+    @staticmethod
+    def dm_key(user_id, other_user_id):
+        low, high = sorted((user_id, other_user_id))
+        return {'dm_user_low_id': low, 'dm_user_high_id': high}
 
     def __str__(self):
         return f"Room {self.id} with {self.users.count()} users"
 
 class Message(models.Model):
+    # uuid and created_at are assigned by the server when the message is
+    # received, before it is written, so it can be broadcast immediately and
+    # re-inserted safely if a batched write is retried.
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_messages')
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['room', 'created_at', 'id'], name='chat_message_room_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender} in {self.room}: {self.content[:20]}"
+
+
+class ChatRoomSummary(models.Model):
+    """
+    One inbox row per room member, kept up to date as messages are written
+    and read, so the room list never has to aggregate over messages.
+    """
+    PREVIEW_LENGTH = 100
+
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='summaries')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_summaries')
+    last_message = models.ForeignKey(
+        Message, to_field='uuid', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'user'], name='unique_chat_summary_per_member'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-last_activity_at'], name='chat_summary_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} in {self.room}: {self.unread_count} unread"
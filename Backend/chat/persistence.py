@@ -0,0 +1,195 @@
+"""
+Write-behind persistence for chat messages.
+
+Consumers broadcast a message as soon as it arrives and hand it to a
+``MessageWriteBehind`` buffer, which writes messages in batches with a single
+``bulk_create`` instead of one INSERT per message.
+
+Delivery to the database is at-least-once: a failed batch is kept and retried,
+and every message carries a server-assigned ``uuid`` so messages that were
+already stored are skipped when a batch is written again. A batch rejected by
+the database itself (an integrity or data error, e.g. its room was deleted) is
+split until the offending messages are found; those are logged and dropped so
+they cannot hold up everything after them.
+"""
+import asyncio
+import atexit
+import logging
+import weakref
+
+from channels.db import database_sync_to_async
+from django.db import DataError, IntegrityError, transaction
+
+from .models import Message
+from .summaries import record_messages
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 200
+FLUSH_INTERVAL_SECONDS = 0.05
+MAX_BUFFERED_MESSAGES = 5000
+WRITE_RETRY_ATTEMPTS = 3
+WRITE_RETRY_BACKOFF_SECONDS = 0.1
+# Unsaved messages kept across failed writes; beyond this the oldest are dropped.
+MAX_FAILED_MESSAGES = MAX_BUFFERED_MESSAGES
+
+
+def write_messages(messages):
+    with transaction.atomic():
+        # Skip messages a previous, partly failed attempt already stored, so a
+        # retry neither duplicates them nor counts them as unread twice.
+        stored = set(
+            Message.objects.filter(uuid__in=[m.uuid for m in messages])
+            .values_list('uuid', flat=True)
+        )
+        messages = [m for m in messages if m.uuid not in stored]
+        Message.objects.bulk_create(
+            messages, batch_size=FLUSH_BATCH_SIZE, ignore_conflicts=True
+        )
+        record_messages(messages)
+
+
+class MessageWriteBehind:
+    """
+    Bounded, per-event-loop buffer of unsaved messages.
+
+    ``enqueue`` waits when ``max_buffered`` messages are pending, which pushes
+    back on senders instead of letting memory grow without limit. A background
+    task writes a batch once ``batch_size`` messages are pending or
+    ``flush_interval`` has elapsed since the first one arrived.
+    """
+
+    def __init__(self, batch_size=FLUSH_BATCH_SIZE, flush_interval=FLUSH_INTERVAL_SECONDS,
+                 max_buffered=MAX_BUFFERED_MESSAGES):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = asyncio.Queue(maxsize=max_buffered)
+        self._write_lock = asyncio.Lock()
+        # Messages taken off the queue by the worker but not yet written.
+        self._batch = []
+        # Batches whose write failed; retried before anything newer.
+        self._failed = []
+        self._worker = None
+
+    @property
+    def pending(self):
+        return self._queue.qsize() + len(self._batch) + len(self._failed)
+
+    async def enqueue(self, message):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        await self._queue.put(message)
+
+    async def flush(self):
+        """Write everything buffered so far and wait for it to be stored."""
+        batch, self._batch = self._batch, []
+        batch.extend(self._drain())
+        async with self._write_lock:
+            await self._write(batch)
+
+    def flush_sync(self):
+        """Synchronous flush for interpreter shutdown, when no loop is running."""
+        batch = self._failed + self._batch + self._drain()
+        self._failed, self._batch = [], []
+        if batch:
+            write_messages(batch)
+
+    def _drain(self, limit=None):
+        batch = []
+        while not self._queue.empty() and (limit is None or len(batch) < limit):
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # flush() may take self._batch at any await, so it is always
+            # re-read rather than held in a local.
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                self._batch.extend(self._drain(self.batch_size - len(self._batch)))
+                remaining = deadline - loop.time()
+                if len(self._batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._batch = self._batch, []
+            async with self._write_lock:
+                await self._write(batch)
+
+    async def _write(self, batch):
+        batch = self._failed + batch
+        self._failed = []
+        if not batch:
+            return
+        for attempt in range(1, WRITE_RETRY_ATTEMPTS + 1):
+            try:
+                await database_sync_to_async(write_messages)(batch)
+                return
+            except Exception as exc:
+                error = exc
+                logger.exception(
+                    "Writing %d chat messages failed (attempt %d/%d)",
+                    len(batch), attempt, WRITE_RETRY_ATTEMPTS,
+                )
+                if attempt < WRITE_RETRY_ATTEMPTS:
+                    await asyncio.sleep(WRITE_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+        if isinstance(error, (IntegrityError, DataError)):
+            try:
+                rejected = await self._write_bisected(batch)
+            except Exception:
+                logger.exception("Writing %d chat messages one part at a time failed", len(batch))
+            else:
+                if rejected:
+                    logger.error(
+                        "Dropping %d chat messages the database rejects: %s",
+                        len(rejected), [str(m.uuid) for m in rejected],
+                    )
+                return
+        self._keep(batch)
+
+    async def _write_bisected(self, batch):
+        """Write every message of ``batch`` the database accepts; returns the others."""
+        try:
+            await database_sync_to_async(write_messages)(batch)
+            return []
+        except (IntegrityError, DataError):
+            if len(batch) == 1:
+                return batch
+        middle = len(batch) // 2
+        return await self._write_bisected(batch[:middle]) + await self._write_bisected(batch[middle:])
+
+    def _keep(self, batch):
+        # Keep the batch so the next write (or shutdown flush) retries it.
+        if len(batch) > MAX_FAILED_MESSAGES:
+            logger.error(
+                "Dropping %d unsaved chat messages; the retry buffer is full",
+                len(batch) - MAX_FAILED_MESSAGES,
+            )
+            batch = batch[-MAX_FAILED_MESSAGES:]
+        self._failed = batch
+
+
+# asyncio primitives belong to one event loop, so each loop gets its own buffer.
+_persisters = weakref.WeakKeyDictionary()
+
+
+def get_message_persister():
+    loop = asyncio.get_running_loop()
+    persister = _persisters.get(loop)
+    if persister is None:
+        persister = _persisters[loop] = MessageWriteBehind()
+    return persister
+
+
+@atexit.register
+def _flush_on_shutdown():
+    for persister in list(_persisters.values()):
+        try:
+            persister.flush_sync()
+        except Exception:
+            logger.exception("Failed to flush buffered chat messages on shutdown")
@@ -0,0 +1,59 @@
+"""
+Helpers for pushing events to WebSocket groups through the channel layer.
+
+Every realtime feature (chat rooms, notifications, ...) goes through these
+helpers instead of calling ``group_send`` directly, so events are delivered to
+sockets on every ASGI worker whatever layer ``CHANNEL_LAYER_BACKEND`` selects,
+and bursts can be shipped as a single batched envelope.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+BATCH_EVENT_TYPE = 'realtime.batch'
+
+
+def room_group_name(room_id) -> str:
+    return f'chat_{room_id}'
+
+
+def membership_event(user_id: int, is_member: bool) -> dict:
+    """Tells open sockets of ``user_id`` in a room that their membership changed."""
+    return {'type': 'chat.membership', 'user_id': user_id, 'is_member': is_member}
+
+
+async def broadcast(group: str, event: dict) -> None:
+    """Send one event to every socket in ``group`` across all workers."""
+    await get_channel_layer().group_send(group, event)
+
+
+async def broadcast_batch(group: str, events: list[dict]) -> None:
+    """
+    Send several events to ``group`` in one layer round-trip.
+
+    Receivers unpack the envelope with ``BatchedEventsMixin`` and handle each
+    event in order, exactly as if it had been sent on its own.
+    """
+    if not events:
+        return
+    if len(events) == 1:
+        await broadcast(group, events[0])
+        return
+    await broadcast(group, {'type': BATCH_EVENT_TYPE, 'events': events})
+
+
+def broadcast_from_sync(group: str, event: dict) -> None:
+    """``broadcast`` for synchronous code such as views and services."""
+    async_to_sync(broadcast)(group, event)
+
+
+def broadcast_batch_from_sync(group: str, events: list[dict]) -> None:
+    async_to_sync(broadcast_batch)(group, events)
+
+
+class BatchedEventsMixin:
+    """Consumer mixin that dispatches every event of a ``broadcast_batch`` envelope."""
+
+    async def realtime_batch(self, envelope):
+        for event in envelope['events']:
+            await self.dispatch(event)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import ChatRoom, Message
+from .models import ChatRoom, ChatRoomSummary, Message
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -14,7 +14,7 @@ class MessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Message
-        fields = ['id', 'room', 'sender', 'content', 'created_at']
+        fields = ['id', 'uuid', 'room', 'sender', 'content', 'created_at']
         ref_name = 'ChatMessage'
 
 class ChatRoomSerializer(serializers.ModelSerializer):
@@ -30,3 +30,18 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         if msg:
             return MessageSerializer(msg).data
         return None
+
+
+class ChatRoomSummarySerializer(serializers.ModelSerializer):
+    """Room list entry read from the member's summary row."""
+    id = serializers.IntegerField(source='room_id', read_only=True)
+    users = UserBriefSerializer(source='room.users', many=True, read_only=True)
+    created_at = serializers.DateTimeField(source='room.created_at', read_only=True)
+    latest_message = MessageSerializer(source='last_message', read_only=True)
+
+    class Meta:
+        model = ChatRoomSummary
+        fields = [
+            'id', 'users', 'created_at', 'latest_message',
+            'last_message_preview', 'last_activity_at', 'unread_count', 'last_read_at',
+        ]
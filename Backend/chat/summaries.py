@@ -0,0 +1,67 @@
+"""
+Maintenance of ``ChatRoomSummary`` rows.
+
+Every function here runs with the write it belongs to, so the inbox is never
+ahead of or behind the messages and memberships it describes.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ChatRoomSummary
+
+
+def add_members(room, user_ids):
+    """Create summaries for new members, copying the room's current last message."""
+    current = (
+        ChatRoomSummary.objects.filter(room=room)
+        .order_by('-last_activity_at')
+        .values('last_message_id', 'last_message_preview', 'last_activity_at')
+        .first()
+    ) or {'last_activity_at': room.created_at}
+    ChatRoomSummary.objects.bulk_create(
+        [ChatRoomSummary(room=room, user_id=user_id, **current) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def remove_members(room, user_ids):
+    ChatRoomSummary.objects.filter(room=room, user_id__in=user_ids).delete()
+
+
+def record_messages(messages):
+    """
+    Apply a batch of newly written messages: move each room's last message
+    forward and add to every other member's unread count. Costs a couple of
+    UPDATEs per room and sender, however many messages the batch holds.
+    """
+    by_room = defaultdict(list)
+    for message in messages:
+        by_room[message.room_id].append(message)
+
+    for room_id, room_messages in by_room.items():
+        latest = max(room_messages, key=lambda m: m.created_at)
+        ChatRoomSummary.objects.filter(
+            room_id=room_id, last_activity_at__lte=latest.created_at
+        ).update(
+            last_message_id=latest.uuid,
+            last_message_preview=latest.content[:ChatRoomSummary.PREVIEW_LENGTH],
+            last_activity_at=latest.created_at,
+        )
+
+        sent_by = Counter(m.sender_id for m in room_messages)
+        total = len(room_messages)
+        # Everyone gets the whole batch as unread, then each sender gets
+        # their own messages back.
+        ChatRoomSummary.objects.filter(room_id=room_id).update(unread_count=F('unread_count') + total)
+        for sender_id, count in sent_by.items():
+            ChatRoomSummary.objects.filter(room_id=room_id, user_id=sender_id).update(
+                unread_count=F('unread_count') - count
+            )
+
+
+def mark_read(room, user):
+    return ChatRoomSummary.objects.filter(room=room, user=user).update(
+        unread_count=0, last_read_at=timezone.now()
+    )
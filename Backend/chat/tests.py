@@ -1,3 +1,387 @@
-from django.test import TestCase
+import asyncio
+import threading
 
-# Create your tests here.
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from channels_redis.pubsub import RedisPubSubChannelLayer
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from fakeredis import TcpFakeServer
+from rest_framework.test import APIClient
+
+from user.models import AuthToken, User
+from .middleware import TokenAuthMiddleware
+from .models import ChatRoom, Message
+from .persistence import MessageWriteBehind, write_messages
+from .realtime import BatchedEventsMixin, broadcast_batch
+from .routing import websocket_urlpatterns
+
+
+class RedisChannelLayerFanOutTests(SimpleTestCase):
+    """Two layer instances stand in for two ASGI worker processes."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = TcpFakeServer(('127.0.0.1', 0), server_type='redis')
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address
+        cls.redis_url = f'redis://{host}:{port}/0'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_group_send_reaches_sockets_on_other_workers(self):
+        async def scenario():
+            worker_a = RedisPubSubChannelLayer(hosts=[self.redis_url])
+            worker_b = RedisPubSubChannelLayer(hosts=[self.redis_url])
+            try:
+                channel = await worker_b.new_channel()
+                await worker_b.group_add('chat_1', channel)
+                await asyncio.sleep(0.05)
+                await worker_a.group_send('chat_1', {'type': 'chat_message', 'message': 'hi'})
+                return await asyncio.wait_for(worker_b.receive(channel), 2)
+            finally:
+                await worker_a.flush()
+                await worker_b.flush()
+
+        event = async_to_sync(scenario)()
+        self.assertEqual(event, {'type': 'chat_message', 'message': 'hi'})
+
+
+class _RecordingConsumer(BatchedEventsMixin):
+    def __init__(self):
+        self.handled = []
+
+    async def dispatch(self, event):
+        if event['type'] == 'realtime.batch':
+            await self.realtime_batch(event)
+        else:
+            self.handled.append(event)
+
+
+class BroadcastBatchTests(SimpleTestCase):
+    def test_batch_is_one_layer_message_unpacked_in_order(self):
+        layer = InMemoryChannelLayer()
+        events = [{'type': 'chat_message', 'message': str(i)} for i in range(3)]
+
+        async def scenario():
+            channel = await layer.new_channel()
+            await layer.group_add('chat_1', channel)
+            with patch('chat.realtime.get_channel_layer', return_value=layer):
+                await broadcast_batch('chat_1', events)
+            envelope = await layer.receive(channel)
+            consumer = _RecordingConsumer()
+            await consumer.dispatch(envelope)
+            return envelope, consumer.handled
+
+        envelope, handled = async_to_sync(scenario)()
+        self.assertEqual(envelope['type'], 'realtime.batch')
+        self.assertEqual(handled, events)
+
+
+class ChatConsumerTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass1234')
+        self.alice_token = AuthToken.objects.create(user=self.alice)
+        self.bob_token = AuthToken.objects.create(user=self.bob)
+        self.room = ChatRoom.objects.create()
+        self.room.users.add(self.alice, self.bob)
+        self.application = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    def _communicator(self, token):
+        return WebsocketCommunicator(
+            self.application, f'/ws/chat/{self.room.id}/?token={token.key}'
+        )
+
+    def test_message_is_saved_and_broadcast_with_cached_sender(self):
+        async def scenario():
+            alice = self._communicator(self.alice_token)
+            bob = self._communicator(self.bob_token)
+            self.assertTrue((await alice.connect())[0])
+            self.assertTrue((await bob.connect())[0])
+            await alice.send_json_to({'message': 'hello'})
+            received = await bob.receive_json_from()
+            await alice.disconnect()
+            await bob.disconnect()
+            return received
+
+        received = async_to_sync(scenario)()
+        self.assertEqual(received['message'], 'hello')
+        self.assertEqual(received['sender'], 'alice')
+        self.assertEqual(received['sender_id'], self.alice.id)
+        message = Message.objects.get()
+        self.assertEqual((message.room_id, message.sender_id), (self.room.id, self.alice.id))
+        self.assertEqual(received['id'], str(message.uuid))
+        self.assertEqual(received['created_at'], message.created_at.isoformat())
+
+    def test_non_member_is_rejected(self):
+        outsider = User.objects.create_user(username='eve', email='eve@example.com', password='pass1234')
+        token = AuthToken.objects.create(user=outsider)
+
+        async def scenario():
+            communicator = self._communicator(token)
+            connected, _ = await communicator.connect()
+            return connected
+
+        self.assertFalse(async_to_sync(scenario)())
+
+    def test_remove_user_closes_the_removed_members_socket(self):
+        client = APIClient()
+        client.force_authenticate(user=self.alice)
+
+        async def scenario():
+            bob = self._communicator(self.bob_token)
+            self.assertTrue((await bob.connect())[0])
+            await database_sync_to_async(client.post)(
+                f'/chat/rooms/{self.room.id}/remove_user/', {'user_id': self.bob.id}, format='json'
+            )
+            output = await bob.receive_output()
+            await bob.disconnect()
+            return output
+
+        output = async_to_sync(scenario)()
+        self.assertEqual(output['type'], 'websocket.close')
+
+    def test_token_lookup_is_cached(self):
+        async def connect_once():
+            communicator = self._communicator(self.alice_token)
+            connected, _ = await communicator.connect()
+            await communicator.disconnect()
+            return connected
+
+        self.assertTrue(async_to_sync(connect_once)())
+        with patch('user.authentication.AuthToken.objects') as token_manager:
+            self.assertTrue(async_to_sync(connect_once)())
+        token_manager.select_related.assert_not_called()
+
+
+class MessageWriteBehindTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.room = ChatRoom.objects.create()
+
+    def _message(self, content):
+        return Message(room=self.room, sender=self.alice, content=content)
+
+    def test_messages_are_written_in_one_batch(self):
+        async def scenario():
+            persister = MessageWriteBehind(batch_size=50, flush_interval=5)
+            for i in range(10):
+                await persister.enqueue(self._message(f'm{i}'))
+            await persister.flush()
+            return persister.pending
+
+        with patch('chat.persistence.write_messages', wraps=write_messages) as write:
+            pending = async_to_sync(scenario)()
+
+        self.assertEqual(pending, 0)
+        write.assert_called_once()
+        self.assertEqual(
+            list(Message.objects.values_list('content', flat=True)),
+            [f'm{i}' for i in range(10)],
+        )
+
+    def test_worker_writes_once_the_batch_is_full(self):
+        async def scenario():
+            persister = MessageWriteBehind(batch_size=3, flush_interval=5)
+            for i in range(3):
+                await persister.enqueue(self._message(f'm{i}'))
+            for _ in range(100):
+                if persister.pending == 0:
+                    break
+                await asyncio.sleep(0.01)
+            return persister.pending
+
+        self.assertEqual(async_to_sync(scenario)(), 0)
+        self.assertEqual(Message.objects.count(), 3)
+
+    def test_failed_batch_is_retried_without_duplicates(self):
+        calls = []
+
+        def flaky_write(messages):
+            calls.append(len(messages))
+            write_messages(messages)
+            if len(calls) == 1:
+                raise RuntimeError('connection dropped after commit')
+
+        async def scenario():
+            persister = MessageWriteBehind(batch_size=50, flush_interval=5)
+            await persister.enqueue(self._message('hello'))
+            await persister.flush()
+
+        with patch('chat.persistence.write_messages', side_effect=flaky_write), \
+                patch('chat.persistence.WRITE_RETRY_BACKOFF_SECONDS', 0), \
+                patch('chat.persistence.logger'):
+            async_to_sync(scenario)()
+
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_rejected_messages_are_dropped_without_blocking_the_rest(self):
+        async def scenario():
+            persister = MessageWriteBehind(batch_size=50, flush_interval=5)
+            await persister.enqueue(self._message('before'))
+            # Its room no longer exists, so the database can never store it.
+            await persister.enqueue(Message(room_id=self.room.id + 1000, sender=self.alice, content='orphan'))
+            await persister.enqueue(self._message('after'))
+            await persister.flush()
+            await persister.enqueue(self._message('later'))
+            await persister.flush()
+            return persister.pending
+
+        with patch('chat.persistence.WRITE_RETRY_BACKOFF_SECONDS', 0), \
+                patch('chat.persistence.logger') as logger:
+            pending = async_to_sync(scenario)()
+
+        self.assertEqual(pending, 0)
+        self.assertEqual(
+            sorted(Message.objects.values_list('content', flat=True)), ['after', 'before', 'later']
+        )
+        logger.error.assert_called_once()
+
+    def test_failed_messages_are_capped(self):
+        async def scenario():
+            persister = MessageWriteBehind(batch_size=50, flush_interval=5)
+            for i in range(3):
+                await persister.enqueue(self._message(f'm{i}'))
+            await persister.flush()
+            return [m.content for m in persister._failed]
+
+        with patch('chat.persistence.write_messages', side_effect=OperationalError('database is down')), \
+                patch('chat.persistence.WRITE_RETRY_BACKOFF_SECONDS', 0), \
+                patch('chat.persistence.MAX_FAILED_MESSAGES', 2), \
+                patch('chat.persistence.logger'):
+            self.assertEqual(async_to_sync(scenario)(), ['m1', 'm2'])
+
+
+class ChatRoomSummaryTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.alice)
+
+    def _room_with(self, user):
+        response = self.client.post('/chat/rooms/', {'user_id': user.id}, format='json')
+        return ChatRoom.objects.get(id=response.data['id'])
+
+    def _send(self, room, sender, *contents):
+        write_messages([Message(room=room, sender=sender, content=c) for c in contents])
+
+    def test_list_is_served_from_summaries_with_unread_counts(self):
+        quiet_room = self._room_with(self.bob)
+        carol = User.objects.create_user(username='carol', email='carol@example.com', password='pass1234')
+        busy_room = self._room_with(carol)
+        self._send(quiet_room, self.bob, 'hi alice')
+        self._send(busy_room, carol, 'one', 'two')
+        self._send(busy_room, self.alice, 'three')
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/chat/rooms/')
+
+        rooms = response.data['results']
+        self.assertEqual([r['id'] for r in rooms], [busy_room.id, quiet_room.id])
+        self.assertEqual(rooms[0]['last_message_preview'], 'three')
+        self.assertEqual(rooms[0]['latest_message']['content'], 'three')
+        self.assertEqual(rooms[0]['unread_count'], 2)
+        self.assertEqual(rooms[1]['unread_count'], 1)
+        self.assertEqual({u['username'] for u in rooms[1]['users']}, {'alice', 'bob'})
+
+    def test_read_clears_unread_count_for_the_reader_only(self):
+        room = self._room_with(self.bob)
+        self._send(room, self.alice, 'ping')
+        self._send(room, self.bob, 'pong', 'pong again')
+
+        response = self.client.post(f'/chat/rooms/{room.id}/read/')
+
+        self.assertEqual(response.status_code, 200)
+        counts = dict(room.summaries.values_list('user__username', 'unread_count'))
+        self.assertEqual(counts, {'alice': 0, 'bob': 1})
+
+    def test_added_member_inherits_last_message_and_removed_member_loses_room(self):
+        room = self._room_with(self.bob)
+        self._send(room, self.bob, 'before carol')
+        carol = User.objects.create_user(username='carol', email='carol@example.com', password='pass1234')
+
+        self.client.post(f'/chat/rooms/{room.id}/add_user/', {'user_id': carol.id}, format='json')
+        summary = room.summaries.get(user=carol)
+        self.assertEqual(summary.last_message_preview, 'before carol')
+        self.assertEqual(summary.unread_count, 0)
+
+        self.client.post(f'/chat/rooms/{room.id}/remove_user/', {'user_id': carol.id}, format='json')
+        self.assertFalse(room.summaries.filter(user=carol).exists())
+
+
+class MessageCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.room = ChatRoom.objects.create()
+        self.room.users.add(self.alice)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.alice)
+        write_messages([
+            Message(room=self.room, sender=self.alice, content=f'm{i}') for i in range(7)
+        ])
+
+    def _contents(self, response):
+        return [m['content'] for m in response.data['results']]
+
+    def test_pages_walk_back_through_history_and_forward_again(self):
+        first = self.client.get(f'/chat/rooms/{self.room.id}/messages/?page_size=3')
+        self.assertEqual(self._contents(first), ['m6', 'm5', 'm4'])
+        self.assertIsNone(first.data['previous'])
+        self.assertNotIn('count', first.data)
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self._contents(second), ['m3', 'm2', 'm1'])
+
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(self._contents(back), ['m6', 'm5', 'm4'])
+
+
+class DirectRoomKeyTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass1234')
+        self.client = APIClient()
+
+    def _open_dm(self, user, other):
+        self.client.force_authenticate(user=user)
+        return self.client.post('/chat/rooms/', {'user_id': other.id}, format='json')
+
+    def test_either_member_resolves_the_same_room(self):
+        created = self._open_dm(self.alice, self.bob)
+        fetched = self._open_dm(self.bob, self.alice)
+
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(fetched.status_code, 200)
+        self.assertEqual(created.data['id'], fetched.data['id'])
+        room = ChatRoom.objects.get()
+        self.assertEqual((room.dm_user_low_id, room.dm_user_high_id), tuple(sorted((self.alice.id, self.bob.id))))
+
+    def test_duplicate_pair_is_rejected_by_the_database(self):
+        ChatRoom.objects.create(**ChatRoom.dm_key(self.alice.id, self.bob.id))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ChatRoom.objects.create(**ChatRoom.dm_key(self.bob.id, self.alice.id))
+
+    def test_room_that_became_a_group_no_longer_answers_for_the_pair(self):
+        room_id = self._open_dm(self.alice, self.bob).data['id']
+        carol = User.objects.create_user(username='carol', email='carol@example.com', password='pass1234')
+        self.client.post(f'/chat/rooms/{room_id}/add_user/', {'user_id': carol.id}, format='json')
+
+        reopened = self._open_dm(self.alice, self.bob)
+
+        self.assertEqual(reopened.status_code, 201)
+        self.assertNotEqual(reopened.data['id'], room_id)
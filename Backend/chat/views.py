@@ -1,11 +1,14 @@
 from rest_framework import viewsets, permissions, status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import ChatRoom, Message
-from .serializers import ChatRoomSerializer, MessageSerializer
+from .models import ChatRoom, ChatRoomSummary, Message
+from .realtime import broadcast_from_sync, membership_event, room_group_name
+from .serializers import ChatRoomSerializer, ChatRoomSummarySerializer, MessageSerializer
+from . import summaries
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Max
+from friendship import graph as friend_graph
+from django.db import transaction
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
@@ -17,6 +20,24 @@ class ChatRoomPagination(PageNumberPagination):
     max_page_size = 100
 
 
+def release_dm_key(room):
+    # A room whose membership changed is no longer the pair's 1-to-1 chat;
+    # dropping its key lets the pair open a fresh one.
+    if room.dm_user_low_id is not None:
+        room.dm_user_low = room.dm_user_high = None
+        room.save(update_fields=['dm_user_low', 'dm_user_high'])
+
+
+class MessageCursorPagination(CursorPagination):
+    # Keyset pagination: each page seeks from the cursor's created_at through
+    # the (room, created_at, id) index, so page cost doesn't grow with depth
+    # and no COUNT(*) is run.
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
 class ChatRoomViewSet(viewsets.ModelViewSet):
     serializer_class = ChatRoomSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -25,9 +46,25 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return ChatRoom.objects.none()
-        return self.request.user.chatrooms.annotate(
-            last_message_time=Max('messages__created_at')
-        ).order_by('-last_message_time', '-created_at')
+        return self.request.user.chatrooms.all()
+
+    @swagger_auto_schema(
+        operation_summary="List my Chat Rooms",
+        operation_description="Returns the rooms you belong to, most recently active first, with the latest message and your unread count for each.",
+        responses={200: ChatRoomSummarySerializer(many=True)}
+    )
+    def list(self, request, *args, **kwargs):
+        qs = ChatRoomSummary.objects.filter(user=request.user).select_related(
+            'room', 'last_message__sender'
+        ).prefetch_related('room__users').order_by('-last_activity_at', '-room_id')
+
+        page = self.paginate_queryset(qs)
+        if page is not None:
+            serializer = ChatRoomSummarySerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = ChatRoomSummarySerializer(qs, many=True)
+        return Response(serializer.data)
 
     @swagger_auto_schema(
         operation_summary="Create or fetch a 1-to-1 Chat Room",
@@ -43,6 +80,7 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
             201: openapi.Response("Created a newly minted chat room", ChatRoomSerializer),
             200: openapi.Response("Fetched existing chat room", ChatRoomSerializer),
             400: "Bad Request - Missing user_id or trying to chat with yourself",
+            403: "Forbidden - One of you has blocked the other",
             404: "Not Found - User doesn't exist"
         }
     )
@@ -59,30 +97,27 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
         if target_user == request.user:
             return Response({'error': 'Cannot create a chat with yourself'}, status=status.HTTP_400_BAD_REQUEST)
 
-        existing_rooms = ChatRoom.objects.annotate(user_count=Count('users')).filter(
-            users=request.user
-        ).filter(
-            users=target_user
-        ).filter(
-            user_count=2
-        )
-
-        if existing_rooms.exists():
-            room = existing_rooms.first()
-            serializer = self.get_serializer(room)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        room = ChatRoom.objects.create()
-        room.users.add(request.user, target_user)
-        
+        if friend_graph.is_blocked(request.user.id, target_user.id):
+            return Response({'error': 'Cannot chat with this user'}, status=status.HTTP_403_FORBIDDEN)
+
+        # One lookup on the unique DM key. A concurrent create for the same
+        # pair hits the constraint, and get_or_create then returns its room.
+        with transaction.atomic():
+            room, created = ChatRoom.objects.get_or_create(
+                **ChatRoom.dm_key(request.user.id, target_user.id)
+            )
+            if created:
+                room.users.add(request.user, target_user)
+                summaries.add_members(room, [request.user.id, target_user.id])
+
         serializer = self.get_serializer(room)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_summary="Get Historical Messages for Room",
-        operation_description="Returns a paginated list of historical messages in this ChatRoom. Use `page` and `page_size` query params to control pagination.",
+        operation_description="Returns historical messages in this ChatRoom, newest first. Follow the `next` link to scroll back in time and `previous` to move towards newer messages.",
         manual_parameters=[
-            openapi.Parameter('page', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Page number"),
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Opaque cursor taken from a `next` or `previous` link"),
             openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Results per page (max 100)"),
         ],
         responses={200: MessageSerializer(many=True)}
@@ -90,9 +125,9 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
         room = self.get_object()
-        qs = room.messages.all().order_by('-created_at')
+        qs = room.messages.all()
 
-        paginator = ChatRoomPagination()
+        paginator = MessageCursorPagination()
         page = paginator.paginate_queryset(qs, request, view=self)
         if page is not None:
             serializer = MessageSerializer(page, many=True)
@@ -125,7 +160,11 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        room.users.add(target_user)
+        with transaction.atomic():
+            room.users.add(target_user)
+            summaries.add_members(room, [target_user.id])
+            release_dm_key(room)
+        broadcast_from_sync(room_group_name(room.id), membership_event(target_user.id, True))
         return Response({'success': f'User {target_user.username} added to the room.'}, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
@@ -151,5 +190,21 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
         if not target_user:
             return Response({'error': 'User is not in this room'}, status=status.HTTP_400_BAD_REQUEST)
 
-        room.users.remove(target_user)
+        with transaction.atomic():
+            room.users.remove(target_user)
+            summaries.remove_members(room, [target_user.id])
+            release_dm_key(room)
+        broadcast_from_sync(room_group_name(room.id), membership_event(target_user.id, False))
         return Response({'success': f'User {target_user.username} has been removed from the room.'}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_summary="Mark ChatRoom as Read",
+        operation_description="Clears your unread count for this room and records when you last read it.",
+        request_body=None,
+        responses={200: "Room marked as read"}
+    )
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        room = self.get_object()
+        summaries.mark_read(room, request.user)
+        return Response({'success': 'Room marked as read.'}, status=status.HTTP_200_OK)
@@ -0,0 +1,96 @@
+"""
+Cached friend graph.
+
+Each user's relationships are kept in the cache as adjacency sets (friends,
+incoming and outgoing requests, blocked), built from one indexed query on a
+miss. ``Friendship.save``/``delete`` drop both users' entries once the change
+commits, so lookups are set membership tests that never go stale for longer
+than a transaction.
+"""
+from dataclasses import dataclass, field
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+FRIEND_GRAPH_TTL_SECONDS = 60 * 60
+
+
+@dataclass(frozen=True)
+class Adjacency:
+    friends: frozenset = field(default_factory=frozenset)
+    incoming: frozenset = field(default_factory=frozenset)  # pending requests sent to the user
+    outgoing: frozenset = field(default_factory=frozenset)  # pending requests the user sent
+    blocked: frozenset = field(default_factory=frozenset)   # blocked in either direction
+    cancelled: frozenset = field(default_factory=frozenset)
+
+    def related(self):
+        """Everyone the user has a Friendship row with, whatever its status."""
+        return self.friends | self.incoming | self.outgoing | self.blocked | self.cancelled
+
+
+EMPTY = Adjacency()
+
+
+def _graph_key(user_id):
+    return f'friendgraph:{user_id}'
+
+
+def _load(user_id):
+    from .models import Friendship, Status
+
+    sets = {'friends': set(), 'incoming': set(), 'outgoing': set(), 'blocked': set(), 'cancelled': set()}
+    rows = Friendship.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id)).values_list(
+        'sender_id', 'receiver_id', 'status'
+    )
+    for sender_id, receiver_id, status in rows:
+        other = receiver_id if sender_id == user_id else sender_id
+        if status == Status.ACCEPTED:
+            sets['friends'].add(other)
+        elif status == Status.PENDING:
+            sets['outgoing' if sender_id == user_id else 'incoming'].add(other)
+        elif status == Status.BLOCKED:
+            sets['blocked'].add(other)
+        else:
+            sets['cancelled'].add(other)
+    return Adjacency(**{name: frozenset(ids) for name, ids in sets.items()})
+
+
+def get_adjacency(user_id):
+    if user_id is None:
+        return EMPTY
+    key = _graph_key(user_id)
+    adjacency = cache.get(key)
+    if adjacency is None:
+        adjacency = _load(user_id)
+        cache.set(key, adjacency, FRIEND_GRAPH_TTL_SECONDS)
+    return adjacency
+
+
+def get_friend_ids(user_id):
+    return get_adjacency(user_id).friends
+
+
+def get_blocked_ids(user_id):
+    return get_adjacency(user_id).blocked
+
+
+def are_friends(user_id, other_id):
+    return other_id in get_adjacency(user_id).friends
+
+
+def is_blocked(user_id, other_id):
+    return other_id in get_adjacency(user_id).blocked
+
+
+def has_relation(user_id, other_id):
+    return other_id in get_adjacency(user_id).related()
+
+
+def invalidate_users(*user_ids):
+    """Drop cached adjacency for ``user_ids`` once the current transaction commits."""
+    keys = [_graph_key(user_id) for user_id in user_ids if user_id is not None]
+    if keys:
+        # Also dropped right away, so this transaction reads its own change.
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
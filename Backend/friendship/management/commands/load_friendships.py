@@ -3,6 +3,7 @@ import os
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.utils.dateparse import parse_datetime
+from friendship.graph import invalidate_users
 from friendship.models import Friendship
 
 User = get_user_model()
@@ -25,7 +26,7 @@ class Command(BaseCommand):
         friendship_objects = []
 
         existing_friendships = set(
-            Friendship.objects.values_list('sender_id', 'receiver_id')
+            Friendship.objects.values_list('user_low_id', 'user_high_id')
         )
 
         for item in friendships_data:
@@ -50,8 +51,10 @@ class Command(BaseCommand):
             sent_at = parse_datetime(item.get('sent_at'))
             accepted_at = parse_datetime(item.get('accepted_at')) if item.get('accepted_at') else None
 
-            if (sender.id, receiver.id) in existing_friendships:
+            pair = tuple(sorted((sender.id, receiver.id)))
+            if pair in existing_friendships:
                 continue
+            existing_friendships.add(pair)
 
             friendship_objects.append(
                 Friendship(
@@ -60,11 +63,14 @@ class Command(BaseCommand):
                     status=item['status'],
                     blocked_by=blocked_by,
                     sent_at=sent_at,
-                    accepted_at=accepted_at
+                    accepted_at=accepted_at,
+                    **Friendship.pair_key(sender.id, receiver.id)
                 )
             )
 
         Friendship.objects.bulk_create(friendship_objects)
+        # bulk_create skips Friendship.save, so drop cached graphs here.
+        invalidate_users(*{user.id for f in friendship_objects for user in (f.sender, f.receiver)})
 
         self.stdout.write(self.style.SUCCESS(
             f'Done! Created: {len(friendship_objects)} friendships'
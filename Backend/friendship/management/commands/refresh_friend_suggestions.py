@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from friendship.suggestions import TOP_K, refresh_stale_suggestions, refresh_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Precompute friend suggestions (mutual friends and shared interests) into FriendSuggestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every user instead of only those queued by friendship changes')
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+
+    def handle(self, *args, **options):
+        if options['all']:
+            refreshed = refresh_suggestions(top_k=options['top_k'])
+        else:
+            refreshed = refresh_stale_suggestions(top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed suggestions for {refreshed} users.'))
@@ -0,0 +1,69 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# When both directions of a pair exist, the row that wins is the one whose
+# status says the most about the relation.
+STATUS_PRIORITY = {3: 0, 1: 1, 0: 2, 2: 3}  # blocked, accepted, pending, cancelled
+
+
+def backfill_pair_keys(apps, schema_editor):
+    Friendship = apps.get_model('friendship', 'Friendship')
+
+    keep = {}
+    duplicates = []
+    for friendship in Friendship.objects.order_by('-sent_at', '-id'):
+        key = tuple(sorted((friendship.sender_id, friendship.receiver_id)))
+        current = keep.get(key)
+        if current is None:
+            keep[key] = friendship
+        elif STATUS_PRIORITY[friendship.status] < STATUS_PRIORITY[current.status]:
+            duplicates.append(current.id)
+            keep[key] = friendship
+        else:
+            duplicates.append(friendship.id)
+
+    Friendship.objects.filter(id__in=duplicates).delete()
+    for (low, high), friendship in keep.items():
+        friendship.user_low_id, friendship.user_high_id = low, high
+    Friendship.objects.bulk_update(keep.values(), ['user_low', 'user_high'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friendship', '0006_alter_friendship_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='friendship',
+            name='user_low',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='friendship',
+            name='user_high',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_pair_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='friendship',
+            name='user_low',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='friendship',
+            name='user_high',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='friendship',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='unique_friendship_pair'),
+        ),
+    ]
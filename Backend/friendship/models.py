@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 from user.models import User
+from .graph import invalidate_users
 
 class Status(models.IntegerChoices):
         PENDING  = 0 , "pending"
@@ -22,6 +24,72 @@ class Friendship(models.Model):
         default=Status.PENDING
     )
 
+    # The pair's user ids, lower first, kept in step with sender/receiver by
+    # save(). One relation per pair whichever way it was sent, and any lookup
+    # between two users is a point query on this key.
+    user_low = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    user_high = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+
     class Meta:
-        unique_together = ('sender', 'receiver')
-        ordering = ['-sent_at']
\ No newline at end of file
+        ordering = ['-sent_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='unique_friendship_pair'),
+        ]
+
+    @staticmethod
+    def pair_key(user_id, other_user_id):
+        low, high = sorted((user_id, other_user_id))
+        return {'user_low_id': low, 'user_high_id': high}
+
+    def save(self, *args, **kwargs):
+        key = self.pair_key(self.sender_id, self.receiver_id)
+        self.user_low_id, self.user_high_id = key['user_low_id'], key['user_high_id']
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'sender', 'receiver'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'user_low', 'user_high'}
+        super().save(*args, **kwargs)
+        self._invalidate_graph()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._invalidate_graph()
+        return result
+
+    def _invalidate_graph(self):
+        invalidate_users(self.sender_id, self.receiver_id)
+        # Any relation between the two ends the suggestion either way; the
+        # rest of their suggestions (and their friends') are recomputed by
+        # the next refresh_friend_suggestions run.
+        FriendSuggestion.objects.filter(
+            Q(user_id=self.sender_id, candidate_id=self.receiver_id)
+            | Q(user_id=self.receiver_id, candidate_id=self.sender_id)
+        ).delete()
+        SuggestionRefresh.objects.bulk_create(
+            [SuggestionRefresh(user_id=self.sender_id), SuggestionRefresh(user_id=self.receiver_id)],
+            update_conflicts=True, unique_fields=['user'], update_fields=['requested_at'],
+        )
+
+
+class FriendSuggestion(models.Model):
+    """Precomputed top candidates for ``user``, written by the suggestions job."""
+    user = models.ForeignKey(User, related_name='friend_suggestions', on_delete=models.CASCADE)
+    candidate = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+    mutual_friends = models.PositiveIntegerField(default=0)
+    shared_interests = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'candidate'], name='unique_friend_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'], name='friend_suggestion_rank_idx'),
+        ]
+
+
+class SuggestionRefresh(models.Model):
+    """Users whose suggestions are stale since a friendship of theirs changed."""
+    user = models.OneToOneField(User, primary_key=True, related_name='+', on_delete=models.CASCADE)
+    requested_at = models.DateTimeField(default=timezone.now)
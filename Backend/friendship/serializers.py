@@ -2,7 +2,7 @@ from datetime import timedelta
 from rest_framework import serializers
 from django.db.models import Q
 from django.utils import timezone
-from .models import Friendship, Status
+from .models import FriendSuggestion, Friendship, Status
 from user.models import User
 from .services import delete_cancelled_friendship
 
@@ -30,7 +30,15 @@ class FriendshipRequestSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        return Friendship.objects.create(**validated_data)
+        # Upsert on the pair key: a concurrent request in either direction
+        # hits the unique constraint and is reported, not duplicated.
+        sender, receiver = validated_data['sender'], validated_data['receiver']
+        friendship, created = Friendship.objects.get_or_create(
+            **Friendship.pair_key(sender.id, receiver.id), defaults=validated_data
+        )
+        if not created:
+            raise serializers.ValidationError("relation already exists")
+        return friendship
     
 
 class FriendshipAcceptSerializer(serializers.ModelSerializer):
@@ -103,4 +111,18 @@ class UnblockFriendshipSerializer(serializers.ModelSerializer):
 
         instance.delete()
         return None
-        
\ No newline at end of file
+        
+
+
+class SuggestedUserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'gender', 'streak_cnt']
+
+
+class FriendSuggestionSerializer(serializers.ModelSerializer):
+    candidate = SuggestedUserSerializer(read_only=True)
+
+    class Meta:
+        model = FriendSuggestion
+        fields = ['candidate', 'score', 'mutual_friends', 'shared_interests']
@@ -3,6 +3,7 @@ from requests import Response
 from django.db.models import Q
 from .models import User
 from .models import Friendship
+from .graph import has_relation
 
 
 def delete_cancelled_friendship(friendship_id):
@@ -30,6 +31,10 @@ def get_friendship_by_id(friendship_id):
 
 
 def check_existing_friendship(sender_id, receiver_id):
+    # Most pairs have no relation at all; the cached graph answers that
+    # without touching the table.
+    if not has_relation(sender_id, receiver_id):
+        return None
     existing_friendship = Friendship.objects.filter(
-        Q(sender_id=sender_id, receiver_id=receiver_id) | Q(sender_id=receiver_id, receiver_id=sender_id)).first()
+        **Friendship.pair_key(sender_id, receiver_id)).first()
     return existing_friendship
\ No newline at end of file
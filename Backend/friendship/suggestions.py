@@ -0,0 +1,219 @@
+"""
+Friend-of-friend suggestions.
+
+Candidates are friends of friends, from the sparse product ``A @ A`` (``A``
+the accepted-friendship adjacency matrix), plus users sharing an interest
+held by at most ``MAX_INTEREST_HOLDERS`` users. Interests are counted for
+those candidates only: the catalog is small, so ``M @ M.T`` over every
+interest (``M`` the user x interest matrix) would pair almost everyone with
+everyone. The top ``TOP_K`` per user are written to ``FriendSuggestion`` by
+``manage.py refresh_friend_suggestions``, so the endpoint only reads a few
+indexed rows.
+
+A friendship change queues both users in ``SuggestionRefresh``; a refresh
+recomputes them and their friends, whose mutual-friend counts moved too,
+from a graph of just their neighbourhood.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from scipy import sparse
+
+from user.models import User, UserInterest
+from .models import FriendSuggestion, Friendship, Status, SuggestionRefresh
+
+TOP_K = 20
+MUTUAL_FRIEND_WEIGHT = 1.0
+SHARED_INTEREST_WEIGHT = 0.25
+# Interests held by more users than this only add to the score of candidates
+# found another way; matching on them alone would make every chunk dense.
+MAX_INTEREST_HOLDERS = 500
+CHUNK_SIZE = 1000
+
+
+class _Graph:
+    """Sparse matrices over ``user_ids``, indexed by position in it."""
+
+    def __init__(self, user_ids, friendships, interests, holders=None):
+        self.user_ids = np.fromiter(user_ids, dtype=np.int64)
+        self.index = {user_id: i for i, user_id in enumerate(self.user_ids.tolist())}
+        n = len(self.user_ids)
+
+        friends = []
+        related = []
+        # Users who signed up after the id list was read are skipped here and
+        # below; their first friendship queues them for the next refresh.
+        for sender_id, receiver_id, status in friendships:
+            if sender_id not in self.index or receiver_id not in self.index:
+                continue
+            pair = (self.index[sender_id], self.index[receiver_id])
+            related.append(pair)
+            if status == Status.ACCEPTED:
+                friends.append(pair)
+        self.adjacency = self._symmetric(friends, n)
+        # Anyone the user already has a relation with (friend, pending,
+        # blocked) is never suggested.
+        self.related = self._symmetric(related, n)
+
+        interest_ids = {}
+        rows, cols = [], []
+        for user_id, interest_id in interests:
+            if user_id not in self.index:
+                continue
+            rows.append(self.index[user_id])
+            cols.append(interest_ids.setdefault(interest_id, len(interest_ids)))
+        self.interests = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n, max(len(interest_ids), 1))
+        )
+        if holders is None:
+            counts = np.asarray(self.interests.sum(axis=0)).ravel()
+        else:
+            counts = np.zeros(self.interests.shape[1])
+            for interest_id, column in interest_ids.items():
+                counts[column] = holders.get(interest_id, 0)
+        self.rare_interests = self.interests[:, np.flatnonzero(counts <= MAX_INTEREST_HOLDERS)].tocsr()
+
+    @classmethod
+    def everyone(cls):
+        return cls(
+            User.objects.order_by('id').values_list('id', flat=True),
+            Friendship.objects.values_list('sender_id', 'receiver_id', 'status'),
+            UserInterest.objects.values_list('user_id', 'interest_id'),
+        )
+
+    @classmethod
+    def around(cls, user_ids):
+        """
+        The part of the graph that scoring ``user_ids`` reads: their relations,
+        their friends' friendships, and the interests of them and of every
+        candidate.
+        """
+        user_ids = set(user_ids)
+        friendships = cls._friendships(user_ids)
+        friend_ids = {
+            other
+            for sender_id, receiver_id, status in friendships if status == Status.ACCEPTED
+            for other in (sender_id, receiver_id)
+        } - user_ids
+        friendships += cls._friendships(friend_ids, status=Status.ACCEPTED)
+        candidate_ids = {user_id for pair in friendships for user_id in pair[:2]}
+
+        interests = list(UserInterest.objects.filter(user_id__in=user_ids).values_list('user_id', 'interest_id'))
+        holders = dict(
+            UserInterest.objects.filter(interest_id__in={interest_id for _, interest_id in interests})
+            .values_list('interest_id').annotate(count=Count('id'))
+        )
+        rare = [interest_id for interest_id, count in holders.items() if count <= MAX_INTEREST_HOLDERS]
+        candidate_ids |= set(UserInterest.objects.filter(interest_id__in=rare).values_list('user_id', flat=True))
+        candidate_ids -= user_ids
+        interests += UserInterest.objects.filter(user_id__in=candidate_ids).values_list('user_id', 'interest_id')
+
+        return cls(sorted(user_ids | candidate_ids), friendships, interests, holders)
+
+    @staticmethod
+    def _friendships(user_ids, **filters):
+        # Two single-column lookups rather than one sender-or-receiver OR.
+        rows = Friendship.objects.filter(**filters).values_list('sender_id', 'receiver_id', 'status')
+        return list(rows.filter(sender_id__in=user_ids)) + list(rows.filter(receiver_id__in=user_ids))
+
+    @staticmethod
+    def _symmetric(pairs, n):
+        if not pairs:
+            return sparse.csr_matrix((n, n), dtype=np.float32)
+        rows, cols = zip(*pairs)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows) * 2, dtype=np.float32), (rows + cols, cols + rows)), shape=(n, n)
+        )
+        matrix.data[:] = 1  # a pair stored both ways still counts once
+        return matrix
+
+    def score_rows(self, rows, top_k):
+        """Yield (row, candidate rows, scores, mutual, shared) for each of ``rows``."""
+        mutual = (self.adjacency[rows] @ self.adjacency).tocsr()
+        rare = self.rare_interests[rows] @ self.rare_interests.T
+        candidates = (mutual + rare).tocsr()
+        candidates.sort_indices()
+        # One entry per (row, candidate) pair, grouped by row.
+        pair_rows = np.repeat(np.arange(len(rows)), np.diff(candidates.indptr))
+        pair_cols = candidates.indices
+        pair_mutual = np.asarray(mutual[pair_rows, pair_cols]).ravel() if len(pair_cols) else np.zeros(0)
+        pair_shared = np.asarray(
+            self.interests[rows[pair_rows]].multiply(self.interests[pair_cols]).sum(axis=1)
+        ).ravel()
+        pair_scores = MUTUAL_FRIEND_WEIGHT * pair_mutual + SHARED_INTEREST_WEIGHT * pair_shared
+        excluded = self.related[rows].tocsr()
+
+        for i, row in enumerate(rows):
+            span = slice(candidates.indptr[i], candidates.indptr[i + 1])
+            candidate_rows, values = pair_cols[span], pair_scores[span]
+            mutual_counts, shared_counts = pair_mutual[span], pair_shared[span]
+            keep = (candidate_rows != row) & ~np.isin(
+                candidate_rows, excluded.indices[excluded.indptr[i]:excluded.indptr[i + 1]]
+            )
+            candidate_rows, values = candidate_rows[keep], values[keep]
+            mutual_counts, shared_counts = mutual_counts[keep], shared_counts[keep]
+            if len(candidate_rows) > top_k:
+                best = np.argpartition(-values, top_k)[:top_k]
+                candidate_rows, values = candidate_rows[best], values[best]
+                mutual_counts, shared_counts = mutual_counts[best], shared_counts[best]
+            order = np.argsort(-values, kind='stable')
+            yield row, candidate_rows[order], values[order], mutual_counts[order], shared_counts[order]
+
+
+def _write(graph, rows, top_k):
+    suggestions = []
+    for row, candidates, scores, mutual, shared in graph.score_rows(rows, top_k):
+        user_id = int(graph.user_ids[row])
+        suggestions.extend(
+            FriendSuggestion(
+                user_id=user_id,
+                candidate_id=int(graph.user_ids[candidate]),
+                score=float(score),
+                mutual_friends=int(m),
+                shared_interests=int(s),
+            )
+            for candidate, score, m, s in zip(candidates, scores, mutual, shared)
+        )
+    with transaction.atomic():
+        FriendSuggestion.objects.filter(user_id__in=graph.user_ids[rows].tolist()).delete()
+        FriendSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+
+
+def refresh_suggestions(user_ids=None, top_k=TOP_K):
+    """
+    Recompute suggestions for ``user_ids`` (every user when None). Returns
+    how many users were refreshed.
+    """
+    if user_ids is None:
+        graph = _Graph.everyone()
+        rows = np.arange(len(graph.user_ids))
+        for start in range(0, len(rows), CHUNK_SIZE):
+            _write(graph, rows[start:start + CHUNK_SIZE], top_k)
+        return len(rows)
+
+    user_ids = sorted(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    for start in range(0, len(user_ids), CHUNK_SIZE):
+        chunk = user_ids[start:start + CHUNK_SIZE]
+        graph = _Graph.around(chunk)
+        _write(graph, np.array([graph.index[user_id] for user_id in chunk], dtype=np.int64), top_k)
+    return len(user_ids)
+
+
+def refresh_stale_suggestions(top_k=TOP_K):
+    """Recompute users queued by friendship changes, plus their friends."""
+    started = timezone.now()
+    user_ids = set(SuggestionRefresh.objects.filter(requested_at__lte=started).values_list('user_id', flat=True))
+    if not user_ids:
+        return 0
+    user_ids |= set(
+        Friendship.objects.filter(status=Status.ACCEPTED, sender_id__in=user_ids).values_list('receiver_id', flat=True)
+    )
+    user_ids |= set(
+        Friendship.objects.filter(status=Status.ACCEPTED, receiver_id__in=user_ids).values_list('sender_id', flat=True)
+    )
+    refreshed = refresh_suggestions(user_ids, top_k)
+    # Changes queued after this run started (requested_at is bumped on
+    # re-queue) wait for the next one.
+    SuggestionRefresh.objects.filter(requested_at__lte=started).delete()
+    return refreshed
@@ -1,3 +1,261 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from user.models import Interest, InterestCategory, User, UserInterest
+from . import graph, suggestions
+from .models import FriendSuggestion, Friendship, Status, SuggestionRefresh
+from .suggestions import _Graph, refresh_stale_suggestions, refresh_suggestions
+from .serializers import FriendshipRequestSerializer
+
+
+class FriendGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass1234')
+        self.carol = User.objects.create_user(username='carol', email='carol@example.com', password='pass1234')
+        self.client = APIClient()
+
+    def test_adjacency_is_built_once_and_served_from_cache(self):
+        Friendship.objects.create(sender=self.alice, receiver=self.bob, status=Status.ACCEPTED)
+        Friendship.objects.create(sender=self.carol, receiver=self.alice, status=Status.PENDING)
+
+        with self.assertNumQueries(1):
+            adjacency = graph.get_adjacency(self.alice.id)
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.are_friends(self.alice.id, self.bob.id))
+            self.assertFalse(graph.are_friends(self.alice.id, self.carol.id))
+            self.assertEqual(graph.get_adjacency(self.alice.id), adjacency)
+        self.assertEqual(adjacency.incoming, {self.carol.id})
+        self.assertEqual(graph.get_adjacency(self.carol.id).outgoing, {self.alice.id})
+
+    def test_state_changes_invalidate_both_users(self):
+        self.client.force_authenticate(user=self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/friendship/request/{self.bob.id}/')
+        self.assertEqual(graph.get_adjacency(self.bob.id).incoming, {self.alice.id})
+
+        friendship = Friendship.objects.get()
+        self.client.force_authenticate(user=self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/friendship/accept/{friendship.id}/', {}, format='json')
+        self.assertTrue(graph.are_friends(self.alice.id, self.bob.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/friendship/unfriend/{self.alice.id}/')
+        self.assertFalse(graph.are_friends(self.bob.id, self.alice.id))
+        self.assertFalse(Friendship.objects.exists())
+
+    def test_unfriend_checks_the_row_not_the_cached_graph(self):
+        Friendship.objects.create(sender=self.alice, receiver=self.bob, status=Status.ACCEPTED)
+        self.assertTrue(graph.are_friends(self.alice.id, self.bob.id))
+        # Another worker removed the friendship; this cache has not heard yet.
+        Friendship.objects.all().delete()
+        self.client.force_authenticate(user=self.alice)
+
+        response = self.client.delete(f'/friendship/unfriend/{self.bob.id}/')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_blocked_users_are_hidden_from_search_and_chat(self):
+        Friendship.objects.create(
+            sender=self.alice, receiver=self.bob, status=Status.BLOCKED, blocked_by=self.alice
+        )
+        self.client.force_authenticate(user=self.bob)
+
+        response = self.client.get('/user/search/a/')
+        self.assertEqual([u['username'] for u in response.data['results']], ['carol'])
+
+        response = self.client.post('/chat/rooms/', {'user_id': self.alice.id}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_friends_list_uses_the_graph(self):
+        Friendship.objects.create(sender=self.alice, receiver=self.bob, status=Status.ACCEPTED)
+        Friendship.objects.create(sender=self.carol, receiver=self.alice, status=Status.ACCEPTED)
+        self.client.force_authenticate(user=self.bob)
+
+        response = self.client.get(f'/user/{self.alice.id}/friends/')
+
+        self.assertEqual({u['username'] for u in response.data}, {'bob', 'carol'})
+
+
+class FriendshipPairKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass1234')
+        self.carol = User.objects.create_user(username='carol', email='carol@example.com', password='pass1234')
+        self.client = APIClient()
+
+    def test_save_keys_the_pair_whichever_way_it_was_sent(self):
+        friendship = Friendship.objects.create(sender=self.bob, receiver=self.alice)
+
+        self.assertEqual(
+            (friendship.user_low_id, friendship.user_high_id),
+            tuple(sorted((self.alice.id, self.bob.id))),
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Friendship.objects.create(sender=self.alice, receiver=self.bob)
+
+    def test_request_upsert_reports_an_existing_reverse_relation(self):
+        Friendship.objects.create(sender=self.bob, receiver=self.alice)
+        serializer = FriendshipRequestSerializer(
+            data={'sender': self.alice.id, 'receiver': self.bob.id, 'status': Status.PENDING},
+            context={'request': SimpleNamespace(user=self.alice)},
+        )
+        serializer.is_valid(raise_exception=True)
+
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        self.assertEqual(Friendship.objects.count(), 1)
+
+    def test_unblock_only_touches_the_named_pair(self):
+        Friendship.objects.create(sender=self.alice, receiver=self.bob, status=Status.BLOCKED, blocked_by=self.alice)
+        Friendship.objects.create(sender=self.alice, receiver=self.carol, status=Status.BLOCKED, blocked_by=self.alice)
+        self.client.force_authenticate(user=self.alice)
+
+        response = self.client.delete(f'/friendship/unblock/{self.carol.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(Friendship.objects.values_list('receiver_id', flat=True)), [self.bob.id]
+        )
+
+
+class FriendSuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('alice', 'bob', 'carol', 'dave', 'erin', 'frank')
+        }
+        self.client = APIClient()
+
+    def befriend(self, a, b):
+        return Friendship.objects.create(sender=self.users[a], receiver=self.users[b], status=Status.ACCEPTED)
+
+    def suggested(self, name):
+        return [
+            (s.candidate.username, s.mutual_friends)
+            for s in FriendSuggestion.objects.filter(user=self.users[name]).select_related('candidate')
+        ]
+
+    def test_ranks_candidates_by_mutual_friends_and_interests(self):
+        # alice-bob, alice-carol; dave knows bob and carol, erin knows bob.
+        for a, b in [('alice', 'bob'), ('alice', 'carol'), ('dave', 'bob'), ('dave', 'carol'), ('erin', 'bob')]:
+            self.befriend(a, b)
+        hiking = Interest.objects.create(title='Hiking', category=InterestCategory.objects.create(name='Outdoors'))
+        UserInterest.objects.create(user=self.users['alice'], interest=hiking)
+        UserInterest.objects.create(user=self.users['frank'], interest=hiking)
+
+        refresh_suggestions()
+
+        self.assertEqual(self.suggested('alice'), [('dave', 2), ('erin', 1), ('frank', 0)])
+        frank = FriendSuggestion.objects.get(user=self.users['alice'], candidate=self.users['frank'])
+        self.assertEqual(frank.shared_interests, 1)
+
+    def test_common_interests_only_score_candidates_found_through_friends(self):
+        self.befriend('alice', 'bob')
+        self.befriend('bob', 'carol')
+        hiking = Interest.objects.create(title='Hiking', category=InterestCategory.objects.create(name='Outdoors'))
+        for name in ('alice', 'carol', 'frank'):
+            UserInterest.objects.create(user=self.users[name], interest=hiking)
+
+        with patch.object(suggestions, 'MAX_INTEREST_HOLDERS', 2):
+            refresh_suggestions()
+
+        self.assertEqual(self.suggested('alice'), [('carol', 1)])
+        carol = FriendSuggestion.objects.get(user=self.users['alice'], candidate=self.users['carol'])
+        self.assertEqual(carol.shared_interests, 1)
+        self.assertEqual(carol.score, 1.25)
+
+    def test_users_created_during_a_refresh_are_skipped(self):
+        self.befriend('alice', 'bob')
+        self.befriend('bob', 'carol')
+        hiking = Interest.objects.create(title='Hiking', category=InterestCategory.objects.create(name='Outdoors'))
+        UserInterest.objects.create(user=self.users['frank'], interest=hiking)
+        # carol and frank signed up after the user ids were read.
+        late = User.objects.exclude(username__in=['carol', 'frank']).order_by('id')
+
+        with patch.object(User.objects, 'order_by', return_value=late):
+            self.assertEqual(refresh_suggestions(), 4)
+
+        self.assertEqual(self.suggested('alice'), [])
+
+    def test_existing_relations_are_never_suggested(self):
+        self.befriend('alice', 'bob')
+        self.befriend('bob', 'carol')
+        Friendship.objects.create(sender=self.users['carol'], receiver=self.users['alice'], status=Status.PENDING)
+
+        refresh_suggestions()
+
+        self.assertEqual(self.suggested('alice'), [])
+
+    def test_friendship_change_queues_a_refresh(self):
+        self.befriend('alice', 'bob')
+        self.befriend('bob', 'carol')
+        refresh_suggestions()
+        SuggestionRefresh.objects.all().delete()
+        self.assertEqual(self.suggested('alice'), [('carol', 1)])
+
+        # alice and carol connect: the stale suggestion goes at once, and
+        # bob's friends are recomputed by the next incremental run.
+        self.befriend('carol', 'alice')
+        self.befriend('dave', 'carol')
+        self.assertEqual(self.suggested('alice'), [])
+
+        refreshed = refresh_stale_suggestions()
+
+        self.assertEqual(refreshed, 4)
+        self.assertEqual(self.suggested('alice'), [('dave', 1)])
+        self.assertFalse(SuggestionRefresh.objects.exists())
+        self.assertEqual(refresh_stale_suggestions(), 0)
+
+    def test_incremental_refresh_reads_only_the_neighbourhood(self):
+        self.befriend('alice', 'bob')
+        self.befriend('bob', 'carol')
+        self.befriend('erin', 'frank')
+        SuggestionRefresh.objects.all().delete()
+        self.befriend('carol', 'dave')
+        built = []
+        around = _Graph.around
+
+        def spy(user_ids):
+            built.append(around(user_ids))
+            return built[-1]
+
+        with patch.object(_Graph, 'around', side_effect=spy), \
+                patch.object(_Graph, 'everyone', side_effect=AssertionError('full rebuild')):
+            self.assertEqual(refresh_stale_suggestions(), 3)
+
+        usernames = set(User.objects.filter(id__in=built[0].user_ids.tolist()).values_list('username', flat=True))
+        self.assertEqual(usernames, {'alice', 'bob', 'carol', 'dave'})
+        self.assertEqual(self.suggested('dave'), [('bob', 1)])
+        self.assertEqual(self.suggested('bob'), [('dave', 1)])
+
+    def test_endpoint_reads_precomputed_suggestions(self):
+        self.befriend('alice', 'bob')
+        self.befriend('bob', 'carol')
+        self.befriend('bob', 'dave')
+        refresh_suggestions()
+        # Blocked after the refresh: filtered at read time.
+        Friendship.objects.create(
+            sender=self.users['alice'], receiver=self.users['dave'],
+            status=Status.BLOCKED, blocked_by=self.users['alice'],
+        )
+        FriendSuggestion.objects.create(user=self.users['alice'], candidate=self.users['dave'], score=5)
+        self.client.force_authenticate(user=self.users['alice'])
+        graph.get_adjacency(self.users['alice'].id)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/friendship/suggestions/?limit=5')
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s['candidate']['username'] for s in response.data], ['carol'])
+        self.assertEqual(response.data[0]['mutual_friends'], 1)
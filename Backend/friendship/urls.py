@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     FriendshipRequestView, FriendshipAcceptView
-    , FriendshipCancelRequestView, BlockFriendshipView, FriendshipStatusView, UnblockFriendshipView, check, delete_that, unfriendView
+    , FriendshipCancelRequestView, BlockFriendshipView, FriendshipStatusView, UnblockFriendshipView, FriendSuggestionsView, check, delete_that, unfriendView
 )
 
 urlpatterns = [
@@ -14,4 +14,5 @@ urlpatterns = [
     path('delete/<int:friendship_id>/', delete_that.as_view(), name='friendship-delete'),
     path('status/<int:user_id>/', FriendshipStatusView.as_view(), name='friendship-status'),
     path('unfriend/<int:user_id>/', unfriendView.as_view(), name='friendship-unfriend'),
+    path('suggestions/', FriendSuggestionsView.as_view(), name='friendship-suggestions'),
 ]
\ No newline at end of file
@@ -20,14 +20,15 @@ from .services import (
 )
 
 from user.models import User
-from .models import Friendship
+from .graph import get_adjacency
+from .models import FriendSuggestion, Friendship
 
 from .models import Status
 
 from .serializers import (
     FriendshipRequestSerializer, FriendshipAcceptSerializer,
     FriendshipCancelRequestSerializer , BlockFriendshipSerializer 
-    ,UnblockFriendshipSerializer
+    ,UnblockFriendshipSerializer, FriendSuggestionSerializer
 )
 
 from notification.services import push_accept_notification , push_request_notification
@@ -150,8 +151,7 @@ class BlockFriendshipView(APIView):
         except User.DoesNotExist:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        existing_friendship = Friendship.objects.filter(
-            Q(sender=sender, receiver=receiver) | Q(sender=receiver, receiver=sender)).first()
+        existing_friendship = check_existing_friendship(sender.id, receiver.id)
 
     
         if existing_friendship:
@@ -188,7 +188,9 @@ class UnblockFriendshipView(APIView):
             return Response({"error": "User not found"}, status=404)
 
         try:
-            friendship = Friendship.objects.get(blocked_by = user , status=Status.BLOCKED)
+            friendship = Friendship.objects.get(
+                **Friendship.pair_key(user.id, receiver.id), blocked_by=user, status=Status.BLOCKED
+            )
         except Friendship.DoesNotExist:
             return Response({"error": "can not unblock user you did not block him"}, status=404)
 
@@ -234,17 +236,49 @@ class unfriendView(APIView):
         except User.DoesNotExist:
             return Response({"error": "User not found"}, status=404)
 
+        # Decided from the row itself: the cached graph may lag behind a change
+        # another worker just made.
         friendship = Friendship.objects.filter(
-            Q(sender=request.user, receiver_id=user_id) | Q(sender_id=user_id, receiver=request.user) & Q(status=Status.ACCEPTED)
+            **Friendship.pair_key(request.user.id, user_id), status=Status.ACCEPTED
         ).first()
-
-        if not friendship:
+        if friendship is None:
             return Response({"error": "Friendship not found"}, status=404)
 
         friendship.delete()
 
         return Response({"message": "Friendship deleted successfully"}, status=200)
 
+SUGGESTIONS_LIMIT = 20
+
+
+class FriendSuggestionsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f'How many suggestions to return (max {SUGGESTIONS_LIMIT})'),
+        ],
+        responses={200: FriendSuggestionSerializer(many=True)},
+    )
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', SUGGESTIONS_LIMIT)), SUGGESTIONS_LIMIT))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+
+        # Suggestions are precomputed; anyone related since the last refresh
+        # is dropped here from the cached graph.
+        related = get_adjacency(request.user.id).related()
+        suggestions = (
+            FriendSuggestion.objects.filter(user=request.user)
+            .exclude(candidate_id__in=related)
+            .select_related('candidate')
+            .order_by('-score', 'candidate_id')[:limit]
+        )
+        return Response(FriendSuggestionSerializer(suggestions, many=True).data)
+
+
 class check(APIView):
 
     def get(self, request,):
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class HobbyConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "hobby"
+
+    def ready(self):
+        from . import signals  # noqa: F401
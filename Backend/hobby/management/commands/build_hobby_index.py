@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from hobby.recommend import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Refit the hobby recommendation index from every hobby and its tags'
+
+    def handle(self, *args, **options):
+        index = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index.hobby_ids)} hobbies (generation {index.generation}).'
+        ))
@@ -2,6 +2,7 @@ import json
 from pathlib import Path
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from hobby.models import Hobby, Tag
 
@@ -9,6 +10,8 @@ from hobby.models import Hobby, Tag
 class Command(BaseCommand):
     help = 'Load hobbies and tags from data.json'
 
+    # One transaction, so the recommendation index refreshes once at the end.
+    @transaction.atomic
     def handle(self, *args, **options):
         data_file = Path(__file__).resolve().parents[2] / 'data.json'
 
@@ -1,46 +1,331 @@
-import pandas as pd
+"""
+Content-based hobby recommendations.
+
+Hobbies are embedded once with TF-IDF over their name and tags. The fitted
+vocabulary, the L2-normalised sparse matrix and every hobby's top ``TOP_K``
+neighbours are saved under ``settings.HOBBY_INDEX_DIR`` as ``.npy`` files and
+memory-mapped on load, so worker processes share one copy and a query is a row
+lookup (or, past ``TOP_K`` results, one sparse row product and an
+``argpartition``).
+
+Saving a hobby or changing tags re-embeds only the touched hobbies against
+the stored vocabulary and patches the neighbour lists they can affect (see
+``signals.py``). Deleting a hobby, or ``manage.py build_hobby_index``, refits
+from scratch; terms first seen since the last fit count from then on.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 from .models import Hobby
 
-def suggest_hobbies(hobby_id, num_recommendations):
+TOP_K = 20
+# Neighbours at or below this cosine similarity are not recommended.
+MIN_SIMILARITY = 0.05
+CHUNK_SIZE = 1000
+# Index generations kept on disk, so a process still reading the previous
+# one is not pulled from under it.
+KEEP_GENERATIONS = 2
+
+_ARRAYS = ('hobby_ids', 'data', 'indices', 'indptr', 'neighbors', 'scores', 'idf')
+
+
+def _vectorizer(vocabulary=None, idf=None):
+    vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 1), vocabulary=vocabulary, dtype=np.float32)
+    if idf is not None:
+        vectorizer.idf_ = idf
+    return vectorizer
+
+
+def _documents(hobby_ids=None):
+    hobbies = Hobby.objects.order_by('id').prefetch_related('tags')
+    if hobby_ids is not None:
+        hobbies = hobbies.filter(id__in=hobby_ids)
+    return {h.id: f"{h.name} {' '.join(t.name for t in h.tags.all())}".lower() for h in hobbies}
+
+
+def _top_neighbors(matrix, rows):
+    """Top ``TOP_K`` (positions, scores) for ``rows``, -1-padded, best first."""
+    neighbors = np.full((len(rows), TOP_K), -1, dtype=np.int32)
+    scores = np.zeros((len(rows), TOP_K), dtype=np.float32)
+    k = min(TOP_K, matrix.shape[0] - 1)
+    if k <= 0 or not len(rows):
+        return neighbors, scores
+
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        similarities = (matrix[chunk] @ matrix.T).toarray()
+        similarities[np.arange(len(chunk)), chunk] = -1  # never its own neighbour
+        best = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(similarities, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        weak = best_scores <= MIN_SIMILARITY
+        best[weak], best_scores[weak] = -1, 0
+        neighbors[start:start + len(chunk), :k] = best
+        scores[start:start + len(chunk), :k] = best_scores
+    return neighbors, scores
+
+
+class HobbyIndex:
+    def __init__(self, generation, hobby_ids, matrix, neighbors, scores, vocabulary, idf):
+        self.generation = generation
+        self.hobby_ids = hobby_ids
+        self.matrix = matrix
+        self.neighbors = neighbors
+        self.scores = scores
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.positions = {hobby_id: i for i, hobby_id in enumerate(hobby_ids.tolist())}
+
+    @classmethod
+    def fit(cls):
+        documents = _documents()
+        hobby_ids = np.fromiter(documents, dtype=np.int64, count=len(documents))
+        vectorizer = _vectorizer()
+        try:
+            matrix = vectorizer.fit_transform(documents.values()).tocsr()
+            vocabulary, idf = vectorizer.vocabulary_, vectorizer.idf_.astype(np.float32)
+        except ValueError:  # no hobbies, or nothing but stop words
+            matrix = sparse.csr_matrix((len(hobby_ids), 0), dtype=np.float32)
+            vocabulary, idf = {}, np.zeros(0, dtype=np.float32)
+        neighbors, scores = _top_neighbors(matrix, np.arange(len(hobby_ids)))
+        return cls(None, hobby_ids, matrix, neighbors, scores, vocabulary, idf)
+
+    def updated(self, documents):
+        """
+        A copy with ``documents`` ({hobby id: text}) re-embedded or appended,
+        recomputing only the neighbour lists they can change.
+        """
+        if not self.vocabulary:
+            return self.fit()
+        new_ids = [hobby_id for hobby_id in documents if hobby_id not in self.positions]
+        hobby_ids = np.concatenate([self.hobby_ids, np.array(new_ids, dtype=np.int64)])
+        n = len(hobby_ids)
+        positions = {**self.positions, **{hobby_id: len(self.hobby_ids) + i for i, hobby_id in enumerate(new_ids)}}
+        changed = np.array([positions[hobby_id] for hobby_id in documents], dtype=np.int64)
+
+        vectors = _vectorizer(self.vocabulary, self.idf).transform(documents.values())
+        keep = np.ones(n, dtype=np.float32)
+        keep[changed] = 0
+        placement = sparse.csr_matrix(
+            (np.ones(len(changed), dtype=np.float32), (changed, np.arange(len(changed)))), shape=(n, len(changed))
+        )
+        matrix = sparse.vstack([self.matrix, sparse.csr_matrix((len(new_ids), self.matrix.shape[1]))])
+        matrix = (sparse.diags(keep) @ matrix + placement @ vectors).tocsr().astype(np.float32)
+        matrix.eliminate_zeros()
+
+        neighbors = np.vstack([self.neighbors, np.full((len(new_ids), TOP_K), -1, dtype=np.int32)])
+        scores = np.vstack([self.scores, np.zeros((len(new_ids), TOP_K), dtype=np.float32)])
+
+        # Rows that listed a changed hobby may have lost it (its score can
+        # only be known by a full row); the rest can only gain it.
+        stale = np.isin(neighbors, changed).any(axis=1)
+        stale[changed] = True
+        recompute = np.flatnonzero(stale)
+        neighbors[recompute], scores[recompute] = _top_neighbors(matrix, recompute)
+
+        others = np.flatnonzero(~stale)
+        if len(others):
+            column_scores = (matrix[others] @ matrix[changed].T).toarray()
+            candidates = np.hstack([neighbors[others], np.broadcast_to(changed, column_scores.shape)])
+            candidate_scores = np.hstack([np.where(neighbors[others] >= 0, scores[others], 0), column_scores])
+            order = np.argsort(-candidate_scores, axis=1, kind='stable')[:, :TOP_K]
+            best = np.take_along_axis(candidates, order, axis=1).astype(np.int32)
+            best_scores = np.take_along_axis(candidate_scores, order, axis=1).astype(np.float32)
+            weak = best_scores <= MIN_SIMILARITY
+            best[weak], best_scores[weak] = -1, 0
+            neighbors[others], scores[others] = best, best_scores
 
-    all_hobbies = Hobby.objects.all()
-    if not all_hobbies.exists():
-        return []
+        return HobbyIndex(None, hobby_ids, matrix, neighbors, scores, self.vocabulary, self.idf)
 
-    data = [
-        {
-            'id': h.id, 
-            'content': f"{h.name} {h.get_tags_display()}".lower() 
-        } 
-        for h in all_hobbies
-        
-    ]
+    def similar(self, hobby_id, count):
+        """Ids of the ``count`` hobbies most similar to ``hobby_id``, best first."""
+        position = self.positions.get(hobby_id)
+        if position is None or count <= 0:
+            return []
+        if count <= TOP_K:
+            row = self.neighbors[position, :count]
+            return self.hobby_ids[row[row >= 0]].tolist()
 
-    df = pd.DataFrame(data)
-   
-    tfidf = TfidfVectorizer(stop_words='english', ngram_range=(1, 1))
-    tfidf_matrix = tfidf.fit_transform(df['content'])
+        similarities = (self.matrix[position] @ self.matrix.T).toarray().ravel()
+        similarities[position] = -1
+        count = min(count, len(similarities) - 1)
+        best = np.argpartition(-similarities, count - 1)[:count]
+        best = best[np.argsort(-similarities[best], kind='stable')]
+        best = best[similarities[best] > MIN_SIMILARITY]
+        return self.hobby_ids[best].tolist()
 
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+    def save(self, index_dir):
+        generation = str(time.time_ns())
+        path = index_dir / generation
+        path.mkdir(parents=True)
+        arrays = {
+            'hobby_ids': self.hobby_ids,
+            'data': self.matrix.data.astype(np.float32),
+            'indices': self.matrix.indices.astype(np.int32),
+            'indptr': self.matrix.indptr.astype(np.int64),
+            'neighbors': self.neighbors,
+            'scores': self.scores,
+            'idf': self.idf,
+        }
+        for name, array in arrays.items():
+            np.save(path / f'{name}.npy', np.ascontiguousarray(array))
+        (path / 'meta.json').write_text(json.dumps({
+            'columns': self.matrix.shape[1],
+            'vocabulary': {term: int(column) for term, column in self.vocabulary.items()},
+        }))
+        # Readers follow CURRENT, so they see the old generation or the new
+        # one, never a half-written mix.
+        (index_dir / 'CURRENT.tmp').write_text(generation)
+        os.replace(index_dir / 'CURRENT.tmp', index_dir / 'CURRENT')
+        for old in sorted(p for p in index_dir.iterdir() if p.is_dir())[:-KEEP_GENERATIONS]:
+            shutil.rmtree(old, ignore_errors=True)
+        self.generation = generation
+        return self
 
+    @classmethod
+    def load(cls, index_dir, generation):
+        path = index_dir / generation
+        arrays = {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in _ARRAYS}
+        meta = json.loads((path / 'meta.json').read_text())
+        matrix = sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']),
+            shape=(len(arrays['hobby_ids']), meta['columns']),
+        )
+        return cls(generation, arrays['hobby_ids'], matrix, arrays['neighbors'], arrays['scores'],
+                   meta['vocabulary'], arrays['idf'])
+
+
+def _index_dir():
+    return Path(settings.HOBBY_INDEX_DIR)
+
+
+def _current_generation(index_dir):
     try:
-        idx = df.index[df['id'] == hobby_id].tolist()[0]
-    except IndexError:
-        return []
+        return (index_dir / 'CURRENT').read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+if fcntl is not None:
+    def _lock_file(f):
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f, fcntl.LOCK_UN)
+else:
+    def _lock_file(f):
+        while True:
+            f.seek(0)
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after about ten seconds; keep waiting.
+                continue
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _locked(index_dir):
+    """Serialises index writers across processes."""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    with open(index_dir / '.lock', 'w') as lock:
+        _lock_file(lock)
+        try:
+            yield
+        finally:
+            _unlock_file(lock)
+
 
-    sim_scores = list(enumerate(cosine_sim[idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
+_loaded = None
+_load_lock = threading.Lock()
 
-    sim_scores = [s for s in sim_scores[1:num_recommendations+1] if s[1] > 0.05]
-    
-    hobby_indices = [i[0] for i in sim_scores]
-    recommended_ids = df['id'].iloc[hobby_indices].tolist()
 
+def get_index():
+    """The current index, memory-mapped once per process and generation."""
+    global _loaded
+    index_dir = _index_dir()
+    generation = _current_generation(index_dir)
+    if generation is None:
+        rebuild_index()
+        generation = _current_generation(index_dir)
+    index = _loaded
+    if index is None or index.generation != generation:
+        with _load_lock:
+            if _loaded is None or _loaded.generation != generation:
+                _loaded = HobbyIndex.load(index_dir, generation)
+            index = _loaded
+    return index
 
-    hobbies_dict = {h.id: h for h in Hobby.objects.filter(id__in=recommended_ids)}
-    
-    sorted_recommendations = [hobbies_dict[hid] for hid in recommended_ids if hid in hobbies_dict]
 
-    return sorted_recommendations
\ No newline at end of file
+def rebuild_index():
+    """Refit TF-IDF over every hobby and publish a new generation."""
+    index_dir = _index_dir()
+    with _locked(index_dir):
+        return HobbyIndex.fit().save(index_dir)
+
+
+def refresh_index(hobby_ids):
+    """Re-embed ``hobby_ids`` into the current index, or rebuild when there is none."""
+    index_dir = _index_dir()
+    with _locked(index_dir):
+        generation = _current_generation(index_dir)
+        documents = _documents(hobby_ids)
+        if generation is None or len(documents) < len(set(hobby_ids)):
+            # No index yet, or a hobby was deleted: refit.
+            return HobbyIndex.fit().save(index_dir)
+        return HobbyIndex.load(index_dir, generation).updated(documents).save(index_dir)
+
+
+_pending = threading.local()
+
+
+def schedule_refresh(hobby_ids=(), rebuild=False):
+    """Refresh the index for ``hobby_ids`` once the current transaction commits."""
+    if not hasattr(_pending, 'ids'):
+        _pending.ids, _pending.rebuild = set(), False
+    _pending.ids.update(hobby_ids)
+    _pending.rebuild = _pending.rebuild or rebuild
+    # One callback per change, but the first to run drains everything, so a
+    # bulk load refreshes once. Ids from a rolled-back transaction are simply
+    # refreshed with the next commit.
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending():
+    ids, rebuild = getattr(_pending, 'ids', set()), getattr(_pending, 'rebuild', False)
+    if not ids and not rebuild:
+        return
+    _pending.ids, _pending.rebuild = set(), False
+    if rebuild:
+        rebuild_index()
+    else:
+        refresh_index(ids)
+
+
+def suggest_hobbies(hobby_id, num_recommendations):
+    recommended_ids = get_index().similar(hobby_id, num_recommendations)
+    hobbies_dict = Hobby.objects.prefetch_related('tags').in_bulk(recommended_ids)
+    return [hobbies_dict[hid] for hid in recommended_ids if hid in hobbies_dict]
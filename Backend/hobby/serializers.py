@@ -0,0 +1,11 @@
+from rest_framework import serializers
+
+from .models import Hobby
+
+
+class HobbySerializer(serializers.ModelSerializer):
+    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='name')
+
+    class Meta:
+        model = Hobby
+        fields = ['id', 'name', 'tags']
@@ -0,0 +1,38 @@
+"""Keeps the recommendation index in step with hobbies and their tags."""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Hobby, Tag
+from .recommend import schedule_refresh
+
+
+@receiver(post_save, sender=Hobby)
+def hobby_saved(sender, instance, **kwargs):
+    schedule_refresh([instance.id])
+
+
+@receiver(post_delete, sender=Hobby)
+def hobby_deleted(sender, instance, **kwargs):
+    schedule_refresh(rebuild=True)
+
+
+@receiver(m2m_changed, sender=Hobby.tags.through)
+def hobby_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            schedule_refresh([instance.id])
+    elif action in ('post_add', 'post_remove'):
+        schedule_refresh(pk_set)
+    elif action == 'pre_clear':
+        schedule_refresh(instance.hobby_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        schedule_refresh(instance.hobby_set.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    schedule_refresh(instance.hobby_set.values_list('id', flat=True))
@@ -1,3 +1,83 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from user.models import User
+from . import recommend
+from .models import Hobby, Tag
+
+
+class HobbyRecommenderTests(TestCase):
+    def setUp(self):
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        settings_override = override_settings(HOBBY_INDEX_DIR=index_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        recommend._loaded = None
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coffee = self.hobby('coffee', 'books', 'brewing', 'latte_art')
+            self.reading = self.hobby('reading', 'books', 'fiction', 'library')
+            self.writing = self.hobby('writing', 'books', 'fiction', 'poetry')
+            self.gaming = self.hobby('gaming', 'esports', 'streaming')
+
+    def hobby(self, name, *tags):
+        hobby = Hobby.objects.create(name=name)
+        hobby.tags.set([Tag.objects.get_or_create(name=tag)[0] for tag in tags])
+        return hobby
+
+    def names(self, hobby, count=3):
+        return [h.name for h in recommend.suggest_hobbies(hobby.id, count)]
+
+    def test_recommends_by_shared_tags(self):
+        self.assertEqual(self.names(self.reading), ['writing', 'coffee'])
+        self.assertEqual(self.names(self.gaming), [])
+        self.assertEqual(self.names(self.reading, count=1), ['writing'])
+        self.assertEqual(recommend.suggest_hobbies(0, 3), [])
+
+    def test_rows_beyond_top_k_are_ranked_from_the_matrix(self):
+        self.assertEqual(self.names(self.reading, count=recommend.TOP_K + 5), ['writing', 'coffee'])
+
+    def test_index_is_memory_mapped_and_reused(self):
+        index = recommend.get_index()
+
+        self.assertIs(recommend.get_index(), index)
+        self.assertIsNotNone(index.neighbors.filename)
+        # Only the hobbies themselves (and their tags) are read per query.
+        with self.assertNumQueries(2):
+            recommend.suggest_hobbies(self.coffee.id, 2)
+
+    def test_tag_changes_refresh_only_the_touched_hobbies(self):
+        before = recommend.get_index().generation
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gaming.tags.add(Tag.objects.get(name='fiction'))
+            chess = self.hobby('chess', 'strategy', 'esports')
+
+        self.assertNotEqual(recommend.get_index().generation, before)
+        self.assertIn('gaming', self.names(self.reading))
+        self.assertEqual(self.names(chess), ['gaming'])
+
+        # Patched neighbour lists match recomputing every row.
+        patched = recommend.get_index()
+        neighbors, _ = recommend._top_neighbors(patched.matrix, np.arange(len(patched.hobby_ids)))
+        self.assertEqual(patched.neighbors.tolist(), neighbors.tolist())
+
+    def test_deleting_a_hobby_rebuilds(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writing.delete()
+
+        self.assertNotIn(self.writing.id, recommend.get_index().positions)
+        self.assertEqual(self.names(self.reading), ['coffee'])
+
+    def test_similar_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='alice', password='pass1234'))
+
+        response = client.get(f'/hobby/{self.reading.id}/similar/?limit=1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'id': self.writing.id, 'name': 'writing', 'tags': ['books', 'fiction', 'poetry']}])
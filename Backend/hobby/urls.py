@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import SimilarHobbiesView
+
+urlpatterns = [
+    path('<int:hobby_id>/similar/', SimilarHobbiesView.as_view(), name='hobby-similar'),
+]
@@ -1,6 +1,30 @@
-from django.shortcuts import render
-from recommend.py import suggest_hobbies
-# Create your views here.
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from .recommend import suggest_hobbies
+from .serializers import HobbySerializer
 
-suggest_hobbies(1 , 3)
\ No newline at end of file
+MAX_RECOMMENDATIONS = 50
+
+
+class SimilarHobbiesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f'How many hobbies to return (default 3, max {MAX_RECOMMENDATIONS})'),
+        ],
+        responses={200: HobbySerializer(many=True)},
+    )
+    def get(self, request, hobby_id):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 3)), MAX_RECOMMENDATIONS))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=400)
+
+        hobbies = suggest_hobbies(hobby_id, limit)
+        return Response(HobbySerializer(hobbies, many=True).data)
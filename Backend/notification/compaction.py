@@ -0,0 +1,93 @@
+"""
+Retention for the notification table.
+
+Read notifications older than the retention window are folded into
+``NotificationDigest`` rows (one per receiver, type and day) and deleted, and
+the user snapshots older rows embedded in ``data`` are cut down to the fields
+clients display. Run it periodically with ``manage.py compact_notifications``.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationDigest
+
+RETENTION_DAYS = 90
+CHUNK_SIZE = 5000
+
+# What a notification keeps about the user who triggered it.
+USER_PAYLOAD_FIELDS = ('id', 'username')
+
+
+def slim_user_payload(user_payload):
+    return {field: user_payload[field] for field in USER_PAYLOAD_FIELDS if field in user_payload}
+
+
+def _fold_chunk(rows):
+    counts = Counter(
+        (receiver_id, type_, timezone.localtime(created_at).date())
+        for receiver_id, type_, created_at in rows
+    )
+    existing = NotificationDigest.objects.filter(
+        receiver_id__in={key[0] for key in counts},
+        day__in={key[2] for key in counts},
+    )
+    for digest in existing:
+        key = (digest.receiver_id, digest.type, digest.day)
+        if key in counts:
+            counts[key] += digest.count
+
+    NotificationDigest.objects.bulk_create(
+        [
+            NotificationDigest(receiver_id=receiver_id, type=type_, day=day, count=count)
+            for (receiver_id, type_, day), count in counts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['receiver', 'type', 'day'],
+        update_fields=['count'],
+    )
+
+
+def fold_old_notifications(cutoff):
+    """Replace read notifications created before ``cutoff`` with digests."""
+    folded = 0
+    old_read = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+    while True:
+        with transaction.atomic():
+            chunk = list(
+                old_read.order_by('id').values_list('id', 'receiver_id', 'type', 'created_at')[:CHUNK_SIZE]
+            )
+            if not chunk:
+                return folded
+            _fold_chunk([row[1:] for row in chunk])
+            Notification.objects.filter(id__in=[row[0] for row in chunk]).delete()
+        folded += len(chunk)
+
+
+def slim_user_snapshots():
+    """Drop everything but ``USER_PAYLOAD_FIELDS`` from stored user snapshots."""
+    slimmed = 0
+    last_id = 0
+    # Full snapshots are the ones carrying the user's email.
+    with_snapshot = Notification.objects.filter(data__user__has_key='email')
+    while True:
+        chunk = list(with_snapshot.filter(id__gt=last_id).order_by('id').only('id', 'data', 'updated_at')[:CHUNK_SIZE])
+        if not chunk:
+            return slimmed
+        now = timezone.now()
+        for notification in chunk:
+            notification.data['user'] = slim_user_payload(notification.data['user'])
+            notification.updated_at = now
+        Notification.objects.bulk_update(chunk, ['data', 'updated_at'])
+        slimmed += len(chunk)
+        last_id = chunk[-1].id
+
+
+def compact_notifications(retention_days=RETENTION_DAYS, now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=retention_days)
+    return {
+        'folded': fold_old_notifications(cutoff),
+        'slimmed': slim_user_snapshots(),
+    }
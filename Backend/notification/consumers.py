@@ -0,0 +1,54 @@
+import json
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from chat.realtime import BatchedEventsMixin
+from .counters import get_unread_count
+from .realtime import notification_group_name
+
+
+class NotificationConsumer(BatchedEventsMixin, AsyncWebsocketConsumer):
+    """
+    ws/notifications/?token=<token>
+
+    On connect the client gets ``{"type": "unread_count", "unread_count": n}``,
+    then ``{"type": "notification", "notification": {...}, "unread_delta": 1}``
+    for every new notification and ``{"type": "unread_delta", "unread_delta": -k}``
+    when notifications are read. Adding the deltas to the initial count keeps
+    the badge current with no further requests.
+    """
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = notification_group_name(self.user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        unread_count = await self.count_unread(self.user.id)
+        await self.send(text_data=json.dumps({'type': 'unread_count', 'unread_count': unread_count}))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def notification_created(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'notification': event['notification'],
+            'unread_delta': event['unread_delta'],
+        }))
+
+    async def notification_unread(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'unread_delta',
+            'unread_delta': event['unread_delta'],
+        }))
+
+    @database_sync_to_async
+    def count_unread(self, user_id):
+        return get_unread_count(user_id)
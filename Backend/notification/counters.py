@@ -0,0 +1,48 @@
+"""
+Per-user unread notification counters.
+
+The count lives in the cache and is adjusted in place as notifications are
+created and read, so the badge endpoint never scans the table. A missing or
+expired entry falls back to one indexed COUNT on (receiver, is_read) and is
+stored again; the TTL makes that recount happen periodically, which corrects
+any drift from a lost update.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+UNREAD_COUNT_TTL_SECONDS = 60 * 60
+
+
+def _unread_count_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def get_unread_count(user_id):
+    key = _unread_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(receiver_id=user_id, is_read=False).count()
+        cache.set(key, count, UNREAD_COUNT_TTL_SECONDS)
+    return count
+
+
+def _apply_delta(user_id, delta):
+    try:
+        count = cache.incr(_unread_count_key(user_id), delta)
+    except ValueError:
+        # Not cached: the next read counts from the table.
+        return
+    if count < 0:
+        cache.delete(_unread_count_key(user_id))
+
+
+def adjust_unread_count(user_id, delta):
+    """Apply ``delta`` to the cached count once the current transaction commits."""
+    if delta:
+        transaction.on_commit(lambda: _apply_delta(user_id, delta))
+
+
+def reset_unread_count(user_id):
+    cache.delete(_unread_count_key(user_id))
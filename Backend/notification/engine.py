@@ -0,0 +1,152 @@
+"""
+Creates notifications for any ``NotificationType``.
+
+``notify`` renders the event, coalesces it into a receiver's matching
+notification when one is still unread and not yet pushed (so a burst becomes
+"Sam and 4 others sent you friend requests" and a single push), and writes
+every remaining receiver's row with one ``bulk_create``. New rows of a
+coalesced type are held back from the outbox for ``COALESCE_DELAY``, which is
+how long a burst has to gather before it is pushed.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import adjust_unread_count
+from .models import Notification, NotificationType
+from .realtime import publish_notification
+
+COALESCE_WINDOW = timedelta(minutes=10)
+# The outbox drains rows within a second, so without a hold nothing would be
+# left unsent to coalesce into.
+COALESCE_DELAY = timedelta(minutes=1)
+# How many actors a coalesced notification lists by name.
+MAX_LISTED_ACTORS = 3
+
+# (one actor, several actors) message templates.
+TEMPLATES = {
+    NotificationType.FRIEND_REQUEST: (
+        '{actor} sent you a friend request.',
+        '{actor} and {others} sent you friend requests.',
+    ),
+    NotificationType.FRIEND_ACCEPTED: (
+        '{actor} accepted your friend request.',
+        '{actor} and {others} accepted your friend requests.',
+    ),
+    NotificationType.INVITATION: (
+        '{actor} invited you.',
+        '{actor} and {others} invited you.',
+    ),
+    NotificationType.REPORT: (
+        '{actor} sent a report.',
+        '{actor} and {others} sent reports.',
+    ),
+    NotificationType.MESSAGE: (
+        '{actor} sent you a message.',
+        '{actor} and {others} sent you messages.',
+    ),
+}
+
+# Reports are individually actionable, so each one keeps its own row.
+COALESCED_TYPES = {
+    NotificationType.FRIEND_REQUEST,
+    NotificationType.FRIEND_ACCEPTED,
+    NotificationType.INVITATION,
+    NotificationType.MESSAGE,
+}
+
+
+def actor_payload(user):
+    return {'id': user.id, 'username': user.username}
+
+
+def render_message(notification_type, actors, count):
+    single, several = TEMPLATES[notification_type]
+    if count == 1:
+        return single.format(actor=actors[0]['username'])
+    others = count - 1
+    return several.format(
+        actor=actors[0]['username'],
+        others=f"{others} other" if others == 1 else f"{others} others",
+    )
+
+
+def _new_data(notification_type, actor, extra):
+    actor = actor_payload(actor)
+    return {
+        **extra,
+        'message': render_message(notification_type, [actor], 1),
+        'user': actor,
+        'actors': [actor],
+        'actor_ids': [actor['id']],
+        'count': 1,
+    }
+
+
+def _coalesce(data, notification_type, actor, extra):
+    """Fold another event into an existing notification's data, newest actor first."""
+    actor = actor_payload(actor)
+    if actor['id'] not in data['actor_ids']:
+        data['actor_ids'].append(actor['id'])
+        data['count'] += 1
+    listed = [a for a in data['actors'] if a['id'] != actor['id']]
+    data.update(extra)
+    data['user'] = actor
+    data['actors'] = [actor, *listed][:MAX_LISTED_ACTORS]
+    data['message'] = render_message(notification_type, data['actors'], data['count'])
+    return data
+
+
+def notify(receiver_ids, notification_type, actor, extra=None):
+    """
+    Record that ``actor`` triggered ``notification_type`` for every receiver.
+
+    Returns the created and updated notifications.
+    """
+    extra = extra or {}
+    receiver_ids = list(dict.fromkeys(receiver_ids))
+    now = timezone.now()
+
+    with transaction.atomic():
+        open_rows = {}
+        if notification_type in COALESCED_TYPES:
+            # Only rows still in the outbox: anything already pushed keeps
+            # what the user saw, and the next event starts a new row.
+            candidates = Notification.objects.select_for_update().filter(
+                receiver_id__in=receiver_ids,
+                type=notification_type,
+                is_read=False,
+                is_sent=False,
+                created_at__gte=now - COALESCE_WINDOW,
+                data__has_key='actor_ids',
+            ).order_by('created_at')
+            for notification in candidates:
+                open_rows[notification.receiver_id] = notification
+
+        updated = list(open_rows.values())
+        for notification in updated:
+            notification.data = _coalesce(notification.data, notification_type, actor, extra)
+            notification.updated_at = now
+        if updated:
+            Notification.objects.bulk_update(updated, ['data', 'updated_at'])
+
+        push_at = now + COALESCE_DELAY if notification_type in COALESCED_TYPES else None
+        created = Notification.objects.bulk_create([
+            Notification(
+                receiver_id=receiver_id,
+                type=notification_type,
+                data=_new_data(notification_type, actor, extra),
+                next_attempt_at=push_at,
+            )
+            for receiver_id in receiver_ids
+            if receiver_id not in open_rows
+        ])
+
+        for notification in created:
+            adjust_unread_count(notification.receiver_id, 1)
+            publish_notification(notification)
+        for notification in updated:
+            publish_notification(notification, unread_delta=0)
+
+    return created + updated
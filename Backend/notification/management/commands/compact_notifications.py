@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from notification.compaction import RETENTION_DAYS, compact_notifications
+
+
+class Command(BaseCommand):
+    help = 'Fold old read notifications into daily digests and slim stored user snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=RETENTION_DAYS,
+                            help='Keep read notifications newer than this many days')
+
+    def handle(self, *args, **options):
+        stats = compact_notifications(retention_days=options['retention_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded {stats['folded']} notifications into digests, slimmed {stats['slimmed']} user snapshots."
+        ))
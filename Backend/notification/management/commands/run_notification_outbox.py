@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notification.outbox import BATCH_SIZE, deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Deliver unsent notifications through FCM in batches (the notification outbox worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        delivered = 0
+        try:
+            while True:
+                claimed = deliver_pending(batch_size=options['batch_size'])
+                delivered += claimed
+                if claimed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {delivered} notifications.'))
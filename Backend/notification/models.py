@@ -14,7 +14,12 @@ class Notification(models.Model):
     receiver = models.ForeignKey(User , on_delete=models.CASCADE, related_name='notifications')
     is_read = models.BooleanField(default=False)
     is_sent = models.BooleanField(default=False)
+    # Push delivery bookkeeping for the FCM outbox worker.
+    send_attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bulk writes (coalescing, mark-read) set this explicitly.
+    updated_at = models.DateTimeField(auto_now=True)
     type = models.CharField(max_length=2, choices=NotificationType.choices)
     data = models.JSONField()
     
@@ -24,8 +29,28 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=['receiver', 'is_read']),
             models.Index(fields=['receiver', 'is_sent']),
+            models.Index(fields=['receiver', 'created_at', 'id'], name='notification_receiver_time_idx'),
+            # Only the outbox is indexed, so it stays small however many
+            # notifications have already been sent.
+            models.Index(fields=['id'], condition=models.Q(is_sent=False), name='notification_outbox_idx'),
         ]
 
     def __str__(self):
         return f"Notification for {self.receiver.username} - Type: {self.get_type_display()} - Read: {self.is_read}"
     
+
+
+class NotificationDigest(models.Model):
+    """Daily per-type count of read notifications removed by compaction."""
+    receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_digests')
+    type = models.CharField(max_length=2, choices=NotificationType.choices)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['receiver', 'type', 'day'], name='unique_notification_digest'),
+        ]
+
+    def __str__(self):
+        return f"{self.count} x {self.get_type_display()} for {self.receiver_id} on {self.day}"
@@ -0,0 +1,182 @@
+"""
+Outbox delivery of push notifications through FCM.
+
+Creating a ``Notification`` only inserts the row (``is_sent=False``). A
+separate worker (``manage.py run_notification_outbox``) claims unsent rows in
+batches, sends each batch in one FCM request and marks the outcome in bulk, so
+request handlers never wait on the network.
+
+Rows that fail transiently are retried with exponential backoff up to
+``MAX_SEND_ATTEMPTS``; rows whose receiver has no usable token are marked
+sent, since there is nothing to push them to. A message FCM rejects as
+malformed is given up at once without touching the receiver's token, since the
+fault is ours and not the device's.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Notification, User
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500  # FCM's limit for one batched send
+MAX_SEND_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 30
+
+SENT = 'sent'
+RETRY = 'retry'
+INVALID_TOKEN = 'invalid_token'
+FAILED = 'failed'
+
+
+class FirebaseTransport:
+    """Sends through firebase_admin, one HTTP round-trip per batch."""
+
+    def send_batch(self, messages):
+        from firebase_admin import exceptions, messaging
+
+        fcm_messages = [
+            messaging.Message(
+                token=m['token'],
+                notification=messaging.Notification(title=m['title'], body=m['body']),
+                data=m['data'],
+            )
+            for m in messages
+        ]
+        batch = messaging.send_each(fcm_messages)
+
+        results = []
+        for response in batch.responses:
+            if response.success:
+                results.append(SENT)
+            elif isinstance(response.exception, (
+                messaging.UnregisteredError,
+                messaging.SenderIdMismatchError,
+            )):
+                results.append(INVALID_TOKEN)
+            elif isinstance(response.exception, exceptions.InvalidArgumentError):
+                # Also raised for a malformed payload, so the token may be fine.
+                results.append(FAILED)
+            else:
+                results.append(RETRY)
+        return results
+
+
+class InMemoryTransport:
+    """
+    Local stand-in for FCM: records every message instead of sending it.
+
+    ``results`` can be set to a list of outcomes to return for the next
+    messages, to exercise retries and invalid tokens.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.results = []
+
+    def send_batch(self, messages):
+        outcomes = []
+        for message in messages:
+            outcome = self.results.pop(0) if self.results else SENT
+            if outcome == SENT:
+                self.sent.append(message)
+            outcomes.append(outcome)
+        return outcomes
+
+
+_TRANSPORTS = {
+    'firebase': FirebaseTransport,
+    'memory': InMemoryTransport,
+}
+_transport = None
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        _transport = _TRANSPORTS[settings.FCM_TRANSPORT]()
+    return _transport
+
+
+def build_message(notification):
+    return {
+        'token': notification.receiver.fcm_token,
+        'title': notification.get_type_display().replace('_', ' '),
+        'body': notification.data.get('message', ''),
+        # FCM data values must be strings.
+        'data': {'notification_id': str(notification.id), 'type': notification.type},
+    }
+
+
+def pending_notifications(now=None):
+    now = now or timezone.now()
+    return Notification.objects.filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+        is_sent=False,
+        send_attempts__lt=MAX_SEND_ATTEMPTS,
+    )
+
+
+def deliver_pending(batch_size=BATCH_SIZE, transport=None):
+    """
+    Send one batch of unsent notifications. Returns how many rows were
+    claimed, so callers can keep going until it returns 0.
+    """
+    transport = transport or get_transport()
+    now = timezone.now()
+
+    with transaction.atomic():
+        # skip_locked lets several workers drain the outbox side by side.
+        batch = list(
+            pending_notifications(now)
+            .select_related('receiver')
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        deliverable = [n for n in batch if n.receiver.fcm_token]
+        done_ids = [n.id for n in batch if not n.receiver.fcm_token]
+        retry_by_attempts = defaultdict(list)
+        failed_ids = []
+        invalid_tokens = set()
+
+        if deliverable:
+            try:
+                outcomes = transport.send_batch([build_message(n) for n in deliverable])
+            except Exception:
+                logger.exception("FCM batch of %d notifications failed", len(deliverable))
+                outcomes = [RETRY] * len(deliverable)
+
+            for notification, outcome in zip(deliverable, outcomes):
+                if outcome == RETRY:
+                    retry_by_attempts[notification.send_attempts].append(notification.id)
+                elif outcome == FAILED:
+                    failed_ids.append(notification.id)
+                else:
+                    done_ids.append(notification.id)
+                    if outcome == INVALID_TOKEN:
+                        invalid_tokens.add(notification.receiver.fcm_token)
+
+        Notification.objects.filter(id__in=done_ids).update(is_sent=True)
+        if failed_ids:
+            logger.error("FCM rejected notifications %s as invalid; not retrying", failed_ids)
+            Notification.objects.filter(id__in=failed_ids).update(
+                send_attempts=MAX_SEND_ATTEMPTS,
+            )
+        for attempts, ids in retry_by_attempts.items():
+            Notification.objects.filter(id__in=ids).update(
+                send_attempts=F('send_attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** attempts),
+            )
+        if invalid_tokens:
+            User.objects.filter(fcm_token__in=invalid_tokens).update(fcm_token=None)
+
+    return len(batch)
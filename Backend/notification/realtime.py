@@ -0,0 +1,46 @@
+"""
+Realtime delivery of notifications to the receiver's open sockets.
+
+Every socket of a user joins ``notification_group_name(user.id)``. Services
+publish new notifications and unread-count deltas there once the write has
+committed, so clients keep their badge current without polling.
+"""
+from django.db import transaction
+
+from chat.realtime import broadcast_from_sync
+
+from .serializers import NotificationSerializer
+
+
+def notification_group_name(user_id) -> str:
+    return f'notifications_{user_id}'
+
+
+def notification_created_event(notification, unread_delta=None) -> dict:
+    if unread_delta is None:
+        unread_delta = 0 if notification.is_read else 1
+    return {
+        'type': 'notification.created',
+        'notification': dict(NotificationSerializer(notification).data),
+        'unread_delta': unread_delta,
+    }
+
+
+def unread_delta_event(delta: int) -> dict:
+    return {'type': 'notification.unread', 'unread_delta': delta}
+
+
+def _publish_on_commit(user_id, event):
+    transaction.on_commit(
+        lambda: broadcast_from_sync(notification_group_name(user_id), event)
+    )
+
+
+def publish_notification(notification, unread_delta=None):
+    """``unread_delta=0`` for a notification that was updated rather than created."""
+    _publish_on_commit(notification.receiver_id, notification_created_event(notification, unread_delta))
+
+
+def publish_unread_delta(user_id, delta):
+    if delta:
+        _publish_on_commit(user_id, unread_delta_event(delta))
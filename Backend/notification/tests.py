@@ -1,3 +1,352 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from chat.middleware import TokenAuthMiddleware
+from user.models import AuthToken, User
+from .compaction import compact_notifications
+from .counters import get_unread_count
+from .engine import COALESCE_DELAY, notify
+from .models import Notification, NotificationDigest, NotificationType
+from .outbox import FAILED, INVALID_TOKEN, MAX_SEND_ATTEMPTS, RETRY, InMemoryTransport, deliver_pending
+from .routing import websocket_urlpatterns
+from .services import push_accept_notification, push_request_notification
+
+
+class NotificationListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.other = User.objects.create_user(username='bob', email='bob@example.com', password='pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for i in range(12):
+            Notification.objects.create(
+                receiver=self.user, type=NotificationType.MESSAGE, data={'n': i}
+            )
+        Notification.objects.create(receiver=self.other, type=NotificationType.MESSAGE, data={'n': 99})
+
+    def test_list_is_cursor_paginated_newest_first(self):
+        first = self.client.get('/notification/')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([n['data']['n'] for n in first.data['results']], list(range(11, 1, -1)))
+        self.assertNotIn('count', first.data)
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual([n['data']['n'] for n in second.data['results']], [1, 0])
+        self.assertIsNone(second.data['next'])
+        self.assertIsNotNone(second.data['previous'])
+
+
+    def test_unchanged_list_is_not_modified_until_a_read(self):
+        cache.clear()
+        first = self.client.get('/notification/')
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/notification/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # Without the ETag, the body of an unchanged version comes from the cache.
+        with self.assertNumQueries(1):
+            cached = self.client.get('/notification/')
+        self.assertEqual(cached.data, first.data)
+
+        self.client.post('/notification/mark-read/', {'up_to': first.data['results'][0]['id']}, format='json')
+        response = self.client.get('/notification/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(n['is_read'] for n in response.data['results']))
+
+
+class NotificationConsumerTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.sender = User.objects.create_user(username='bob', email='bob@example.com', password='pass1234')
+        self.token = AuthToken.objects.create(user=self.user)
+        Notification.objects.create(receiver=self.user, type=NotificationType.MESSAGE, data={})
+        self.application = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    def test_new_notifications_and_reads_are_pushed_to_the_receiver(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        async def scenario():
+            socket = WebsocketCommunicator(self.application, f'/ws/notifications/?token={self.token.key}')
+            self.assertTrue((await socket.connect())[0])
+            initial = await socket.receive_json_from()
+
+            await database_sync_to_async(push_request_notification)(
+                self.user, self.sender, NotificationType.FRIEND_REQUEST, timezone.now().isoformat()
+            )
+            created = await socket.receive_json_from()
+
+            await database_sync_to_async(client.post)(
+                '/notification/mark-as-read/', {'notification_id': created['notification']['id']}, format='json'
+            )
+            read = await socket.receive_json_from()
+            await socket.disconnect()
+            return initial, created, read
+
+        initial, created, read = async_to_sync(scenario)()
+        self.assertEqual(initial, {'type': 'unread_count', 'unread_count': 1})
+        self.assertEqual(created['type'], 'notification')
+        self.assertEqual(created['unread_delta'], 1)
+        self.assertEqual(created['notification']['data']['user']['username'], 'bob')
+        self.assertEqual(read, {'type': 'unread_delta', 'unread_delta': -1})
+
+    def test_anonymous_socket_is_rejected(self):
+        async def scenario():
+            socket = WebsocketCommunicator(self.application, '/ws/notifications/')
+            connected, _ = await socket.connect()
+            return connected
+
+        self.assertFalse(async_to_sync(scenario)())
+
+
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.transport = InMemoryTransport()
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='pass1234', fcm_token='token-alice'
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='pass1234', fcm_token='token-bob'
+        )
+        self.no_device = User.objects.create_user(username='carol', email='carol@example.com', password='pass1234')
+
+    def _notify(self, user, message='hello'):
+        return Notification.objects.create(
+            receiver=user, type=NotificationType.FRIEND_REQUEST, data={'message': message}
+        )
+
+    def test_batch_is_sent_once_and_marked_in_bulk(self):
+        for user in (self.alice, self.bob, self.no_device):
+            self._notify(user)
+
+        # savepoint, claim, bulk update, release
+        with self.assertNumQueries(4):
+            self.assertEqual(deliver_pending(transport=self.transport), 3)
+
+        self.assertEqual([m['token'] for m in self.transport.sent], ['token-alice', 'token-bob'])
+        self.assertEqual(self.transport.sent[0]['body'], 'hello')
+        self.assertFalse(Notification.objects.filter(is_sent=False).exists())
+        self.assertEqual(deliver_pending(transport=self.transport), 0)
+
+    def test_transient_failure_is_retried_after_backoff(self):
+        notification = self._notify(self.alice)
+        self.transport.results = [RETRY]
+
+        deliver_pending(transport=self.transport)
+
+        notification.refresh_from_db()
+        self.assertFalse(notification.is_sent)
+        self.assertEqual(notification.send_attempts, 1)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertEqual(deliver_pending(transport=self.transport), 0)
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(transport=self.transport), 1)
+        notification.refresh_from_db()
+        self.assertTrue(notification.is_sent)
+
+    def test_gives_up_after_max_attempts(self):
+        self._notify(self.alice)
+        Notification.objects.update(send_attempts=MAX_SEND_ATTEMPTS)
+
+        self.assertEqual(deliver_pending(transport=self.transport), 0)
+
+    def test_invalid_token_is_dropped(self):
+        notification = self._notify(self.alice)
+        self.transport.results = [INVALID_TOKEN]
+
+        deliver_pending(transport=self.transport)
+
+        notification.refresh_from_db()
+        self.alice.refresh_from_db()
+        self.assertTrue(notification.is_sent)
+        self.assertIsNone(self.alice.fcm_token)
+
+    def test_rejected_message_is_given_up_but_keeps_the_token(self):
+        notification = self._notify(self.alice)
+        self.transport.results = [FAILED]
+
+        with patch('notification.outbox.logger'):
+            deliver_pending(transport=self.transport)
+
+        notification.refresh_from_db()
+        self.alice.refresh_from_db()
+        self.assertFalse(notification.is_sent)
+        self.assertEqual(notification.send_attempts, MAX_SEND_ATTEMPTS)
+        self.assertIsNotNone(self.alice.fcm_token)
+        self.assertEqual(deliver_pending(transport=self.transport), 0)
+
+
+class UnreadCounterTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.sender = User.objects.create_user(username='bob', email='bob@example.com', password='pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _unread_badge(self):
+        return self.client.get('/notification/count-unread/').data['unread_count']
+
+    def test_badge_is_served_from_the_counter_once_warm(self):
+        Notification.objects.create(receiver=self.user, type=NotificationType.MESSAGE, data={})
+        self.assertEqual(self._unread_badge(), 1)
+
+        push_request_notification(self.user, self.sender, NotificationType.FRIEND_REQUEST, timezone.now().isoformat())
+        push_accept_notification(self.user, self.sender, NotificationType.FRIEND_ACCEPTED, timezone.now())
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.id), 3)
+
+        first = Notification.objects.order_by('id').first()
+        self.client.post('/notification/mark-as-read/', {'notification_id': first.id}, format='json')
+        self.client.post('/notification/mark-as-read/', {'notification_id': first.id}, format='json')
+        self.assertEqual(self._unread_badge(), 2)
+
+    def test_cold_counter_falls_back_to_the_table(self):
+        for _ in range(2):
+            Notification.objects.create(receiver=self.user, type=NotificationType.MESSAGE, data={})
+        Notification.objects.create(receiver=self.sender, type=NotificationType.MESSAGE, data={})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_unread_count(self.user.id), 2)
+
+
+class BulkMarkAsReadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.notifications = [
+            Notification.objects.create(receiver=self.user, type=NotificationType.MESSAGE, data={'n': i})
+            for i in range(5)
+        ]
+
+    def _unread(self):
+        return sorted(Notification.objects.filter(is_read=False).values_list('data__n', flat=True))
+
+    def test_marks_listed_ids_in_one_update(self):
+        ids = [self.notifications[1].id, self.notifications[3].id]
+        with self.captureOnCommitCallbacks():
+            response = self.client.post('/notification/mark-read/', {'ids': ids}, format='json')
+
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(self._unread(), [0, 2, 4])
+
+    def test_up_to_marks_the_marker_and_everything_older(self):
+        with self.captureOnCommitCallbacks():
+            response = self.client.post('/notification/mark-read/', {'up_to': self.notifications[2].id}, format='json')
+
+        self.assertEqual(response.data, {'updated': 3})
+        self.assertEqual(self._unread(), [3, 4])
+
+    def test_requires_exactly_one_selector(self):
+        response = self.client.post('/notification/mark-read/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_booleans_are_not_ids(self):
+        for payload in ({'ids': [True]}, {'up_to': True}):
+            response = self.client.post('/notification/mark-read/', payload, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._unread(), [0, 1, 2, 3, 4])
+
+
+class NotificationCompactionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+
+    def _create(self, age_days, is_read, data=None):
+        notification = Notification.objects.create(
+            receiver=self.user, type=NotificationType.FRIEND_REQUEST, is_read=is_read, data=data or {}
+        )
+        Notification.objects.filter(id=notification.id).update(
+            created_at=timezone.now() - timedelta(days=age_days)
+        )
+        return notification
+
+    def test_old_read_notifications_are_folded_into_digests(self):
+        self._create(200, is_read=True)
+        self._create(200, is_read=True)
+        old_unread = self._create(200, is_read=False)
+        recent = self._create(1, is_read=True)
+
+        stats = compact_notifications(retention_days=90)
+
+        self.assertEqual(stats['folded'], 2)
+        self.assertEqual(set(Notification.objects.values_list('id', flat=True)), {old_unread.id, recent.id})
+        digest = NotificationDigest.objects.get()
+        self.assertEqual((digest.receiver_id, digest.type, digest.count), (self.user.id, 'FR', 2))
+
+    def test_stored_user_snapshots_are_slimmed(self):
+        snapshot = {'id': 7, 'username': 'bob', 'email': 'bob@example.com', 'gender': 'M', 'streak_cnt': 3}
+        notification = self._create(1, is_read=False, data={'message': 'hi', 'user': snapshot})
+
+        self.assertEqual(compact_notifications()['slimmed'], 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.data, {'message': 'hi', 'user': {'id': 7, 'username': 'bob'}})
+
+
+class NotificationEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.receiver = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        self.senders = [
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='pass1234')
+            for i in range(5)
+        ]
+
+    def test_burst_is_coalesced_into_one_notification(self):
+        for sender in self.senders:
+            notify([self.receiver.id], NotificationType.FRIEND_REQUEST, sender)
+        notify([self.receiver.id], NotificationType.FRIEND_REQUEST, self.senders[-1])
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.data['count'], 5)
+        self.assertEqual(notification.data['message'], 'user4 and 4 others sent you friend requests.')
+        self.assertEqual([a['username'] for a in notification.data['actors']], ['user4', 'user3', 'user2'])
+        self.assertEqual(get_unread_count(self.receiver.id), 1)
+
+    def test_pushed_notification_is_not_reopened(self):
+        notify([self.receiver.id], NotificationType.FRIEND_REQUEST, self.senders[0])
+        Notification.objects.update(is_sent=True)
+        notify([self.receiver.id], NotificationType.FRIEND_REQUEST, self.senders[1])
+
+        self.assertEqual(
+            list(Notification.objects.order_by('id').values_list('data__message', flat=True)),
+            ['user0 sent you a friend request.', 'user1 sent you a friend request.'],
+        )
+
+    def test_outbox_holds_a_burst_until_the_delay_has_passed(self):
+        transport = InMemoryTransport()
+        User.objects.filter(id=self.receiver.id).update(fcm_token='token-alice')
+
+        notify([self.receiver.id], NotificationType.FRIEND_REQUEST, self.senders[0])
+        self.assertEqual(deliver_pending(transport=transport), 0)
+        notify([self.receiver.id], NotificationType.FRIEND_REQUEST, self.senders[1])
+
+        self.assertEqual(Notification.objects.count(), 1)
+        later = timezone.now() + COALESCE_DELAY
+        with patch('notification.outbox.timezone.now', return_value=later):
+            self.assertEqual(deliver_pending(transport=transport), 1)
+        self.assertEqual(
+            [m['body'] for m in transport.sent], ['user1 and 1 other sent you friend requests.']
+        )
+
+    def test_fan_out_writes_all_receivers_in_one_insert(self):
+        receivers = [s.id for s in self.senders]
+        # savepoint, coalescing lookup, bulk insert, release
+        with self.assertNumQueries(4):
+            notify(receivers, NotificationType.INVITATION, self.receiver, extra={'event_id': 9})
+
+        self.assertEqual(Notification.objects.filter(type=NotificationType.INVITATION).count(), 5)
+        self.assertEqual(Notification.objects.first().data['event_id'], 9)
@@ -1,9 +1,10 @@
 from django.urls import path
 
 
-from .views import NotificationsView , MarkAsReadView , CountUnreadNotificationsView
+from .views import NotificationsView , MarkAsReadView , CountUnreadNotificationsView , BulkMarkAsReadView
 urlpatterns = [
     path('', NotificationsView.as_view(), name='notification-list'),
     path('mark-as-read/', MarkAsReadView.as_view(), name='notification-mark-as-read'),
+    path('mark-read/', BulkMarkAsReadView.as_view(), name='notification-bulk-mark-as-read'),
     path('count-unread/', CountUnreadNotificationsView.as_view(), name='notification-unread-count'),
 ]
\ No newline at end of file
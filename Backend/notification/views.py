@@ -1,15 +1,34 @@
 
+from django.db.models import Count, Max, Q, Subquery
+from django.utils import timezone
 from notification.models import Notification 
 from rest_framework.views import APIView
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from .serializers import NotificationSerializer
+from .counters import adjust_unread_count, get_unread_count
+from .realtime import publish_unread_delta
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from PUPtime.conditional import conditional_get
+
+class NotificationPagination(CursorPagination):
+    # Seeks on (receiver, created_at, id) instead of COUNT + OFFSET, so every
+    # page costs the same however far back the user scrolls.
+    page_size = 10
+    ordering = ('-created_at', '-id')
+
+def notifications_version(view, request, *args, **kwargs):
+    # New rows move count/max id, reads and coalescing move updated_at.
+    return Notification.objects.filter(receiver=request.user).aggregate(
+        count=Count('id'), last_id=Max('id'), updated=Max('updated_at'),
+    )
 
-class NotificationPagination(PageNumberPagination):
-    page_size = 10 
+cursor_parameter = openapi.Parameter(
+    'cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+    description='Opaque cursor taken from a `next` or `previous` link'
+)
 
  
 class NotificationsView(APIView):
@@ -17,14 +36,16 @@ class NotificationsView(APIView):
     permission_classes = [IsAuthenticated]
 
     @swagger_auto_schema(
+        manual_parameters=[cursor_parameter],
         responses={
             200: NotificationSerializer(many=True),
             404: 'no notifications found'
         }
     )
+    @conditional_get(notifications_version)
     def get(self, request):
         user = request.user
-        notifications = Notification.objects.filter(reciever=user)
+        notifications = Notification.objects.filter(receiver=user)
 
         if not notifications.exists():
             return Response({'message': 'No notifications found for this user'}, status=200)
@@ -49,13 +70,16 @@ class MarkAsReadView(APIView):
     )
     def post(self, request):
         notification_id = request.data.get('notification_id')
-        try:
-            notification = Notification.objects.get(id=notification_id, reciever=request.user , is_read=False)
-        except Notification.DoesNotExist:
+        # A conditional UPDATE, so two concurrent requests can't both count
+        # the same notification as read.
+        updated = Notification.objects.filter(
+            id=notification_id, receiver=request.user, is_read=False
+        ).update(is_read=True, updated_at=timezone.now())
+        if not updated:
             return Response({'error': 'notification already read'}, status=404)
 
-        notification.is_read = True
-        notification.save()
+        adjust_unread_count(request.user.id, -1)
+        publish_unread_delta(request.user.id, -1)
         return Response({'message': 'Notification marked as read successfully'}, status=200)
 
 
@@ -74,7 +98,7 @@ class CountUnreadNotificationsView(APIView):
     )
     def get(self, request):
         user = request.user
-        unread_count = Notification.objects.filter(reciever=user, is_read=False).count()
+        unread_count = get_unread_count(user.id)
         return Response({'unread_count': unread_count}, status=200)
     
 
@@ -83,14 +107,16 @@ class GetUnreadNotificationsView(APIView):
     permission_classes = [IsAuthenticated]
 
     @swagger_auto_schema(
+         manual_parameters=[cursor_parameter],
          responses={
             200: openapi.Response('Friendship request accepted successfully', NotificationSerializer(many=True)),
             400: openapi.Response('Bad request - validation errors or not authorized to accept this request'),
         },
     )
+    @conditional_get(notifications_version)
     def get(self, request):
         user = request.user
-        unread_notifications = Notification.objects.filter(reciever=user, is_read=False)
+        unread_notifications = Notification.objects.filter(receiver=user, is_read=False)
 
         if not unread_notifications.exists():
             return Response({'message': 'No unread notifications found for this user'}, status=200)
@@ -113,12 +139,64 @@ class MarkAllAsReadView(APIView):
     )
     def post(self, request):
         user = request.user
-        notifications = Notification.objects.filter(reciever=user, is_read=False)
+        notifications = Notification.objects.filter(receiver=user, is_read=False)
 
         if not notifications.exists():
             return Response({'message': 'Already all notifications are read'}, status=200)
         
-        notifications.update(is_read=True)
-        notifications.save() 
+        updated = notifications.update(is_read=True, updated_at=timezone.now())
+        adjust_unread_count(user.id, -updated)
+        publish_unread_delta(user.id, -updated)
+
+        return Response({'message': 'All notifications marked as read successfully'}, status=200)
+
+
+class BulkMarkAsReadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                                      description='IDs of the notifications to mark as read'),
+                'up_to': openapi.Schema(type=openapi.TYPE_INTEGER,
+                                        description='Mark this notification and every older one as read'),
+            }
+        ),
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'updated': openapi.Schema(type=openapi.TYPE_INTEGER, description='Number of notifications marked as read')
+                }
+            ),
+            400: 'Provide either ids or up_to'
+        }
+    )
+    def post(self, request):
+        ids = request.data.get('ids')
+        up_to = request.data.get('up_to')
+        if (ids is None) == (up_to is None):
+            return Response({'error': 'Provide either ids or up_to'}, status=400)
+
+        unread = Notification.objects.filter(receiver=request.user, is_read=False)
+        if ids is not None:
+            # type() rather than isinstance(), which would let true/false through as 1/0.
+            if not isinstance(ids, list) or not all(type(i) is int for i in ids):
+                return Response({'error': 'ids must be a list of integers'}, status=400)
+            unread = unread.filter(id__in=ids)
+        else:
+            if type(up_to) is not int:
+                return Response({'error': 'up_to must be an integer'}, status=400)
+            # Everything at or before the marker in list order (-created_at, -id),
+            # resolved inside the UPDATE itself.
+            marker = Notification.objects.filter(id=up_to, receiver=request.user).values('created_at')
+            unread = unread.filter(
+                Q(created_at__lt=Subquery(marker)) | Q(created_at=Subquery(marker), id__lte=up_to)
+            )
 
-        return Response({'message': 'All notifications marked as read successfully'}, status=200)
\ No newline at end of file
+        updated = unread.update(is_read=True, updated_at=timezone.now())
+        adjust_unread_count(request.user.id, -updated)
+        publish_unread_delta(request.user.id, -updated)
+        return Response({'updated': updated}, status=200)
@@ -3,11 +3,10 @@ from datetime import timedelta
 from django.test import TestCase
 from django.utils import timezone
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
 from task.models import TaskTemplate, TaskOverride
-from user.models import User, InterestCategory
+from user.models import AuthToken, User, InterestCategory
 
 
 class TaskAPITestCase(TestCase):
@@ -24,8 +23,8 @@ class TaskAPITestCase(TestCase):
             username='bob', email='bob@example.com', password='pass1234'
         )
 
-        self.token_a = Token.objects.create(user=self.user_a)
-        self.token_b = Token.objects.create(user=self.user_b)
+        self.token_a = AuthToken.objects.create(user=self.user_a)
+        self.token_b = AuthToken.objects.create(user=self.user_b)
 
         self.category = InterestCategory.objects.create(name='Fitness')
 
@@ -353,3 +352,38 @@ class TaskHistoryTests(TaskAPITestCase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         # Should be restricted to only 2-3 instances from our DAILY recurrence
         self.assertLessEqual(resp.data['count'], 3)
+
+
+class TaskListConditionalGetTests(TaskAPITestCase):
+    def test_unchanged_list_is_not_modified(self):
+        self.auth_a()
+        created = self.client.post('/task/', self.task_payload(is_recurring=False, rrule=None), format='json')
+        first = self.client.get('/task/')
+
+        with self.assertNumQueries(1):  # the version aggregate
+            resp = self.client.get('/task/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(f"/task/{created.data['id']}", {'title': 'Evening run'}, format='json')
+        resp = self.client.get('/task/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['results'][0]['title'], 'Evening run')
+
+    def test_category_rename_changes_the_etag(self):
+        self.auth_a()
+        self.client.post('/task/', self.task_payload(is_recurring=False, rrule=None), format='json')
+        etag = self.client.get('/task/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Sport'
+            self.category.save()
+
+        resp = self.client.get('/task/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['results'][0]['categories'][0]['name'], 'Sport')
+
+    def test_etag_is_per_user(self):
+        self.auth_a()
+        etag = self.client.get('/task/')['ETag']
+        self.auth_b()
+        self.assertNotEqual(self.client.get('/task/')['ETag'], etag)
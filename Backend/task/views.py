@@ -4,7 +4,7 @@ from django.db import IntegrityError
 
 from django.utils import timezone
 
-from django.db.models import Q
+from django.db.models import Count, Max, Q
 from django.utils.decorators import method_decorator
 from rest_framework import status
 from rest_framework.decorators import action
@@ -13,6 +13,9 @@ from rest_framework.permissions import BasePermission, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from PUPtime.conditional import conditional_get
+from user.catalog import get_catalog
+
 from . import docs
 from .models import TaskTemplate, TaskOverride
 from .serializers import InitialOverrideSerializer, TaskOverrideSerializer, TaskSerializer
@@ -51,6 +54,20 @@ def _parse_iso(value):
         return None
 
 
+def _task_list_version(view, request, *args, **kwargs):
+    # Soft deletes and edits move updated_at; generated or removed
+    # overrides move their count. Tasks embed category names, so the
+    # catalog's content hash (kept in memory) covers renames.
+    version = TaskTemplate.objects.filter(user=request.user).aggregate(
+        tasks=Count('id', distinct=True),
+        updated=Max('updated_at'),
+        override_count=Count('overrides', distinct=True),
+        override_updated=Max('overrides__updated_at'),
+    )
+    version['categories'] = get_catalog().etag
+    return version
+
+
 @method_decorator(name='list', decorator=docs.list_schema)
 @method_decorator(name='create', decorator=docs.create_schema)
 @method_decorator(name='retrieve', decorator=docs.retrieve_schema)
@@ -149,6 +166,10 @@ class TaskViewSet(ModelViewSet):
 
         return qs
 
+    @conditional_get(_task_list_version)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
@@ -0,0 +1,109 @@
+"""
+Token authentication with a short-lived token -> user cache, shared by the
+REST API (``CachedTokenAuthentication``) and WebSockets
+(``chat.middleware.TokenAuthMiddleware``).
+
+Tokens are ``AuthToken`` rows, stored as a SHA-256 digest of the key; the
+digest is also the cache key, so raw tokens never reach the database or the
+cache backend. Entries are dropped when a token is deleted (logout, rotation)
+or its user is saved (see ``signals.py``); anything else, such as a queryset
+``update()``, is bounded by the TTL. The cache must be shared by every worker
+(``CACHE_BACKEND``), or a revoked token stays valid in the others.
+
+A token stops working after ``TOKEN_IDLE_TTL`` without use or
+``TOKEN_MAX_AGE`` after it was issued, a user keeps at most
+``MAX_TOKENS_PER_USER`` (signing in drops the oldest), and
+``manage.py prune_auth_tokens`` deletes expired rows.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import AuthToken
+
+TOKEN_CACHE_TTL_SECONDS = 60
+TOKEN_IDLE_TTL = timedelta(days=30)
+TOKEN_MAX_AGE = timedelta(days=90)
+# last_used is written at most this often per token, not on every request.
+TOKEN_LAST_USED_RESOLUTION = timedelta(hours=1)
+MAX_TOKENS_PER_USER = 10
+
+
+def _token_cache_key(digest):
+    return f'auth:token:{digest}'
+
+
+def _is_expired(token, now):
+    return token.last_used < now - TOKEN_IDLE_TTL or token.created < now - TOKEN_MAX_AGE
+
+
+def prune_expired_tokens(now=None):
+    """Delete tokens past their idle or absolute lifetime. Returns how many went."""
+    now = now or timezone.now()
+    idle, _ = AuthToken.objects.filter(last_used__lt=now - TOKEN_IDLE_TTL).delete()
+    aged, _ = AuthToken.objects.filter(created__lt=now - TOKEN_MAX_AGE).delete()
+    return idle + aged
+
+
+def get_token(token_key):
+    """The unexpired ``AuthToken`` for ``token_key`` with its user loaded, or None."""
+    digest = AuthToken.digest_for(token_key)
+    cache_key = _token_cache_key(digest)
+    token = cache.get(cache_key)
+    cached = token is not None
+    if not cached:
+        try:
+            token = AuthToken.objects.select_related('user').get(digest=digest)
+        except AuthToken.DoesNotExist:
+            return None
+
+    now = timezone.now()
+    if _is_expired(token, now):
+        return None
+    if token.last_used < now - TOKEN_LAST_USED_RESOLUTION:
+        AuthToken.objects.filter(digest=digest).update(last_used=now)
+        token.last_used = now
+    elif cached:
+        return token
+
+    cache.set(cache_key, token, TOKEN_CACHE_TTL_SECONDS)
+    return token
+
+
+def issue_token(user):
+    """A new token for ``user``, dropping their oldest beyond ``MAX_TOKENS_PER_USER``."""
+    token = AuthToken.objects.create(user=user)
+    oldest = AuthToken.objects.filter(user=user).order_by('-created', '-digest')[MAX_TOKENS_PER_USER:]
+    AuthToken.objects.filter(digest__in=list(oldest.values_list('digest', flat=True))).delete()
+    return token
+
+
+def invalidate_tokens(*digests):
+    """Drop cached tokens now and once the current transaction commits."""
+    keys = [_token_cache_key(digest) for digest in digests]
+    if keys:
+        # A request racing the transaction could re-cache the old row; the
+        # second delete, after commit, catches that.
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_tokens(*AuthToken.objects.filter(user_id=user_id).values_list('digest', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        if token is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
@@ -0,0 +1,103 @@
+"""
+In-process cache of the interest catalog (categories and interests).
+
+The catalog only changes through ``load_interests`` and the admin, so each
+process keeps one serialised snapshot, tagged with a content hash that the
+list endpoints send as their ``ETag``. A random version token in the shared
+cache (``CACHE_BACKEND``) tells processes when to reload: ``invalidate_catalog``
+replaces it, and each request compares it with the snapshot's, a cache read
+instead of a query. Snapshots are also reloaded after
+``CATALOG_SNAPSHOT_TTL_SECONDS`` in case a change never reached the cache, for
+example a write made straight to the database.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Interest, InterestCategory
+
+CATALOG_VERSION_KEY = 'catalog:interests:version'
+# Clients may reuse a response this long before revalidating with If-None-Match.
+CATALOG_MAX_AGE_SECONDS = 5 * 60
+CATALOG_SNAPSHOT_TTL_SECONDS = 10 * 60
+
+
+class CatalogSnapshot:
+    def __init__(self, version):
+        from .serializers import InterestCategorySerializer, InterestSerializer
+
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.categories = InterestCategorySerializer(InterestCategory.objects.all(), many=True).data
+        self.interests = InterestSerializer(Interest.objects.select_related('category'), many=True).data
+        self.interests_by_category = {}
+        for interest in self.interests:
+            self.interests_by_category.setdefault(interest['category']['name'].lower(), []).append(interest)
+        content = json.dumps([self.categories, self.interests], sort_keys=True).encode()
+        self.etag = quote_etag(hashlib.sha256(content).hexdigest()[:32])
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _shared_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def get_catalog():
+    global _snapshot
+    # Read before loading, so a change committed mid-load is picked up by the
+    # next request rather than masked.
+    version = _shared_version()
+    snapshot = _snapshot
+    if _is_stale(snapshot, version):
+        with _lock:
+            if _is_stale(_snapshot, version):
+                _snapshot = CatalogSnapshot(version)
+            snapshot = _snapshot
+    return snapshot
+
+
+def _is_stale(snapshot, version):
+    return (
+        snapshot is None
+        or snapshot.version != version
+        or time.monotonic() - snapshot.loaded_at > CATALOG_SNAPSHOT_TTL_SECONDS
+    )
+
+
+def warm_catalog():
+    """Load the snapshot ahead of the first request; a no-op if the database is not ready."""
+    from django.db import DatabaseError
+
+    try:
+        get_catalog()
+    except DatabaseError:
+        pass
+
+
+def invalidate_catalog():
+    global _snapshot
+    _snapshot = None
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def catalog_response(request, data, etag):
+    """``data`` with caching headers, or a 304 when the client's copy is current."""
+    response = Response(data, status=status.HTTP_200_OK)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=CATALOG_MAX_AGE_SECONDS)
+    return get_conditional_response(request._request, etag=etag, response=response)
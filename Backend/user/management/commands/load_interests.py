@@ -2,6 +2,7 @@ import json
 import os
 
 from django.core.management.base import BaseCommand
+from user.catalog import invalidate_catalog
 from user.models import InterestCategory, Interest
 
 
@@ -43,6 +44,8 @@ class Command(BaseCommand):
             for item in data if item['name'] not in existing_titles
         ]
         Interest.objects.bulk_create(new_interests)
+        # bulk_create sends no signals, so the catalog cache is told directly.
+        invalidate_catalog()
 
         self.stdout.write(self.style.SUCCESS(
             f'Done! Categories created: {len(new_categories)}, '
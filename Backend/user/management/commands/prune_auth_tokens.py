@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user.authentication import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete API tokens that are past their idle or absolute lifetime'
+
+    def handle(self, *args, **options):
+        pruned = prune_expired_tokens()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {pruned} expired tokens."))
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Django's icontains/istartswith compile to UPPER("username"::text) LIKE ...
+# on PostgreSQL, so both indexes are on that exact expression: a trigram GIN
+# index for substring matches and a pattern-ops btree for prefix matches.
+POSTGRES_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS user_username_trgm_idx '
+    'ON user_user USING gin (UPPER("username"::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS user_username_prefix_idx '
+    'ON user_user (UPPER("username"::text) text_pattern_ops)',
+]
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS user_username_prefix_idx',
+    'DROP INDEX IF EXISTS user_username_trgm_idx',
+]
+
+
+def _run_on_postgres(statements):
+    def run(apps, schema_editor):
+        # SQLite (local development) has no trigram support; search scans there.
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0005_delete_usermemory'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run_on_postgres(POSTGRES_FORWARD), _run_on_postgres(POSTGRES_BACKWARD)),
+    ]
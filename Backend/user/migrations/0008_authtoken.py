@@ -0,0 +1,43 @@
+# Generated by Django 5.2.11 on 2026-10-19 19:06
+
+import hashlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def hash_existing_tokens(apps, schema_editor):
+    """Keep every issued token working, then drop the plaintext keys."""
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('user', 'AuthToken')
+    AuthToken.objects.bulk_create(
+        [
+            AuthToken(digest=hashlib.sha256(token.key.encode()).hexdigest(), user_id=token.user_id)
+            for token in Token.objects.all()
+        ],
+        batch_size=1000,
+    )
+    Token.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0007_updated_at'),
+        ('authtoken', '0003_tokenproxy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        # Plaintext keys cannot be recovered from digests, so going back
+        # simply signs everyone out.
+        migrations.RunPython(hash_existing_tokens, migrations.RunPython.noop),
+    ]
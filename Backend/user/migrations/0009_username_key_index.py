@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# user.search orders every tier by UPPER("username") COLLATE "C" and pages
+# with a range on it. A C-collated btree on that expression serves the exact
+# match, the prefix LIKE, the keyset range and the ORDER BY ... LIMIT, which
+# the text_pattern_ops index from 0006 cannot do for the ORDER BY; it replaces
+# that index.
+POSTGRES_FORWARD = [
+    'CREATE INDEX IF NOT EXISTS user_username_key_idx '
+    'ON user_user ((UPPER("username"::text)) COLLATE "C")',
+    'DROP INDEX IF EXISTS user_username_prefix_idx',
+]
+POSTGRES_BACKWARD = [
+    'CREATE INDEX IF NOT EXISTS user_username_prefix_idx '
+    'ON user_user (UPPER("username"::text) text_pattern_ops)',
+    'DROP INDEX IF EXISTS user_username_key_idx',
+]
+
+
+def _run_on_postgres(statements):
+    def run(apps, schema_editor):
+        # SQLite (local development) compares bytes already; search scans there.
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0008_authtoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run_on_postgres(POSTGRES_FORWARD), _run_on_postgres(POSTGRES_BACKWARD)),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.11 on 2026-10-19 19:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0009_username_key_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authtoken',
+            name='last_used',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='authtoken',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
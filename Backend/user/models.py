@@ -1,5 +1,9 @@
+import hashlib
+import secrets
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 
 class InterestCategory(models.Model):
@@ -38,6 +42,7 @@ class User(AbstractUser):
     birth_day = models.DateField(null=True, blank=True)
     streak_cnt = models.IntegerField(default=0)
     joined_on = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     interests = models.ManyToManyField(
         Interest,
         through='UserInterest',
@@ -49,6 +54,33 @@ class User(AbstractUser):
         return self.username
 
 
+class AuthToken(models.Model):
+    """
+    An API token. Only the SHA-256 digest of the key is stored; the key itself
+    is set on the instance that created it, to be handed to the client once.
+    ``created`` and ``last_used`` bound its lifetime (see ``authentication.py``).
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='auth_tokens')
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
+
+    key = None
+
+    @staticmethod
+    def digest_for(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def save(self, *args, **kwargs):
+        if not self.digest:
+            self.key = secrets.token_hex(20)
+            self.digest = self.digest_for(self.key)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.digest[:8]}"
+
+
 class UserInterest(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_interests')
     interest = models.ForeignKey(Interest, on_delete=models.CASCADE, related_name='user_interests')
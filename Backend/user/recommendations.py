@@ -0,0 +1,123 @@
+"""
+Interest-based recommendations.
+
+Every user, hobby and task category (``InterestCategory``, what
+``TaskTemplate.categories`` points at) is embedded as a sparse TF-IDF vector
+over the vocabulary of ``data/interests_data.json``, so all three live in one
+space. Users are scored in batches, one sparse product per catalog, and each
+user's result is cached until ``UserInterestsView`` changes their interests.
+"""
+import json
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from django.core.cache import cache
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from hobby.models import Hobby
+from .models import InterestCategory, UserInterest
+
+VOCABULARY_FILE = Path(__file__).resolve().parent / 'data' / 'interests_data.json'
+RECOMMENDATIONS_TTL_SECONDS = 60 * 60
+# Hobbies and categories change rarely; each process re-reads them this often.
+CATALOG_TTL_SECONDS = 5 * 60
+MAX_RECOMMENDATIONS = 10
+
+
+def _recommendations_key(user_id):
+    return f'recommendations:{user_id}'
+
+
+@lru_cache(maxsize=None)
+def _vectorizer():
+    with VOCABULARY_FILE.open(encoding='utf-8') as f:
+        interests = json.load(f)
+    vectorizer = TfidfVectorizer(stop_words='english', dtype=np.float32)
+    vectorizer.fit(f"{item['name']} {item['category']}" for item in interests)
+    return vectorizer
+
+
+class _Catalog:
+    def __init__(self):
+        vectorizer = _vectorizer()
+        hobbies = list(Hobby.objects.order_by('id').prefetch_related('tags'))
+        self.hobbies = [(h.id, h.name) for h in hobbies]
+        self.hobby_matrix = vectorizer.transform(
+            f"{h.name} {' '.join(t.name.replace('_', ' ') for t in h.tags.all())}" for h in hobbies
+        )
+
+        categories = list(InterestCategory.objects.order_by('id').prefetch_related('interests'))
+        self.categories = [(c.id, c.name) for c in categories]
+        self.category_matrix = vectorizer.transform(
+            f"{c.name} {' '.join(i.title for i in c.interests.all())}" for c in categories
+        )
+        self.loaded_at = time.monotonic()
+
+
+_catalog = None
+
+
+def _get_catalog():
+    global _catalog
+    if _catalog is None or time.monotonic() - _catalog.loaded_at > CATALOG_TTL_SECONDS:
+        _catalog = _Catalog()
+    return _catalog
+
+
+def _top(scores, items, limit):
+    best = np.argsort(-scores, kind='stable')[:limit]
+    return [
+        {'id': items[i][0], 'name': items[i][1], 'score': round(float(scores[i]), 4)}
+        for i in best if scores[i] > 0
+    ]
+
+
+def recommend_for_users(user_ids, limit=MAX_RECOMMENDATIONS):
+    """
+    {user id: {'hobbies': [...], 'categories': [...]}} for ``user_ids``, best
+    first. Cached users are read in one round-trip; the rest are scored
+    together.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    cached = cache.get_many([_recommendations_key(user_id) for user_id in user_ids])
+    results = {
+        user_id: cached[_recommendations_key(user_id)]
+        for user_id in user_ids if _recommendations_key(user_id) in cached
+    }
+    missing = [user_id for user_id in user_ids if user_id not in results]
+    if missing:
+        documents = {user_id: [] for user_id in missing}
+        rows = UserInterest.objects.filter(user_id__in=missing).values_list(
+            'user_id', 'interest__title', 'interest__category__name'
+        )
+        for user_id, title, category in rows:
+            documents[user_id].append(f'{title} {category}')
+
+        catalog = _get_catalog()
+        users = _vectorizer().transform(' '.join(parts) for parts in documents.values())
+        hobby_scores = (users @ catalog.hobby_matrix.T).toarray()
+        category_scores = (users @ catalog.category_matrix.T).toarray()
+
+        computed = {
+            user_id: {
+                'hobbies': _top(hobby_scores[i], catalog.hobbies, MAX_RECOMMENDATIONS),
+                'categories': _top(category_scores[i], catalog.categories, MAX_RECOMMENDATIONS),
+            }
+            for i, user_id in enumerate(documents)
+        }
+        cache.set_many(
+            {_recommendations_key(user_id): value for user_id, value in computed.items()},
+            RECOMMENDATIONS_TTL_SECONDS,
+        )
+        results.update(computed)
+
+    return {
+        user_id: {kind: items[:limit] for kind, items in results[user_id].items()}
+        for user_id in user_ids
+    }
+
+
+def invalidate_recommendations(user_id):
+    cache.delete(_recommendations_key(user_id))
@@ -0,0 +1,130 @@
+"""
+Ranked username search.
+
+Matches are ranked exact, then prefix, then substring. Each tier is its own
+LIMITed query ordered by ``UPPER(username)`` and paged with a keyset cursor on
+(tier, name key, username), so a page is at most three index range scans
+however deep the user scrolls. On PostgreSQL the exact and prefix tiers and
+every tier's ORDER BY are served by the C-collated ``UPPER(username)`` index
+from migration 0009, and substring matches by the trigram index from migration
+0006; SQLite (local development) falls back to a scan.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Collate, Upper
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import User
+
+EXACT, PREFIX, SUBSTRING = 0, 1, 2
+
+
+def _name_key(expression):
+    key = Upper(expression)
+    if connection.vendor == 'postgresql':
+        # Byte order, so the index serves the prefix LIKE, the keyset range and
+        # the ORDER BY alike; SQLite already compares bytes.
+        key = Collate(key, 'C')
+    return key
+
+
+def search_users(query, exclude_ids=()):
+    """
+    Users whose username contains ``query``, as one queryset per tier (exact,
+    prefix, substring), each annotated with ``name_key`` and ordered by it.
+    """
+    users = (
+        User.objects.exclude(id__in=exclude_ids)
+        .annotate(name_key=_name_key('username'))
+        .order_by('name_key', 'username')
+    )
+    return [
+        users.filter(name_key=_name_key(Value(query))),
+        users.filter(username__istartswith=query).exclude(username__iexact=query),
+        users.filter(username__icontains=query).exclude(username__istartswith=query),
+    ]
+
+
+class UserSearchPagination(BasePagination):
+    """Forward-only keyset pagination over the tiers from ``search_users``."""
+    page_size = 20
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def _page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            rank, name_key, username = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            rank = int(rank)
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if rank not in (EXACT, PREFIX, SUBSTRING):
+            raise NotFound('Invalid cursor')
+        return rank, str(name_key), str(username)
+
+    @staticmethod
+    def _encode_cursor(user):
+        return base64.urlsafe_b64encode(
+            json.dumps([user.match_rank, user.name_key, user.username]).encode()
+        ).decode()
+
+    def paginate_queryset(self, tiers, request, view=None):
+        self.request = request
+        size = self._page_size(request)
+        start, name_key, username = self._decode_cursor(request) or (EXACT, None, None)
+        page = []
+        for rank in range(start, len(tiers)):
+            queryset = tiers[rank]
+            if rank == start and name_key is not None:
+                # A range on the name key, then the rows sharing it by username.
+                queryset = queryset.filter(name_key__gte=name_key).exclude(
+                    name_key=name_key, username__lte=username,
+                )
+            # One extra row tells whether there is a next page, without a COUNT.
+            rows = list(queryset[:size + 1 - len(page)])
+            for user in rows:
+                user.match_rank = rank
+            page += rows
+            if len(page) > size:
+                break
+        self.has_next = len(page) > size
+        self.page = page[:size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self._encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
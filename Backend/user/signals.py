@@ -0,0 +1,25 @@
+"""Keeps the authentication and catalog caches in step with the database."""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_tokens, invalidate_user_tokens
+from .catalog import invalidate_catalog
+from .models import AuthToken, Interest, InterestCategory, User
+
+
+@receiver(post_delete, sender=AuthToken)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens(instance.digest)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=InterestCategory)
+@receiver([post_save, post_delete], sender=Interest)
+def catalog_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_catalog)
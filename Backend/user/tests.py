@@ -1,9 +1,28 @@
+import hashlib
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.core.cache import cache
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from rest_framework.authtoken.models import Token
-from .models import User
+from .models import AuthToken, Interest, InterestCategory, User
+from . import recommendations
+from .authentication import (
+    MAX_TOKENS_PER_USER,
+    TOKEN_IDLE_TTL,
+    TOKEN_LAST_USED_RESOLUTION,
+    TOKEN_MAX_AGE,
+    get_token,
+)
+from . import catalog
+from hobby.models import Hobby, Tag
+from friendship.models import Friendship, Status
 
 
 class UserModelTests(TestCase):
@@ -250,15 +269,17 @@ class LoginViewTests(APITestCase):
         response = self.client.post(self.login_url, {}, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
-    def test_login_returns_same_token(self):
-        """Test that login returns the same token for subsequent logins."""
+    def test_each_login_returns_its_own_token(self):
+        """Test that every login issues a new token and earlier ones stay valid."""
         data = {
             'email': 'test@example.com',
             'password': 'testpass123'
         }
         response1 = self.client.post(self.login_url, data, format='json')
         response2 = self.client.post(self.login_url, data, format='json')
-        self.assertEqual(response1.data['token'], response2.data['token'])
+        self.assertNotEqual(response1.data['token'], response2.data['token'])
+        for response in (response1, response2):
+            self.assertIsNotNone(get_token(response.data['token']))
 
 
 class UserSerializerTests(TestCase):
@@ -314,13 +335,13 @@ class GetUserViewTests(APITestCase):
             password='testpass123',
             gender='male',
         )
-        self.token = Token.objects.create(user=self.user)
+        self.token = AuthToken.objects.create(user=self.user)
         self.user2 = User.objects.create_user(
             username='otheruser',
             email='other@example.com',
             password='testpass123',
         )
-        Token.objects.create(user=self.user2)
+        AuthToken.objects.create(user=self.user2)
 
     def test_get_own_user_success(self):
         """Test retrieving own user details."""
@@ -392,14 +413,14 @@ class UpdateUserViewTests(APITestCase):
             password='testpass123',
             gender='male',
         )
-        self.token = Token.objects.create(user=self.user)
+        self.token = AuthToken.objects.create(user=self.user)
         self.user2 = User.objects.create_user(
             username='otheruser',
             email='other@example.com',
             password='testpass123',
             gender='female',
         )
-        self.token2 = Token.objects.create(user=self.user2)
+        self.token2 = AuthToken.objects.create(user=self.user2)
         self.url = reverse('user-detail', kwargs={'user_id': self.user.id})
 
     # ---- PATCH (partial update) tests ----
@@ -723,13 +744,13 @@ class DeleteUserViewTests(APITestCase):
             email='test@example.com',
             password='testpass123',
         )
-        self.token = Token.objects.create(user=self.user)
+        self.token = AuthToken.objects.create(user=self.user)
         self.user2 = User.objects.create_user(
             username='otheruser',
             email='other@example.com',
             password='testpass123',
         )
-        self.token2 = Token.objects.create(user=self.user2)
+        self.token2 = AuthToken.objects.create(user=self.user2)
 
     def test_delete_own_user_success(self):
         """Test deleting own account succeeds."""
@@ -766,7 +787,7 @@ class DeleteUserViewTests(APITestCase):
         self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
         url = reverse('user-detail', kwargs={'user_id': self.user.id})
         self.client.delete(url)
-        self.assertFalse(Token.objects.filter(key=token_key).exists())
+        self.assertFalse(AuthToken.objects.filter(digest=AuthToken.digest_for(token_key)).exists())
 
     def test_deleted_user_cannot_login(self):
         """Test that a deleted user can no longer log in."""
@@ -888,8 +909,10 @@ class UserE2ETests(APITestCase):
             'password': 'alicepass123',
         }, format='json')
         self.assertEqual(login.status_code, status.HTTP_200_OK)
-        self.assertEqual(login.data['token'], token)
+        # Every sign-in gets a token of its own.
+        self.assertNotEqual(login.data['token'], token)
         self.assertEqual(login.data['user_id'], user_id)
+        token = login.data['token']
 
         # 3. Get own profile
         self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
@@ -1266,3 +1289,322 @@ class UserE2ETests(APITestCase):
         }, format='json')
         self.assertEqual(login2.status_code, status.HTTP_200_OK)
         self.assertNotEqual(login1.data['user_id'], login2.data['user_id'])
+
+
+class SearchUserByUsernameTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.me = User.objects.create_user(username='searcher', email='searcher@example.com', password='pass1234')
+        for username in ['sam', 'samantha', 'bsamuel', 'samir', 'isam', 'tom']:
+            User.objects.create_user(username=username, email=f'{username}@example.com', password='pass1234')
+        self.client.force_authenticate(user=self.me)
+
+    def test_results_are_ranked_exact_prefix_substring(self):
+        response = self.client.get('/user/search/sam/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [u['username'] for u in response.data['results']],
+            ['sam', 'samantha', 'samir', 'bsamuel', 'isam'],
+        )
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_walks_pages_without_repeats(self):
+        first = self.client.get('/user/search/sam/?page_size=2')
+        second = self.client.get(first.data['next'])
+        third = self.client.get(second.data['next'])
+
+        names = [u['username'] for page in (first, second, third) for u in page.data['results']]
+        self.assertEqual(names, ['sam', 'samantha', 'samir', 'bsamuel', 'isam'])
+        self.assertIsNone(third.data['next'])
+
+    def test_cursor_orders_each_tier_case_insensitively(self):
+        User.objects.create_user(username='SAMba', email='samba@example.com', password='pass1234')
+        User.objects.create_user(username='Samantha', email='samantha2@example.com', password='pass1234')
+
+        names, url = [], '/user/search/sam/?page_size=1'
+        while url:
+            response = self.client.get(url)
+            names += [u['username'] for u in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(names, ['sam', 'Samantha', 'samantha', 'SAMba', 'samir', 'bsamuel', 'isam'])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/user/search/sam/?cursor=bm9wZQ==')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_blocked_users_are_excluded(self):
+        blocked = User.objects.get(username='samir')
+        Friendship.objects.create(sender=self.me, receiver=blocked, status=Status.BLOCKED, blocked_by=self.me)
+
+        response = self.client.get('/user/search/sam/')
+
+        self.assertNotIn('samir', [u['username'] for u in response.data['results']])
+
+
+class UserRecommendationsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        recommendations._catalog = None
+        food = InterestCategory.objects.create(name='Food & Drink')
+        outdoors = InterestCategory.objects.create(name='Outdoors')
+        self.baking = Interest.objects.create(title='Baking', category=food)
+        self.camping = Interest.objects.create(title='Camping', category=outdoors)
+        for name, tags in [('cooking', ['baking', 'food']), ('hiking', ['outdoors', 'camping']), ('chess', ['strategy'])]:
+            hobby = Hobby.objects.create(name=name)
+            hobby.tags.set([Tag.objects.get_or_create(name=tag)[0] for tag in tags])
+        self.me = User.objects.create_user(username='baker', email='baker@example.com', password='pass1234')
+        self.client.force_authenticate(user=self.me)
+
+    def set_interests(self, *interests):
+        return self.client.put(
+            f'/user/{self.me.id}/interests/', {'interest_ids': [i.id for i in interests]}, format='json'
+        )
+
+    def test_recommends_hobbies_and_task_categories_from_interests(self):
+        self.set_interests(self.baking)
+
+        response = self.client.get('/user/recommendations/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([h['name'] for h in response.data['hobbies']], ['cooking'])
+        self.assertEqual([c['name'] for c in response.data['categories']], ['Food & Drink'])
+
+    def test_results_are_cached_until_interests_change(self):
+        self.set_interests(self.baking)
+        self.client.get('/user/recommendations/')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/user/recommendations/')
+        self.assertEqual([h['name'] for h in response.data['hobbies']], ['cooking'])
+
+        self.set_interests(self.camping)
+        response = self.client.get('/user/recommendations/')
+        self.assertEqual([h['name'] for h in response.data['hobbies']], ['hiking'])
+
+    def test_users_are_scored_in_one_batch(self):
+        other = User.objects.create_user(username='camper', email='camper@example.com', password='pass1234')
+        other.user_interests.create(interest=self.camping)
+        self.set_interests(self.baking)
+        recommendations._get_catalog()
+
+        with self.assertNumQueries(1):
+            results = recommendations.recommend_for_users([self.me.id, other.id], limit=1)
+
+        self.assertEqual(results[self.me.id]['hobbies'][0]['name'], 'cooking')
+        self.assertEqual(results[other.id]['categories'][0]['name'], 'Outdoors')
+
+    def test_interest_update_applies_only_the_difference(self):
+        self.set_interests(self.baking)
+        kept = self.me.user_interests.get(interest=self.baking)
+
+        # user, ids, lock, current set, one insert and no delete (plus the
+        # test's savepoint pair)
+        with self.assertNumQueries(7):
+            response = self.set_interests(self.camping, self.baking)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([i['title'] for i in response.data], ['Baking', 'Camping'])
+        self.assertEqual(self.me.user_interests.get(interest=self.baking).pk, kept.pk)
+
+        response = self.set_interests(self.camping)
+        self.assertEqual([i['title'] for i in response.data], ['Camping'])
+        self.assertEqual(list(self.me.interests.values_list('title', flat=True)), ['Camping'])
+
+    def test_user_without_interests_gets_empty_lists(self):
+        response = self.client.get('/user/recommendations/')
+
+        self.assertEqual(response.data, {'hobbies': [], 'categories': []})
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tokenuser', email='token@example.com', password='pass1234')
+        self.token = AuthToken.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.client.get(f'/user/{self.user.id}/')
+
+        with self.assertNumQueries(2):  # the view's own user and has_interests lookups
+            response = self.client.get(f'/user/{self.user.id}/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(self.token.key, str(cache._cache.keys()))
+
+    def test_user_update_refreshes_the_cached_user(self):
+        self.client.get(f'/user/{self.user.id}/')
+
+        self.client.patch(f'/user/{self.user.id}/', {'username': 'renamed'}, format='json')
+        self.assertEqual(get_token(self.token.key).user.username, 'renamed')
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(f'/user/{self.user.id}/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_the_cached_token(self):
+        self.client.get(f'/user/{self.user.id}/')
+
+        response = self.client.post('/user/logout/')
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(AuthToken.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(f'/user/{self.user.id}/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_keeps_other_devices_signed_in(self):
+        other_device = AuthToken.objects.create(user=self.user)
+
+        self.client.post('/user/logout/')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other_device.key}')
+        self.assertEqual(self.client.get(f'/user/{self.user.id}/').status_code, status.HTTP_200_OK)
+
+    def test_only_a_digest_of_the_key_is_stored(self):
+        stored = AuthToken.objects.get(user=self.user)
+
+        self.assertIsNone(stored.key)
+        self.assertEqual(stored.digest, hashlib.sha256(self.token.key.encode()).hexdigest())
+        self.assertFalse(AuthToken.objects.filter(digest=self.token.key).exists())
+
+    def test_rotated_token_stops_authenticating(self):
+        self.client.get(f'/user/{self.user.id}/')
+
+        self.token.delete()
+        new_token = AuthToken.objects.create(user=self.user)
+
+        self.assertEqual(self.client.get(f'/user/{self.user.id}/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {new_token.key}')
+        self.assertEqual(self.client.get(f'/user/{self.user.id}/').status_code, status.HTTP_200_OK)
+
+    def test_idle_and_old_tokens_expire(self):
+        self.assertEqual(self.client.get(f'/user/{self.user.id}/').status_code, status.HTTP_200_OK)
+
+        AuthToken.objects.update(last_used=timezone.now() - TOKEN_IDLE_TTL - timedelta(minutes=1))
+        cache.clear()
+        self.assertEqual(self.client.get(f'/user/{self.user.id}/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        AuthToken.objects.update(last_used=timezone.now(), created=timezone.now() - TOKEN_MAX_AGE - timedelta(minutes=1))
+        cache.clear()
+        self.assertEqual(self.client.get(f'/user/{self.user.id}/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_last_used_is_refreshed_at_most_once_per_resolution(self):
+        earlier = timezone.now() - TOKEN_LAST_USED_RESOLUTION - timedelta(minutes=1)
+        AuthToken.objects.update(last_used=earlier)
+
+        self.client.get(f'/user/{self.user.id}/')
+        touched = AuthToken.objects.get().last_used
+        self.client.get(f'/user/{self.user.id}/')
+
+        self.assertGreater(touched, earlier)
+        self.assertEqual(AuthToken.objects.get().last_used, touched)
+
+    def test_signing_in_drops_the_oldest_tokens_beyond_the_cap(self):
+        for _ in range(MAX_TOKENS_PER_USER):
+            response = self.client.post('/user/login/', {'email': 'token@example.com', 'password': 'pass1234'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), MAX_TOKENS_PER_USER)
+        self.assertEqual(self.client.get(f'/user/{self.user.id}/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {response.data["token"]}')
+        self.assertEqual(self.client.get(f'/user/{self.user.id}/').status_code, status.HTTP_200_OK)
+
+    def test_prune_command_deletes_expired_tokens(self):
+        fresh = AuthToken.objects.create(user=self.user)
+        AuthToken.objects.exclude(digest=fresh.digest).update(last_used=timezone.now() - TOKEN_IDLE_TTL - timedelta(minutes=1))
+        out = StringIO()
+
+        call_command('prune_auth_tokens', stdout=out)
+
+        self.assertEqual(list(AuthToken.objects.values_list('digest', flat=True)), [fresh.digest])
+        self.assertIn('Deleted 1 expired tokens.', out.getvalue())
+
+
+class InterestCatalogTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        catalog.invalidate_catalog()
+        self.food = InterestCategory.objects.create(name='Food & Drink')
+        self.baking = Interest.objects.create(title='Baking', category=self.food)
+        Interest.objects.create(title='Camping', category=InterestCategory.objects.create(name='Outdoors'))
+
+    def test_catalog_is_served_from_memory(self):
+        first = self.client.get('/user/interests/')
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/user/interests/')
+            categories = self.client.get('/user/interest-categories/')
+            filtered = self.client.get('/user/interests/?category=food %26 drink')
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual([c['name'] for c in categories.data], ['Food & Drink', 'Outdoors'])
+        self.assertEqual([i['title'] for i in filtered.data], ['Baking'])
+        self.assertEqual(second['Cache-Control'], f'public, max-age={catalog.CATALOG_MAX_AGE_SECONDS}')
+
+    def test_conditional_get_returns_304_until_the_catalog_changes(self):
+        etag = self.client.get('/user/interests/')['ETag']
+
+        response = self.client.get('/user/interests/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.baking.title = 'Bread Baking'
+            self.baking.save()
+
+        response = self.client.get('/user/interests/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Bread Baking', [i['title'] for i in response.data])
+
+    def test_load_interests_invalidates_the_catalog(self):
+        etag = self.client.get('/user/interests/')['ETag']
+
+        call_command('load_interests', stdout=StringIO())
+
+        response = self.client.get('/user/interests/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(len(response.data), 2)
+
+    def test_snapshot_expires_even_without_an_invalidation(self):
+        etag = self.client.get('/user/interests/')['ETag']
+        # A change that never reached the shared cache.
+        Interest.objects.filter(id=self.baking.id).update(title='Bread Baking')
+
+        self.assertEqual(self.client.get('/user/interests/')['ETag'], etag)
+        later = time.monotonic() + catalog.CATALOG_SNAPSHOT_TTL_SECONDS + 1
+        with patch('user.catalog.time.monotonic', return_value=later):
+            response = self.client.get('/user/interests/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Bread Baking', [i['title'] for i in response.data])
+
+
+class UserFriendsConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.me = User.objects.create_user(username='me', email='me@example.com', password='pass1234')
+        self.friend = User.objects.create_user(username='pal', email='pal@example.com', password='pass1234')
+        Friendship.objects.create(sender=self.me, receiver=self.friend, status=Status.ACCEPTED)
+        self.client.force_authenticate(user=self.me)
+
+    def test_friends_list_revalidates_against_profiles_and_friendships(self):
+        etag = self.client.get(f'/user/{self.me.id}/friends/')['ETag']
+        self.assertEqual(
+            self.client.get(f'/user/{self.me.id}/friends/', HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+        self.friend.streak_cnt = 7
+        self.friend.save()
+        response = self.client.get(f'/user/{self.me.id}/friends/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['streak_cnt'], 7)
+
+        etag = response['ETag']
+        Friendship.objects.get().delete()
+        response = self.client.get(f'/user/{self.me.id}/friends/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data, 'User does not have friends yet')
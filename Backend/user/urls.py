@@ -1,9 +1,10 @@
 from django.urls import path
 
 from .views import (
-    RegisterView, LoginView, UserDetailView,
+    RegisterView, LoginView, LogoutView, UserDetailView,
     InterestListView, InterestCategoryListView, UserInterestsView,
-    GoogleAuthView, UserFreindsView, UserReqeustsView, SearchUserByUsernameView
+    GoogleAuthView, UserFreindsView, UserReqeustsView, SearchUserByUsernameView,
+    UserRecommendationsView
 )
 
 urlpatterns = [
@@ -11,6 +12,7 @@ urlpatterns = [
     path('register', RegisterView.as_view(), name='register_no_slash'),
     path('login/', LoginView.as_view(), name='login'),
     path('login', LoginView.as_view(), name='login_no_slash'),
+    path('logout/', LogoutView.as_view(), name='logout'),
     path('auth/google/', GoogleAuthView.as_view(), name='google-auth'),
     path('auth/google', GoogleAuthView.as_view(), name='google-auth_no_slash'),
     path('interests/', InterestListView.as_view(), name='interest-list'),
@@ -23,5 +25,6 @@ urlpatterns = [
     path('<int:user_id>/interests', UserInterestsView.as_view(), name='user-interests_no_slash'),
     path('<int:user_id>/friends/', UserFreindsView.as_view(), name='user-friends'),
     path('requests/', UserReqeustsView.as_view(), name='user-requests'),
+    path('recommendations/', UserRecommendationsView.as_view(), name='user-recommendations'),
     path('search/<str:name>/', SearchUserByUsernameView.as_view(), name='user-detail-By-username'),
 ]
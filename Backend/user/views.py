@@ -3,14 +3,16 @@ from os import name
 from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import authenticate
 from django.shortcuts import get_object_or_404
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Max, Q
 
+from friendship import graph as friend_graph
+from PUPtime.conditional import conditional_get
 from friendship.models import Friendship, Status
 
 from .serializers import (
@@ -18,7 +20,11 @@ from .serializers import (
     InterestSerializer, InterestCategorySerializer, UserInterestSerializer,
     GoogleAuthSerializer, UserFriendsSerializer, SearchUserByUsernameSerializer
 )
-from .models import User, Interest, InterestCategory, UserInterest
+from .authentication import issue_token
+from .models import AuthToken, User, Interest, InterestCategory, UserInterest
+from .catalog import catalog_response, get_catalog
+from .recommendations import MAX_RECOMMENDATIONS, invalidate_recommendations, recommend_for_users
+from .search import UserSearchPagination, search_users
 import uuid
 
 
@@ -39,7 +45,7 @@ class RegisterView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        token, _ = Token.objects.get_or_create(user=user)
+        token = issue_token(user)
         headers = self.get_success_headers(serializer.data)
         response_data = serializer.data
         response_data['token'] = token.key
@@ -80,7 +86,9 @@ class LoginView(APIView):
                     user.fcm_token = fcm_token
                     user.save(update_fields=['fcm_token'])
 
-            token, created = Token.objects.get_or_create(user=user)
+            # Each sign-in gets its own token; only its digest is stored, so
+            # an existing one cannot be handed out again.
+            token = issue_token(user)
             return Response({
                 'token': token.key,
                 'user_id': user.id,
@@ -92,6 +100,20 @@ class LoginView(APIView):
         return Response({'error': 'Invalid credentials. Please check your email and password.'}, status=status.HTTP_401_UNAUTHORIZED)
 
 
+class LogoutView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        responses={204: openapi.Response('Token revoked')}
+    )
+    def post(self, request):
+        # Revokes the token this request was made with; deleting it also drops
+        # it from the authentication cache.
+        if isinstance(request.auth, AuthToken):
+            AuthToken.objects.filter(digest=request.auth.digest).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class UserDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -168,9 +190,8 @@ class InterestCategoryListView(APIView):
         responses={200: InterestCategorySerializer(many=True)}
     )
     def get(self, request):
-        categories = InterestCategory.objects.all()
-        serializer = InterestCategorySerializer(categories, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        catalog = get_catalog()
+        return catalog_response(request, catalog.categories, catalog.etag)
 
 
 class InterestListView(APIView):
@@ -186,12 +207,13 @@ class InterestListView(APIView):
         responses={200: InterestSerializer(many=True)}
     )
     def get(self, request):
-        interests = Interest.objects.select_related('category').all()
+        catalog = get_catalog()
         category = request.query_params.get('category')
         if category:
-            interests = interests.filter(category__name__iexact=category)
-        serializer = InterestSerializer(interests, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            interests = catalog.interests_by_category.get(category.lower(), [])
+        else:
+            interests = catalog.interests
+        return catalog_response(request, interests, catalog.etag)
 
 
 class UserInterestsView(APIView):
@@ -223,17 +245,29 @@ class UserInterestsView(APIView):
         serializer.is_valid(raise_exception=True)
         interest_ids = serializer.validated_data['interest_ids']
 
-        interests = Interest.objects.filter(id__in=interest_ids)
-        if interests.count() != len(set(interest_ids)):
+        requested = set(interest_ids)
+        interests = list(Interest.objects.filter(id__in=requested).select_related('category'))
+        if len(interests) != len(requested):
             return Response({'error': 'One or more interest IDs are invalid.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        UserInterest.objects.filter(user=user).delete()
-        UserInterest.objects.bulk_create(
-            [UserInterest(user=user, interest=interest) for interest in interests]
-        )
+        # Apply only the difference, so re-saving an onboarding screen with
+        # one change touches one row. The user row lock serialises
+        # concurrent saves for the same user.
+        with transaction.atomic():
+            User.objects.select_for_update().filter(pk=user.pk).exists()
+            current = set(UserInterest.objects.filter(user=user).values_list('interest_id', flat=True))
+            removed, added = current - requested, requested - current
+            if removed:
+                UserInterest.objects.filter(user=user, interest_id__in=removed).delete()
+            if added:
+                UserInterest.objects.bulk_create(
+                    [UserInterest(user=user, interest_id=interest_id) for interest_id in added]
+                )
+        if removed or added:
+            invalidate_recommendations(user.id)
 
-        updated_interests = user.interests.select_related('category').all()
-        return Response(InterestSerializer(updated_interests, many=True).data, status=status.HTTP_200_OK)
+        # Interest.Meta orders by title, as user.interests did.
+        return Response(InterestSerializer(interests, many=True).data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         responses={
@@ -247,9 +281,43 @@ class UserInterestsView(APIView):
             return Response({'error': 'You can only update your own interests.'}, status=status.HTTP_403_FORBIDDEN)
 
         UserInterest.objects.filter(user=user).delete()
+        invalidate_recommendations(user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+_scored_item = openapi.Schema(type=openapi.TYPE_OBJECT, properties={
+    'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+    'name': openapi.Schema(type=openapi.TYPE_STRING),
+    'score': openapi.Schema(type=openapi.TYPE_NUMBER),
+})
+
+
+class UserRecommendationsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f'Items per list (max {MAX_RECOMMENDATIONS})'),
+        ],
+        responses={200: openapi.Response('Hobbies and task categories matching the user\'s interests', openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'hobbies': openapi.Schema(type=openapi.TYPE_ARRAY, items=_scored_item),
+                'categories': openapi.Schema(type=openapi.TYPE_ARRAY, items=_scored_item),
+            }
+        ))}
+    )
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', MAX_RECOMMENDATIONS)), MAX_RECOMMENDATIONS))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        recommendations = recommend_for_users([request.user.id], limit)[request.user.id]
+        return Response(recommendations, status=status.HTTP_200_OK)
+
+
 class GoogleAuthView(APIView):
     @swagger_auto_schema(
         request_body=GoogleAuthSerializer,
@@ -302,7 +370,7 @@ class GoogleAuthView(APIView):
                     google_auth_id=google_id,
                 )
 
-        token, _ = Token.objects.get_or_create(user=user)
+        token = issue_token(user)
 
         return Response({
             'token': token.key,
@@ -315,6 +383,14 @@ class GoogleAuthView(APIView):
     
 
 
+def _friends_version(view, request, user_id):
+    # The friend set comes from the cached graph; one aggregate covers
+    # profile edits.
+    friend_ids = sorted(friend_graph.get_friend_ids(user_id))
+    profiles = User.objects.filter(id__in=friend_ids).aggregate(count=Count('id'), updated=Max('updated_at'))
+    return [friend_ids, profiles]
+
+
 class UserFreindsView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -326,6 +402,7 @@ class UserFreindsView(APIView):
         404: openapi.Response('User not found or user doesnot have friends yet'),
     }
     )
+    @conditional_get(_friends_version)
     def get(self, request, user_id):
 
         try:
@@ -333,17 +410,12 @@ class UserFreindsView(APIView):
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        friendships = Friendship.objects.filter(
-            (Q(sender=user) | Q(receiver=user)) & Q(status=Status.ACCEPTED)
-        ).select_related('sender', 'receiver')
+        friend_ids = friend_graph.get_friend_ids(user.id)
 
-        if not friendships.exists():
+        if not friend_ids:
             return Response( 'User does not have friends yet', status=status.HTTP_200_OK)
 
-        friends = [
-            f.receiver if f.sender == user else f.sender
-            for f in friendships
-        ]
+        friends = User.objects.filter(id__in=friend_ids)
 
         serializer = UserFriendsSerializer(friends, many=True)
 
@@ -384,8 +456,12 @@ class UserReqeustsView(APIView):
 class SearchUserByUsernameView(APIView):
 
     @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Cursor taken from the `next` link'),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Results per page (max 50)'),
+        ],
         responses={
-            200: openapi.Response('Search results', SearchUserByUsernameSerializer(many=True)),
+            200: openapi.Response('Search results: exact match first, then prefix matches, then other matches', SearchUserByUsernameSerializer(many=True)),
             400: openapi.Response('Bad request - missing query parameter'),
         }
     )
@@ -397,21 +473,9 @@ class SearchUserByUsernameView(APIView):
         
         name = name.strip()
       
-        users = User.objects.filter(username__icontains=name)
-
-        blocked_users = Friendship.objects.filter(
-            Q(sender=request.user, status=Status.BLOCKED) | Q(receiver=request.user, status=Status.BLOCKED)
-        )
-
-
-
-        users = users.exclude(
-            Q(id__in=blocked_users.values_list('sender_id', flat=True)) | Q(id__in=blocked_users.values_list('receiver_id', flat=True))
-        )
-
-        if users.count() == 0:
-            return Response('No users found with the given username.', status=status.HTTP_200_OK)
-
-        serializer = SearchUserByUsernameSerializer(users, many=True)
+        users = search_users(name, exclude_ids=friend_graph.get_blocked_ids(request.user.id))
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        paginator = UserSearchPagination()
+        page = paginator.paginate_queryset(users, request, view=self)
+        serializer = SearchUserByUsernameSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
\ No newline at end of file
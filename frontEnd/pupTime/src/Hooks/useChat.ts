@@ -10,27 +10,33 @@ export const useChat = (room_id: number) => {
   const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [hasMore, setHasMore] = useState(true);
 
-  const pageRef = useRef(1);
+  // Link to the next page of older messages; null once history is exhausted.
+  const nextRef = useRef<string | null>(null);
+  const hasMoreRef = useRef(true);
   const isLoadingRef = useRef(false);
 
   // Deduplicate & merge older messages in front of existing ones
   const prependMessages = useCallback((older: ChatMessage[]) => {
     setMessages(prev => {
-      const existing = new Set(prev.map(m => m.created_at));
-      const unique = older.filter(m => !existing.has(m.created_at));
+      const existing = new Set(prev.map(m => m.id));
+      const unique = older.filter(m => !existing.has(m.id));
       return [...unique, ...prev].sort((a, b) => new Date(a.created_at).getTime() - new Date(b.created_at).getTime());
     });
   }, []);
 
   // Core fetch function (used for initial load & pagination)
-  const fetchMessages = useCallback(async (page: number) => {
-    if (isLoadingRef.current || !hasMore) return;
+  const fetchMessages = useCallback(async (cursor: string | null) => {
+    if (isLoadingRef.current || !hasMoreRef.current) return;
     isLoadingRef.current = true;
     setIsLoadingMore(true);
 
     try {
-      const data = await getRoomMessages(room_id, { page, page_size: PAGE_SIZE });
-      if (!data.hasMore) setHasMore(false);
+      const data = await getRoomMessages(room_id, { cursor, page_size: PAGE_SIZE });
+      nextRef.current = data.next;
+      if (!data.next) {
+        hasMoreRef.current = false;
+        setHasMore(false);
+      }
       prependMessages(data.results);
     } catch (error) {
       console.error('Failed to load messages:', error);
@@ -45,10 +51,11 @@ export const useChat = (room_id: number) => {
     // Reset state when room changes
     setMessages([]);
     setHasMore(true);
-    pageRef.current = 1;
+    hasMoreRef.current = true;
+    nextRef.current = null;
 
     ChatService.connect(room_id);
-    fetchMessages(1);
+    fetchMessages(null);
 
     const unsubscribeMsg = ChatService.onMessage((newMsg) => {
       setMessages(prev => {
@@ -70,9 +77,8 @@ export const useChat = (room_id: number) => {
 
   // Public: load the next page of older messages
   const loadMoreMessages = useCallback(() => {
-    if (!hasMore || isLoadingRef.current) return;
-    pageRef.current += 1;
-    fetchMessages(pageRef.current);
+    if (!hasMore || isLoadingRef.current || !nextRef.current) return;
+    fetchMessages(nextRef.current);
   }, [hasMore, fetchMessages]);
 
   const sendMessage = useCallback((msg: string) => {
@@ -33,12 +33,19 @@ export const deleteChatRoom = async (roomId: number): Promise<void> => {
   await api.delete(`/chat/rooms/${roomId}/`);
 };
 
-export const getRoomMessages = async (room_id: number, { page = 1, page_size = 20 }): Promise<{ results: ChatMessage[], count: number, hasMore: boolean }> => {
-  const response = await api.get(`/chat/rooms/${room_id}/messages/`, { params: { page, page_size } });
+// Messages are cursor-paginated newest first: pass no cursor for the latest
+// page, then the `next` (older) or `previous` (newer) link of a page.
+export const getRoomMessages = async (
+  room_id: number,
+  { cursor = null, page_size = 20 }: { cursor?: string | null, page_size?: number },
+): Promise<{ results: ChatMessage[], next: string | null, previous: string | null }> => {
+  const response = cursor
+    ? await api.get(cursor)
+    : await api.get(`/chat/rooms/${room_id}/messages/`, { params: { page_size } });
   return {
     results: Array.isArray(response.data.results) ? (response.data.results as ChatMessage[]) : [],
-    count: response.data.count,
-    hasMore: response.data.next !== null,
+    next: response.data.next ?? null,
+    previous: response.data.previous ?? null,
   };
 };
 
@@ -283,17 +283,28 @@ export const unblockUser = async (userId: number): Promise<void> => {
   await api.delete(`/friendship/unblock/${userId}/`, { data: {} });
 };
 
-export const searchUsers = async (query: string): Promise<SearchUser[]> => {
+// The search endpoint is cursor-paginated ({ next, results }); follow `next`
+// until `limit` users are collected or the results run out.
+export const searchUsers = async (query: string, limit: number = 50): Promise<SearchUser[]> => {
   const trimmed = query.trim();
   if (!trimmed) {
     return [];
   }
 
-  const response = await api.get(`/user/search/${encodeURIComponent(trimmed)}/`);
+  const users: SearchUser[] = [];
+  let url: string | null = `/user/search/${encodeURIComponent(trimmed)}/`;
+  let params: Record<string, number> | undefined = { page_size: Math.min(limit, 50) };
 
-  if (!Array.isArray(response.data)) {
-    return [];
+  while (url && users.length < limit) {
+    const response: { data: { next?: string | null; results?: unknown } } = await api.get(url, { params });
+    if (!Array.isArray(response.data?.results)) {
+      break;
+    }
+    users.push(...(response.data.results as SearchUser[]));
+    url = response.data.next ?? null;
+    // `next` already carries the cursor and page size.
+    params = undefined;
   }
 
-  return response.data as SearchUser[];
+  return users.slice(0, limit);
 };